@@ -5,6 +5,10 @@ import time
 import requests
 import yfinance as yf
 from bs4 import BeautifulSoup
+from checkpoint import Checkpoint
+from article_store import get_store, dehydrate
+from evidence_index import EvidenceIndex, index_path_for
+import tracing
 
 # 偽裝成瀏覽器
 HEADERS = {
@@ -19,7 +23,8 @@ def fetch_news_list(ticker):
     stock = yf.Ticker(ticker)
 
     # 2. 獲取新聞列表
-    news_list = stock.news
+    with tracing.span("yfinance.news", cat="http", ticker=ticker):
+        news_list = stock.news
 
     print(f"Fetched {len(news_list)} news items.")
     return news_list
@@ -31,7 +36,8 @@ def scrape_content(url):
         time.sleep(1)
 
         # 2. 發送請求
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        with tracing.span("http.get", cat="http", url=url):
+            response = requests.get(url, headers=HEADERS, timeout=10)
 
         # 確認能否讀取網頁
         if response.status_code != 200:
@@ -66,8 +72,9 @@ def scrape_content(url):
         print(f"Error fetching content from {url}: {e}")
         return None
     
-# 負責整合流程
-def run_data_collection(ticker):
+# 負責整合流程，resume=True 時會跳過上次中斷前已抓取的新聞
+# news_items 可傳入已取得的新聞列表 (例如 news_watcher)；incremental=True 時沿用上次已抓取的新聞，只抓新的
+def run_data_collection(ticker, resume=False, news_items=None, incremental=False):
     # 建立資料夾存放資料
     current_dir = os.path.dirname(os.path.abspath(__file__))
     
@@ -79,8 +86,23 @@ def run_data_collection(ticker):
         os.makedirs(output_dir)
         print(f"Created directory: {output_dir}")
 
+    output_file = os.path.join(output_dir, f"{ticker.lower()}_news.json")
+    checkpoint = Checkpoint(output_file, resume)
+    previous_data = []
+    if incremental and os.path.exists(output_file):
+        with open(output_file, "r", encoding="utf-8") as f:
+            previous_data = json.load(f)
+        checkpoint.prefill({news["url"]: news for news in previous_data if news.get("url")})
+
+    # 全文存進跨 ticker 共用的壓縮文章庫，新聞檔只保留 content_hash
+    store = get_store()
+
+    # 段落倒排索引，給 02 / 03 查證據句用
+    evidence = EvidenceIndex(index_path_for(output_file))
+
     # 獲取新聞列表
-    news_items = fetch_news_list(ticker)
+    if news_items is None:
+        news_items = fetch_news_list(ticker)
     collected_data = []
 
     # 處理每條新聞
@@ -95,6 +117,16 @@ def run_data_collection(ticker):
             print(f"Skipping item with missing title or link: {item}")
             continue
 
+        # 已成功抓取的新聞不再重新抓取 (舊版 WAL 中抓取失敗的 None 紀錄會重試)
+        if checkpoint.get(link):
+            # 文章庫之前寫入的舊項目內嵌全文、沒有 content_hash，順便移進文章庫
+            news_entry = dehydrate(checkpoint.get(link), store)
+            collected_data.append(news_entry)
+            if news_entry.get("content_hash") and evidence.get(news_entry["news_id"]) is None:
+                evidence.add_article(news_entry["news_id"], store.get(news_entry["content_hash"]), news_entry["content_hash"])
+            print(f"Skipping ({i+1}/{len(news_items)}) already processed: {title}")
+            continue
+
         print(f"Processing ({i+1}/{len(news_items)}): {title}")
 
         content_paragraphs = scrape_content(link)
@@ -106,17 +138,25 @@ def run_data_collection(ticker):
                 "url": link,
                 "publisher": publisher,
                 "publish_time": publish_time,
-                "content": content_paragraphs
+                "content_hash": store.put(content_paragraphs, f"news_{publish_time}")
             }
             collected_data.append(news_entry)
+            evidence.add_article(news_entry["news_id"], content_paragraphs, news_entry["content_hash"])
+            checkpoint.record(link, news_entry)
         else:
+            # 失敗的新聞不寫入 checkpoint，--resume 時會重新抓取
             print(f" -> Skipped (Failed to fetch content or content too short)")
+            checkpoint.mark_failed(link)
 
-    # 將結果儲存為 JSON 檔案
-    output_file = os.path.join(output_dir, f"{ticker.lower()}_news.json")
+    # 增量模式下保留已不在這次列表中的舊新聞
+    collected_urls = {news["url"] for news in collected_data}
+    collected_data.extend(dehydrate(news, store) for news in previous_data if news.get("url") not in collected_urls)
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(collected_data, f, ensure_ascii=False, indent=4)
+    # 將結果以原子方式儲存為 JSON 檔案
+    checkpoint.finalize(collected_data, indent=4)
+    store.save_index()
+    evidence.retain(news["news_id"] for news in collected_data)
+    evidence.save()
 
     print(f"\n Execution completed! Successfully scrapped {len(collected_data)} news articles")
     print(f"File saved to: {output_file}")
@@ -129,7 +169,8 @@ if __name__ == "__main__":
     
     if user_ticker:
         # 呼叫主函數並傳入使用者輸入的代號
-        result_path = run_data_collection(user_ticker)
+        resume = input("Resume from checkpoint if available? (y/N): ").strip().lower() == "y"
+        result_path = run_data_collection(user_ticker, resume)
         print(f"Testing completed, file path ready to be passed to the next module: {result_path}")
     else:
         print("No stock ticker entered, program terminated.")
\ No newline at end of file
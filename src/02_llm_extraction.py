@@ -2,8 +2,21 @@
 import os 
 import re
 import json
-from openai import OpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from openai import BadRequestError
 from dotenv import load_dotenv
+from chunking import DEFAULT_CHUNK_TOKENS, split_into_chunks, merge_chunk_triples, triple_key
+from checkpoint import Checkpoint, atomic_write_json
+import llm_gateway
+import tracing
+from article_store import load_news
+from evidence_index import EvidenceIndex, index_path_for, annotate_triples
+from json_stream import IncrementalObjectParser, is_complete_triple
+from kg_schema import (
+    VALID_RELATIONS, SINGLE_PASS_SYSTEM_PROMPT, SINGLE_PASS_RESPONSE_FORMAT,
+    get_schema_instruction, get_single_pass_prompt
+)
 
 load_dotenv()
 
@@ -13,24 +26,56 @@ API_KEY = os.getenv("OPENAI_API_KEY")
 if not API_KEY:
     raise ValueError("API key not found. Please set the OPENAI_API environment variable.")
 
-# 初始化 OpenAI 客戶端
-client = OpenAI(api_key=API_KEY)
+# 同一篇文章內 chunk 平行抽取的執行緒數
+MAX_CHUNK_WORKERS = 4
+
+# Structured Outputs 用的 JSON Schema，後端不支援時會自動退回一般模式
+TRIPLES_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "triples",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "triples": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "head": {"type": "string"},
+                            "relation": {"type": "string", "enum": VALID_RELATIONS},
+                            "tail": {"type": "string"}
+                        },
+                        "required": ["head", "relation", "tail"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["triples"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# 記錄後端是否支援 json_schema，第一次被拒絕後就不再嘗試
+# chunk 平行處理時多個工作執行緒會讀寫這個旗標，一律經由下面兩個函數存取
+json_schema_supported = True
+_SCHEMA_LOCK = threading.Lock()
+
+def use_json_schema():
+    with _SCHEMA_LOCK:
+        return json_schema_supported
+
+def disable_json_schema():
+    global json_schema_supported
+    with _SCHEMA_LOCK:
+        json_schema_supported = False
 
 # 設計 Prompt，定義 Schema
 def get_extraction_prompt(news_text, ticker):
     # 共用的 Schema 定義
-    schema_instruction = """
-    Please strictly follow the Schema definition below:
-    1. Entity Types: ["Company", "Product", "Event", "Risk", "Person", "Organization"]
-    2. Relation Types: [
-        "AFFECTS", "CAUSES", "DELAYS", "CANCELS", "INCREASES", "DECREASES", 
-        "LAUNCHES", "PARTNERS_WITH", "COMPETES_WITH", "REGULATES", 
-        "ANNOUNCES", "BENEFITS_FROM",
-        "WARNS", "MISSES", "LOWERS", "WITHDRAWS", "SCALE_BACK", "INCURS",
-        "REDUCES", "COMMENTS_ON", "REPORTS", "EXPANDS", "INVESTS_IN",
-        "OWNS", "MANAGES", "DEVELOPS", "TESTIFIES_BEFORE", "HAMPERS"
-    ]
-    """
+    schema_instruction = get_schema_instruction()
 
     system_instruction = f"""
     You are a professional supply chain risk analyst. Your task is to extract "entity-relation-entity" triples from financial news.
@@ -61,7 +106,7 @@ def extract_info_from_gpt(text, ticker):
     system_prompt, user_prompt = get_extraction_prompt(text, ticker)
 
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_completion(
             model="gpt-5.2", 
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -103,8 +148,301 @@ def extract_info_from_gpt(text, ticker):
         print(f"GPT extraction error: {e}")
         return [], ""
 
-def run_llm_extraction(input_file, ticker):
-    print("Selected mode: zero_shot")
+# 將文章依 token 預算切成 chunk，平行抽取後合併去重
+# stream=True 時改用串流抽取，on_triple 會在各 chunk 的執行緒中被呼叫
+# 跨 chunk 重複的三元組只交給 on_triple 一次，與 merge_chunk_triples 的去重結果一致
+def extract_article_triples(paragraphs, ticker, max_tokens=DEFAULT_CHUNK_TOKENS, stream=False, on_triple=None):
+    chunks = split_into_chunks(paragraphs, max_tokens)
+    if not chunks:
+        return [], 0, 0
+
+    emit = None
+    if on_triple:
+        emitted = set()
+        emit_lock = threading.Lock()
+
+        def emit(triple):
+            key = triple_key(triple)
+            with emit_lock:
+                if key in emitted:
+                    return
+                emitted.add(key)
+            on_triple(triple)
+
+    # 呼叫失敗 (沒有任何回應文字) 的 chunk 回傳 None，方便上層決定是否寫入 checkpoint
+    def extract_chunk(chunk):
+        if stream:
+            triples, raw_text = extract_info_stream(chunk, ticker, emit)
+        else:
+            triples, raw_text = extract_info_from_gpt(chunk, ticker)
+        return triples if raw_text else None
+
+    # 單一 chunk 失敗只會回傳空列表，不影響其他 chunk
+    workers = min(MAX_CHUNK_WORKERS, len(chunks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunk_results = list(executor.map(llm_gateway.bind_context(extract_chunk), chunks))
+
+    failed_chunks = sum(1 for r in chunk_results if r is None)
+    return merge_chunk_triples(chunk_results), len(chunks), failed_chunks
+
+# 串流模式：邊接收 token delta 邊解析，每完成一個三元組就立刻交給 on_triple
+def extract_info_stream(text, ticker, on_triple=None):
+    system_prompt, user_prompt = get_extraction_prompt(text, ticker)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+    parser = IncrementalObjectParser()
+    triples = []
+
+    try:
+        stream = None
+        if use_json_schema():
+            try:
+                stream = llm_gateway.chat_completion(
+                    model="gpt-5.2",
+                    messages=messages,
+                    temperature=0,
+                    response_format=TRIPLES_RESPONSE_FORMAT,
+                    stream=True
+                )
+            except BadRequestError as e:
+                print(f"Structured output not supported, falling back to plain streaming: {e}")
+                disable_json_schema()
+
+        if stream is None:
+            stream = llm_gateway.chat_completion(
+                model="gpt-5.2",
+                messages=messages,
+                temperature=0,
+                stream=True
+            )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for obj in parser.feed(delta):
+                if not is_complete_triple(obj):
+                    continue
+                triples.append(obj)
+                if on_triple:
+                    on_triple(obj)
+
+    except Exception as e:
+        # 串流中斷時保留已完整解析的三元組
+        print(f"GPT streaming error after {len(triples)} triples: {e}")
+
+    return triples, parser.text()
+
+# 單次模式：同一次呼叫內完成抽取與自我驗證
+# system prompt 是固定前綴，回傳 (驗證結果列表, token 用量)，失敗時回傳 (None, {})
+def extract_and_verify_from_gpt(text, ticker):
+    messages = [
+        {"role": "system", "content": SINGLE_PASS_SYSTEM_PROMPT},
+        {"role": "user", "content": get_single_pass_prompt(text, ticker)}
+    ]
+
+    try:
+        response = None
+        if use_json_schema():
+            try:
+                response = llm_gateway.chat_completion(
+                    model="gpt-5.2",
+                    messages=messages,
+                    temperature=0,
+                    response_format=SINGLE_PASS_RESPONSE_FORMAT
+                )
+            except BadRequestError as e:
+                print(f"Structured output not supported, falling back to JSON mode: {e}")
+                disable_json_schema()
+
+        if response is None:
+            response = llm_gateway.chat_completion(
+                model="gpt-5.2",
+                messages=messages,
+                temperature=0,
+                response_format={"type": "json_object"}
+            )
+
+        result = json.loads(response.choices[0].message.content)
+        items = [t for t in result.get("triples", []) if isinstance(t, dict) and is_complete_triple(t)]
+
+        usage = {}
+        if response.usage:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": getattr(details, "cached_tokens", 0) or 0
+            }
+        return items, usage
+
+    except Exception as e:
+        print(f"GPT single-pass error: {e}")
+        return None, {}
+
+# 把單次模式的結果拆成草稿三元組與驗證後三元組
+def split_single_pass_result(items):
+    draft_triples = []
+    verified_triples = []
+    stats = {"kept": 0, "modified": 0, "deleted": 0}
+
+    for item in items:
+        draft_relation = item.get("draft_relation") or item["relation"]
+        draft_triples.append({
+            "head": item["head"],
+            "relation": draft_relation,
+            "tail": item["tail"],
+            "chunk_index": item.get("chunk_index", 0)
+        })
+
+        action = str(item.get("action", "KEEP")).upper()
+        if action == "DELETE":
+            stats["deleted"] += 1
+            continue
+
+        relation = item["relation"]
+        if relation not in VALID_RELATIONS:
+            relation = "REPORTS"
+        verified_triples.append({
+            "head": item["head"],
+            "relation": relation,
+            "tail": item["tail"],
+            "chunk_index": item.get("chunk_index", 0)
+        })
+
+        if action == "MODIFY":
+            stats["modified"] += 1
+        else:
+            stats["kept"] += 1
+
+    return draft_triples, verified_triples, stats
+
+# 單次抽取 + 驗證流程，同時寫出草稿檔與驗證檔，回傳驗證檔路徑 (可直接交給 04)
+def run_single_pass_extraction(input_file, ticker, max_tokens=DEFAULT_CHUNK_TOKENS, resume=False, incremental=False):
+    print("Selected mode: single_pass (extract + verify in one call)")
+
+    input_file = os.path.normpath(input_file)
+
+    if not os.path.exists(input_file):
+        print(f"Input file not found: {input_file}")
+        return None
+
+    news_list = load_news(input_file)
+
+    output_dir = os.path.dirname(input_file)
+    draft_file = os.path.join(output_dir, f"{ticker.lower()}_triples_zero_shot.json")
+    verified_file = os.path.join(output_dir, f"{ticker.lower()}_triples_verified.json")
+
+    # 草稿與驗證結果共用一個 WAL (掛在驗證檔名下)，每筆紀錄同時保存兩者
+    checkpoint = Checkpoint(verified_file, resume)
+    evidence = EvidenceIndex(index_path_for(input_file))
+
+    # 增量模式：上次已成功處理的文章直接沿用
+    if incremental and os.path.exists(draft_file) and os.path.exists(verified_file):
+        with open(draft_file, "r", encoding="utf-8") as f:
+            previous_drafts = {entry["news_id"]: entry for entry in json.load(f) if not entry.get("failed_chunks")}
+        with open(verified_file, "r", encoding="utf-8") as f:
+            checkpoint.prefill({
+                entry["news_id"]: {"draft": previous_drafts[entry["news_id"]], "verified": entry}
+                for entry in json.load(f) if entry["news_id"] in previous_drafts
+            })
+
+    draft_results = []
+    verified_results = []
+    stats = {"total_triples_before": 0, "total_triples_after": 0, "kept": 0, "modified": 0, "deleted": 0}
+    usage_total = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    print(f"Starting single-pass extraction, total {len(news_list)} news articles...")
+
+    for i, news in enumerate(news_list):
+        if checkpoint.is_done(news['news_id']):
+            print(f"Skipping ({i+1}/{len(news_list)}) already processed: {news['title'][:50]}...")
+            record = checkpoint.get(news['news_id'])
+            draft_results.append(record["draft"])
+            verified_results.append(record["verified"])
+            continue
+
+        print(f"Processing ({i+1}/{len(news_list)}): {news['title'][:50]}...")
+        chunks = split_into_chunks(news['content'], max_tokens)
+
+        def process_chunk(chunk):
+            return extract_and_verify_from_gpt(chunk, ticker)
+
+        chunk_outputs = []
+        if chunks:
+            workers = min(MAX_CHUNK_WORKERS, len(chunks))
+            with tracing.span("single_pass_article", cat="article", news_id=news['news_id']):
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    chunk_outputs = list(executor.map(llm_gateway.bind_context(process_chunk), chunks))
+
+        # 依 chunk 合併並以 (head, relation, tail) 去重
+        items = []
+        seen = set()
+        for chunk_index, (chunk_items, usage) in enumerate(chunk_outputs):
+            usage_total["llm_calls"] += 1
+            for k in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                usage_total[k] += usage.get(k, 0)
+            for item in chunk_items or []:
+                key = (item["head"].strip().lower(), item["relation"], item["tail"].strip().lower())
+                if key in seen:
+                    continue
+                seen.add(key)
+                items.append({**item, "chunk_index": chunk_index})
+
+        draft_triples, verified_triples, article_stats = split_single_pass_result(items)
+        article_index = evidence.get_or_build(news['news_id'], news['content'], news.get('content_hash'))
+        verified_triples = annotate_triples(verified_triples, article_index, news['content'])
+        for k in ("kept", "modified", "deleted"):
+            stats[k] += article_stats[k]
+        stats["total_triples_before"] += len(draft_triples)
+        stats["total_triples_after"] += len(verified_triples)
+
+        print(f"   -> {len(draft_triples)} drafted, {len(verified_triples)} verified from {len(chunks)} chunk(s).")
+
+        base_entry = {
+            "news_id": news['news_id'],
+            "title": news['title'],
+            "publish_time": news['publish_time'],
+            "extraction_mode": "single_pass",
+            "chunk_tokens": max_tokens,
+            "chunk_count": len(chunks)
+        }
+        failed_chunks = sum(1 for chunk_items, _ in chunk_outputs if chunk_items is None)
+        if failed_chunks:
+            base_entry["failed_chunks"] = failed_chunks
+        draft_entry = {**base_entry, "triples": draft_triples}
+        verified_entry = {**base_entry, "triples": verified_triples}
+        draft_results.append(draft_entry)
+        verified_results.append(verified_entry)
+
+        if failed_chunks:
+            checkpoint.mark_failed(news['news_id'])
+            print("   -> Some chunks failed, article will be retried on resume.")
+        else:
+            checkpoint.record(news['news_id'], {"draft": draft_entry, "verified": verified_entry})
+
+    # 先寫草稿檔，最後才以 finalize 寫出驗證檔並移除 WAL (有失敗文章時保留)
+    atomic_write_json(draft_file, draft_results)
+    checkpoint.finalize(verified_results)
+
+    print(f"\nSingle-pass Stats for {ticker}:")
+    print(f"  Drafted: {stats['total_triples_before']} triples, Verified: {stats['total_triples_after']} triples")
+    print(f"  Deleted: {stats['deleted']}, Modified: {stats['modified']}")
+    print(f"  LLM calls: {usage_total['llm_calls']}, prompt tokens: {usage_total['prompt_tokens']} "
+          f"(cached: {usage_total['cached_tokens']}), completion tokens: {usage_total['completion_tokens']}")
+    print(f"Saved draft triples to: {draft_file}")
+    print(f"Saved verified triples to: {verified_file}")
+
+    return verified_file
+
+# resume=True 時從 write-ahead log 讀回已完成的文章，只處理剩下的 news_id
+def run_llm_extraction(input_file, ticker, max_tokens=DEFAULT_CHUNK_TOKENS, stream=False, on_triple=None, resume=False, incremental=False):
+    print(f"Selected mode: zero_shot{' (streaming)' if stream else ''}")
     
     input_file = os.path.normpath(input_file)
 
@@ -112,20 +450,44 @@ def run_llm_extraction(input_file, ticker):
         print(f"Input file not found: {input_file}")
         return None
     
-    with open(input_file, "r", encoding="utf-8") as f:
-        news_list = json.load(f)
+    news_list = load_news(input_file)
     
+    # 取得 input_file 所在的資料夾當作輸出資料夾，這樣就不用寫死路徑
+    output_dir = os.path.dirname(input_file)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # 修改檔名為動態生成
+    output_filename = f"{ticker.lower()}_triples_zero_shot.json"
+    output_file = os.path.join(output_dir, output_filename)
+    checkpoint = Checkpoint(output_file, resume)
+
+    # 增量模式：上次已成功抽取的文章直接沿用，只對新文章呼叫 LLM
+    if incremental and os.path.exists(output_file):
+        with open(output_file, "r", encoding="utf-8") as f:
+            checkpoint.prefill({entry["news_id"]: entry for entry in json.load(f) if not entry.get("failed_chunks")})
+
     extracted_results = []
     print(f"Starting LLM data extraction, total {len(news_list)} news articles...")
 
     for i, news in enumerate(news_list):
+        if checkpoint.is_done(news['news_id']):
+            print(f"Skipping ({i+1}/{len(news_list)}) already extracted: {news['title'][:50]}...")
+            extracted_results.append(checkpoint.get(news['news_id']))
+            continue
+
         print(f"Processing ({i+1}/{len(news_list)}): {news['title'][:50]}...")
-        full_text = "\n".join(news['content'])
+        # 串流模式下把 news_id 附在三元組上再交給下游
+        article_callback = None
+        if on_triple:
+            article_callback = lambda triple, news_id=news['news_id']: on_triple({**triple, "news_id": news_id})
 
-        triples, _ = extract_info_from_gpt(full_text, ticker)
+        with tracing.span("extract_article", cat="article", news_id=news['news_id']):
+            triples, chunk_count, failed_chunks = extract_article_triples(news['content'], ticker, max_tokens, stream, article_callback)
 
         if triples:
-            print(f"   -> Extracted {len(triples)} triples.")
+            print(f"   -> Extracted {len(triples)} triples from {chunk_count} chunk(s).")
         else:
             print("   -> No triples extracted.")
 
@@ -134,22 +496,22 @@ def run_llm_extraction(input_file, ticker):
             "title": news['title'],
             "publish_time": news['publish_time'],
             "extraction_mode": "zero_shot",
+            "chunk_tokens": max_tokens,
+            "chunk_count": chunk_count,
             "triples": triples
         }
+        if failed_chunks:
+            result_entry["failed_chunks"] = failed_chunks
         extracted_results.append(result_entry)
 
-    # 取得 input_file 所在的資料夾當作輸出資料夾，這樣就不用寫死路徑
-    output_dir = os.path.dirname(input_file)
-
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+        # 有 chunk 呼叫失敗的文章不寫入 checkpoint，resume 時會重新嘗試
+        if failed_chunks:
+            checkpoint.mark_failed(news['news_id'])
+            print(f"   -> {failed_chunks} chunk(s) failed, article will be retried on resume.")
+        else:
+            checkpoint.record(news['news_id'], result_entry)
 
-    # 修改檔名為動態生成
-    output_filename = f"{ticker.lower()}_triples_zero_shot.json"
-    output_file = os.path.join(output_dir, output_filename)
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(extracted_results, f, ensure_ascii=False, indent=2)
+    checkpoint.finalize(extracted_results)
 
     print(f"\nProcessing completed!")
     print(f"Saved extracted triples to: {output_file}")
@@ -167,7 +529,8 @@ if __name__ == "__main__":
         test_input_path = os.path.join(current_dir, "..", "output", f"{user_ticker.lower()}_data", f"{user_ticker.lower()}_news.json")
         
         print(f"Trying to read test file: {test_input_path}")
-        result_path = run_llm_extraction(test_input_path, user_ticker)
+        resume = input("Resume from checkpoint if available? (y/N): ").strip().lower() == "y"
+        result_path = run_llm_extraction(test_input_path, user_ticker, resume=resume)
         
         print(f"Test completed, file path ready to be passed to next module (03): {result_path}")
     else:
@@ -3,20 +3,21 @@ import os
 import re
 import json
 import time
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from chunking import DEFAULT_CHUNK_TOKENS, split_into_chunks
+from kg_schema import VALID_RELATIONS, infer_entity_type
+from relation_memo import RelationMemo
+from checkpoint import Checkpoint
+import llm_gateway
+import tracing
+from article_store import load_news
+from evidence_index import EvidenceIndex, index_path_for, build_article_index, annotate_triples, evidence_context
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-VALID_RELATIONS = [
-    "AFFECTS", "CAUSES", "DELAYS", "CANCELS", "INCREASES", "DECREASES", 
-    "LAUNCHES", "PARTNERS_WITH", "COMPETES_WITH", "REGULATES", 
-    "ANNOUNCES", "BENEFITS_FROM", "WARNS", "MISSES", "LOWERS", 
-    "WITHDRAWS", "SCALE_BACK", "INCURS", "REDUCES", "COMMENTS_ON", 
-    "REPORTS", "EXPANDS", "INVESTS_IN", "OWNS", "MANAGES", 
-    "DEVELOPS", "TESTIFIES_BEFORE", "HAMPERS"
-]
+# 同一篇文章內 chunk 平行驗證的執行緒數
+MAX_CHUNK_WORKERS = 4
 
 def print_step(message):
     print(f"\n{message}\n")
@@ -79,7 +80,7 @@ def verify_and_fix_triples(news_text, draft_triples):
     """
     
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_completion(
             model="gpt-5.2",
             messages=[
                 {"role": "system", "content": "You are a knowledge graph verification expert. Output valid JSON only."},
@@ -119,14 +120,142 @@ def verify_and_fix_triples(news_text, draft_triples):
         print(f"Error during LLM verification: {e}")
         return None
 
-def run_auto_verifier(draft_file, news_file, ticker):
+def triple_types(triple, ticker):
+    if not ticker:
+        return "Entity", "Entity"
+    return infer_entity_type(triple["head"], ticker), infer_entity_type(triple["tail"], ticker)
+
+# 依 GPT 的驗證結果套用 KEEP / MODIFY / DELETE，回傳保留的三元組與統計
+# 有傳入 memo 時會記錄每個 MODIFY 決策，並在 GPT 回傳不合規關係時優先使用學到的修正
+def apply_verification(triples, verified_triples_list, memo=None, ticker=None):
+    stats = {"kept": 0, "modified": 0, "deleted": 0}
+
+    if verified_triples_list is None:
+        stats["kept"] += len(triples)
+        return list(triples), stats
+
+    # 建立 (head, tail) 到 triple 的映射
+    verified_map = {
+        (v["head"], v["tail"]): v for v in verified_triples_list
+        if isinstance(v, dict) and "head" in v and "tail" in v
+    }
+
+    final_triples = []
+
+    for original_triple in triples:
+        key = (original_triple["head"], original_triple["tail"])
+        # 修正表預先改過的三元組，學習與查表仍以 02 抽出的原始關係為準
+        draft_relation = original_triple.get("draft_relation", original_triple["relation"])
+
+        # 如果 GPT 有回傳這個 triple 的驗證結果
+        if key in verified_map:
+            verified = verified_map[key]
+            action = verified.get("action", "KEEP")
+
+            if action == "DELETE":
+                stats["deleted"] += 1
+                continue
+
+            new_triple = original_triple.copy()
+            llm_relation = verified.get("relation", original_triple["relation"])
+            new_triple["relation"] = llm_relation
+
+            # 再次檢查 Relation 是否在白名單內，先查修正表，查不到才退回 REPORTS
+            if llm_relation not in VALID_RELATIONS:
+                learned = memo.lookup(draft_relation, *triple_types(original_triple, ticker)) if memo else None
+                new_triple["relation"] = learned["relation"] if learned else "REPORTS"
+
+            # 只學習 LLM 自己給出的合規修正；REPORTS 退回值與修正表本身的結果不回寫，避免自我強化
+            if memo and action == "MODIFY" and llm_relation in VALID_RELATIONS and llm_relation != original_triple["relation"]:
+                memo.record(draft_relation, llm_relation, *triple_types(original_triple, ticker))
+
+            # LLM 改成其他關係時，結果已不是修正表給的
+            if new_triple["relation"] != original_triple["relation"]:
+                new_triple.pop("corrected_by", None)
+
+            final_triples.append(new_triple)
+
+            # 修正表改過關係、LLM 判定 KEEP 的三元組相對於草稿仍算修改
+            if action == "MODIFY" or new_triple["relation"] != draft_relation:
+                stats["modified"] += 1
+            else:
+                stats["kept"] += 1
+        else:
+            # 若 GPT 漏掉驗證，預設保留
+            final_triples.append(original_triple)
+            stats["kept"] += 1
+
+    return final_triples, stats
+
+# 用修正表把高信心的不合規關係預先換成合規關係，順序不變
+# 修正後的三元組仍要送 LLM 驗證：修正表只知道關係怎麼改，無法判斷三元組本身是否為幻覺 (DELETE)
+def apply_learned_corrections(triples, memo, ticker):
+    result = []
+    for triple in triples:
+        learned = None
+        if memo is not None and triple["relation"] not in VALID_RELATIONS:
+            learned = memo.lookup(triple["relation"], *triple_types(triple, ticker))
+        if learned is None:
+            result.append(triple)
+        else:
+            result.append({**triple, "relation": learned["relation"], "draft_relation": triple["relation"], "corrected_by": "memo"})
+    return result
+
+# 使用與 02 相同的 chunk 切分，讓每個三元組只對照它被抽出的那個 chunk 驗證
+# 有證據索引時先替每個三元組標上證據句，驗證器只會看到這些句子 (找不到證據時才退回整個 chunk)
+def verify_article(news, draft, ticker=None, memo=None, article_index=None):
+    content = news.get("content", [])
+    max_tokens = draft.get("chunk_tokens", DEFAULT_CHUNK_TOKENS)
+    chunks = split_into_chunks(content, max_tokens)
+    if article_index is None:
+        article_index = build_article_index(content)
+    triples = annotate_triples(draft.get("triples", []), article_index, content)
+
+    # 依 chunk_index 分組，舊格式沒有 chunk_index 的三元組歸到第 0 個 chunk
+    groups = {}
+    for triple in triples:
+        index = triple.get("chunk_index", 0)
+        if not isinstance(index, int) or not 0 <= index < len(chunks):
+            index = 0
+        groups.setdefault(index, []).append(triple)
+
+    # 修正表預先換好的關係讓 LLM 多半只需 KEEP / DELETE，不必再想一次要改成哪個關係
+    def verify_group(item):
+        index, group = item
+        group = apply_learned_corrections(group, memo, ticker)
+
+        chunk_text = chunks[index] if chunks else ""
+        verified = verify_and_fix_triples(evidence_context(group, article_index, content) or chunk_text, group)
+        if verified is None:
+            print(f"Verification failed for chunk {index}. Keeping original triples.")
+        group_triples, group_stats = apply_verification(group, verified, memo, ticker)
+        group_stats["memo"] = sum(1 for t in group_triples if t.get("corrected_by") == "memo")
+        group_stats["failed"] = 1 if verified is None else 0
+        return group_triples, group_stats
+
+    workers = max(1, min(MAX_CHUNK_WORKERS, len(groups)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(llm_gateway.bind_context(verify_group), sorted(groups.items())))
+
+    final_triples = []
+    stats = {"kept": 0, "modified": 0, "deleted": 0, "memo": 0, "failed": 0}
+    for group_triples, group_stats in results:
+        final_triples.extend(group_triples)
+        for k in stats:
+            stats[k] += group_stats[k]
+
+    return final_triples, stats
+
+# resume=True 時從 write-ahead log 讀回已驗證的文章，只處理剩下的 news_id
+# use_memo=True 時會先用累積的關係修正表預先換掉不合規關係 (仍交給 LLM 驗證)，並把新的 MODIFY 決策寫回修正表
+def run_auto_verifier(draft_file, news_file, ticker, resume=False, use_memo=True, incremental=False):
     print(f"Starting auto verification for {ticker}...")
 
     draft_file = os.path.normpath(draft_file)
     news_file = os.path.normpath(news_file)
 
     draft_data = load_json(draft_file)
-    news_data = load_json(news_file)
+    news_data = load_news(news_file)
 
     if not draft_data or not news_data:
         print("Failed to load necessary data. Exiting.")
@@ -135,6 +264,23 @@ def run_auto_verifier(draft_file, news_file, ticker):
     # 建立 news_id 到新聞內容的映射
     news_map = {news["news_id"]: news for news in news_data}
 
+    # 輸出檔案設定
+    output_dir = os.path.dirname(draft_file)
+    output_filename = f"{ticker.lower()}_triples_verified.json"
+    output_path = os.path.join(output_dir, output_filename)
+    checkpoint = Checkpoint(output_path, resume)
+
+    # 增量模式：上次已驗證的文章直接沿用 (統計不重複計入)
+    # 抽取失敗 (failed_chunks) 的文章會被 02 重新抽取，驗證失敗 (verify_failed) 的要重新驗證，兩者都不沿用
+    if incremental and os.path.exists(output_path):
+        empty_stats = {k: 0 for k in ("total_triples_before", "total_triples_after", "kept", "modified", "deleted", "memo")}
+        checkpoint.prefill({
+            entry["news_id"]: {"entry": entry, "stats": empty_stats}
+            for entry in load_json(output_path) if not entry.get("verify_failed") and not entry.get("failed_chunks")
+        })
+    memo = RelationMemo() if use_memo else None
+    evidence = EvidenceIndex(index_path_for(news_file))
+
     verified_results = []
 
     stats = {
@@ -142,7 +288,8 @@ def run_auto_verifier(draft_file, news_file, ticker):
         "total_triples_after": 0,
         "kept": 0,
         "modified": 0,
-        "deleted": 0
+        "deleted": 0,
+        "memo": 0
     }
 
     print(f"Verifying triples for {len(draft_data)} news articles...")
@@ -155,85 +302,63 @@ def run_auto_verifier(draft_file, news_file, ticker):
             print(f"Warning: news_id {news_id} not found in news data. Skipping.")
             continue
 
-        news = news_map[news_id]
-        content = news.get("content", [])
-        if isinstance(content, list):
-            news_text = " ".join(content)
-        else:
-            news_text = str(content)
-        news_text = news_text[:5000]  # 限制輸入長度
+        # 已完成的文章直接沿用 checkpoint 中的結果與統計
+        if checkpoint.is_done(news_id):
+            record = checkpoint.get(news_id)
+            verified_results.append(record["entry"])
+            for k, v in record["stats"].items():
+                stats[k] = stats.get(k, 0) + v
+            continue
 
+        news = news_map[news_id]
         triples = draft.get("triples", [])
-        stats["total_triples_before"] += len(triples)
+        article_stats = {"total_triples_before": len(triples), "total_triples_after": len(triples), "kept": 0, "modified": 0, "deleted": 0, "memo": 0}
 
+        # 抽取失敗的草稿會在 02 resume / 增量執行時重新抽取，這裡也不記入 checkpoint，之後才會驗證新的三元組
         if not triples:
             verified_results.append(draft)
-            continue
-            
-        verified_triples_list = verify_and_fix_triples(news_text, triples)
-
-        if verified_triples_list is None:
-            print(f"Verification failed for {news_id}. Keeping original triples.")
-            verified_results.append(draft)
-            stats["kept"] += len(triples)
-            stats["total_triples_after"] += len(triples)
+            if draft.get("failed_chunks"):
+                checkpoint.mark_failed(news_id)
+            else:
+                checkpoint.record(news_id, {"entry": draft, "stats": article_stats})
+            stats["total_triples_before"] += len(triples)
             continue
 
-        # 建立 (head, tail) 到 triple 的映射
-        verified_map = {(v["head"], v["tail"]): v for v in verified_triples_list}
+        with tracing.span("verify_article", cat="article", news_id=news_id):
+            article_index = evidence.get_or_build(news_id, news.get("content", []), news.get("content_hash"))
+            final_triples, verify_stats = verify_article(news, draft, ticker, memo, article_index)
+        for k in ("kept", "modified", "deleted", "memo"):
+            article_stats[k] = verify_stats[k]
+        article_stats["total_triples_after"] = len(final_triples)
 
-        final_triples = []
-        
-        for original_triple in triples:
-            key = (original_triple["head"], original_triple["tail"])
-            
-            # 如果 GPT 有回傳這個 triple 的驗證結果
-            if key in verified_map:
-                verified = verified_map[key]
-                action = verified.get("action", "KEEP")
-                
-                if action == "DELETE":
-                    stats["deleted"] += 1
-                    continue
-                
-                new_triple = original_triple.copy()
-                new_triple["relation"] = verified.get("relation", original_triple["relation"])
-                
-                # 再次檢查 Relation 是否在白名單內
-                if new_triple["relation"] not in VALID_RELATIONS:
-                     new_triple["relation"] = "REPORTS"
-
-                final_triples.append(new_triple)
-                
-                if action == "MODIFY":
-                    stats["modified"] += 1
-                else:
-                    stats["kept"] += 1
-            else:
-                # 若 GPT 漏掉驗證，預設保留
-                final_triples.append(original_triple)
-                stats["kept"] += 1
-        
-        stats["total_triples_after"] += len(final_triples)
+        for k, v in article_stats.items():
+            stats[k] += v
         
         # 更新結果
         draft["triples"] = final_triples
         verified_results.append(draft)
+
+        # 有 chunk 驗證失敗的文章不寫入 checkpoint，resume 時會重新驗證
+        if verify_stats["failed"]:
+            draft["verify_failed"] = verify_stats["failed"]
+            checkpoint.mark_failed(news_id)
+            print(f"   -> {verify_stats['failed']} chunk(s) failed verification, article will be retried on resume.")
+        elif draft.get("failed_chunks"):
+            checkpoint.mark_failed(news_id)
+        else:
+            checkpoint.record(news_id, {"entry": draft, "stats": article_stats})
         
         time.sleep(0.5)
     
-    # 輸出檔案設定
-    output_dir = os.path.dirname(draft_file)
-    output_filename = f"{ticker.lower()}_triples_verified.json"
-    output_path = os.path.join(output_dir, output_filename)
-    
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(verified_results, f, ensure_ascii=False, indent=2)
+    checkpoint.finalize(verified_results)
+
+    if memo:
+        memo.save()
     
     print(f"\nVerification Stats for {ticker}:")
     print(f"  Before: {stats['total_triples_before']} triples")
     print(f"  After:  {stats['total_triples_after']} triples")
-    print(f"  Deleted: {stats['deleted']}, Modified: {stats['modified']}")
+    print(f"  Deleted: {stats['deleted']}, Modified: {stats['modified']} (locally corrected from memo: {stats['memo']})")
     print(f"Saved to: {output_path}")
     
     return output_path
@@ -250,7 +375,8 @@ if __name__ == "__main__":
         print(f"Draft Triples: {test_draft_path}")
         
         if os.path.exists(test_news_path) and os.path.exists(test_draft_path):
-            result_path = run_auto_verifier(test_draft_path, test_news_path, user_ticker)
+            resume = input("Resume from checkpoint if available? (y/N): ").strip().lower() == "y"
+            result_path = run_auto_verifier(test_draft_path, test_news_path, user_ticker, resume)
             print(f"Next step input file: {result_path}")
         else:
             print("Test files not found. Please run the previous module to generate the necessary input files.")
\ No newline at end of file
@@ -1,11 +1,18 @@
 import os 
 import json
-from openai import OpenAI
+import math
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from checkpoint import atomic_write_json
+import llm_gateway
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# 滾動情緒的預設半衰期 (小時)：越舊的批次權重以指數衰減
+DEFAULT_HALF_LIFE_HOURS = 24
+
+# 與 README 的分數解讀一致：|score| <= 2 視為中性
+SIGNAL_THRESHOLD = 3
 
 def load_json(filepath):
     if not os.path.exists(filepath):
@@ -45,7 +52,7 @@ def analyze_market_sentiment(triples, ticker):
     """
 
     try: 
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_completion(
             model="gpt-5.2",
             messages=[
                 {"role": "system", "content": "You are a financial analyst. Output valid JSON only."},
@@ -96,8 +103,7 @@ def run_market_sentiment(input_file, ticker):
         output_filename = f"{ticker.lower()}_sentiment.json"
         output_path = os.path.join(output_file, output_filename)
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(analysis_result, f, ensure_ascii=False, indent=4) 
+        atomic_write_json(output_path, analysis_result, indent=4)
 
         print(f"Sentiment analysis saved to: {output_path}")
         return output_path
@@ -105,6 +111,138 @@ def run_market_sentiment(input_file, ticker):
         print("Analysis failed.")
         return None
     
+# 解析 yfinance 的 pubDate (例如 2025-01-02T13:00:00Z)，失敗回傳 None
+def parse_time(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def score_to_signal(score):
+    if score >= SIGNAL_THRESHOLD:
+        return "Bullish"
+    if score <= -SIGNAL_THRESHOLD:
+        return "Bearish"
+    return "Neutral"
+
+# 以指數時間衰減合併各批次分數，權重 = 衰減係數 * 三元組數量
+def aggregate_batches(batches, as_of, half_life_hours=DEFAULT_HALF_LIFE_HOURS):
+    weighted_sum = 0.0
+    total_weight = 0.0
+    for batch in batches:
+        batch_time = parse_time(batch.get("as_of")) or as_of
+        age_hours = max(0.0, (as_of - batch_time).total_seconds() / 3600)
+        decay = math.exp(-math.log(2) * age_hours / half_life_hours) if half_life_hours > 0 else 1.0
+        weight = decay * max(1, batch.get("triple_count", 1))
+        weighted_sum += weight * batch.get("score", 0)
+        total_weight += weight
+    if total_weight == 0:
+        return 0.0
+    return weighted_sum / total_weight
+
+# 依批次時間順序產生情緒時間序列，每個點只使用當下之前的批次
+def build_time_series(batches, half_life_hours=DEFAULT_HALF_LIFE_HOURS):
+    ordered = sorted(batches, key=lambda b: parse_time(b.get("as_of")) or datetime.min.replace(tzinfo=timezone.utc))
+    series = []
+    for i, batch in enumerate(ordered):
+        as_of = parse_time(batch.get("as_of")) or datetime.now(timezone.utc)
+        rolling = aggregate_batches(ordered[:i + 1], as_of, half_life_hours)
+        series.append({
+            "timestamp": batch.get("as_of"),
+            "batch_id": batch.get("batch_id"),
+            "batch_score": batch.get("score", 0),
+            "rolling_score": round(rolling, 2)
+        })
+    return series
+
+# 滾動模式：只為尚未評分過的新文章呼叫一次 LLM，歷史批次保存在 {ticker}_sentiment_history.json
+def run_rolling_sentiment(input_file, ticker, half_life_hours=DEFAULT_HALF_LIFE_HOURS):
+    print(f"Starting Rolling Market Sentiment for {ticker} (half-life: {half_life_hours}h)...")
+
+    input_file = os.path.normpath(input_file)
+    data = load_json(input_file)
+
+    if not data:
+        print("No data found or failed to load. Exiting.")
+        return None
+
+    output_dir = os.path.dirname(input_file)
+    history_path = os.path.join(output_dir, f"{ticker.lower()}_sentiment_history.json")
+    series_path = os.path.join(output_dir, f"{ticker.lower()}_sentiment_timeseries.json")
+    output_path = os.path.join(output_dir, f"{ticker.lower()}_sentiment.json")
+
+    history = load_json(history_path) if os.path.exists(history_path) else []
+
+    # 找出還沒被任何批次評分過的文章
+    scored_ids = set()
+    for batch in history:
+        scored_ids.update(batch.get("news_ids", []))
+
+    new_news = [news for news in data if news.get("news_id") not in scored_ids and news.get("triples")]
+    now = datetime.now(timezone.utc)
+
+    if new_news:
+        new_triples = []
+        for news in new_news:
+            new_triples.extend(news.get("triples", []))
+
+        print(f"Scoring {len(new_triples)} new triples from {len(new_news)} new articles...")
+        analysis_result = analyze_market_sentiment(new_triples, ticker)
+
+        if analysis_result:
+            publish_times = [parse_time(n.get("publish_time")) for n in new_news]
+            publish_times = [t for t in publish_times if t]
+            batch_time = max(publish_times) if publish_times else now
+            history.append({
+                "batch_id": f"batch_{len(history) + 1:04d}_{now.strftime('%Y%m%dT%H%M%SZ')}",
+                "scored_at": now.isoformat(),
+                "as_of": batch_time.isoformat(),
+                "news_ids": [n["news_id"] for n in new_news],
+                "triple_count": len(new_triples),
+                "signal": analysis_result.get("signal", "Neutral"),
+                "score": analysis_result.get("score", 0),
+                "key_drivers": analysis_result.get("key_drivers", []),
+                "summary": analysis_result.get("summary", "")
+            })
+            atomic_write_json(history_path, history, indent=4)
+        else:
+            print("Batch analysis failed. Falling back to existing history.")
+    else:
+        print("No new articles since last run. Re-aggregating existing history only.")
+
+    if not history:
+        print("No sentiment history available. Exiting.")
+        return None
+
+    rolling_score = aggregate_batches(history, now, half_life_hours)
+    latest = max(history, key=lambda b: b.get("scored_at", ""))
+
+    result = {
+        "signal": score_to_signal(rolling_score),
+        "score": int(round(rolling_score)),
+        "key_drivers": latest.get("key_drivers", []),
+        "summary": latest.get("summary", ""),
+        "rolling": {
+            "raw_score": round(rolling_score, 2),
+            "half_life_hours": half_life_hours,
+            "batch_count": len(history),
+            "computed_at": now.isoformat()
+        }
+    }
+
+    atomic_write_json(output_path, result, indent=4)
+    atomic_write_json(series_path, build_time_series(history, half_life_hours), indent=4)
+
+    print(f"\n[{ticker}] Rolling Sentiment: {result['signal']} (Score: {result['rolling']['raw_score']}, {len(history)} batches)")
+    print(f"Sentiment analysis saved to: {output_path}")
+    print(f"Sentiment time series saved to: {series_path}")
+    return output_path
+
 if __name__ == "__main__":
     # 單檔測試區塊
     user_ticker = input("Please enter the stock ticker (e.g., PLTR): ").strip().upper()
@@ -116,6 +254,10 @@ if __name__ == "__main__":
         print(f"Reading from: {test_input_path}")
 
         if os.path.exists(test_input_path):
-            run_market_sentiment(test_input_path, user_ticker)
+            rolling = input("Use rolling (incremental, time-decayed) mode? (y/N): ").strip().lower() == "y"
+            if rolling:
+                run_rolling_sentiment(test_input_path, user_ticker)
+            else:
+                run_market_sentiment(test_input_path, user_ticker)
         else:
             print(f"File {test_input_path} does not exist. Please ensure the data file is in place.")
\ No newline at end of file
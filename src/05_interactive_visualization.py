@@ -1,8 +1,18 @@
 # -*- coding: utf-8 -*-
 import os
+import re
 import json
+import hashlib
+import textwrap
 import networkx as nx
 from pyvis.network import Network
+from checkpoint import atomic_write_text, atomic_write_json
+import graph_diff
+from kg_schema import infer_entity_type
+import tracing
+
+# vis-network 的 tooltip 設定 white-space: nowrap，長文字需先斷行 (字串 title 以 innerText 顯示，\n 會變成換行)
+TOOLTIP_WIDTH = 60
 
 # 定義顏色配置
 COLOR_MAP = {
@@ -22,24 +32,22 @@ def load_json(filepath):
     with open(filepath, "r", encoding="utf-8") as f:
         return json.load(f)
 
-# 推斷實體類型
-def infer_entity_type(entity_name, ticker):
-    name_lower = entity_name.lower()
-    ticker_lower = ticker.lower()
-    
-    # 核心目標
-    if ticker_lower in name_lower:
-        return "Company"
-    
-    # 風險關鍵字
-    if any(x in name_lower for x in ["risk", "concern", "short", "warning", "decline", "loss", "debt"]):
-        return "Risk"
-    
-    # 財務數據/事件
-    if any(x in name_lower for x in ["revenue", "eps", "margin", "guidance", "$", "%"]):
-        return "Event"
-        
-    return "Entity"
+# 輸入檔 (驗證結果 + 情緒) 的雜湊；每次產生圖譜後寫進 {ticker}_render_cache.json
+# watchlist_graph 依此判斷個別圖譜是否需要重畫，不必為了確認而重跑 05 (那會改寫差異快照)
+def input_fingerprint(base_dir, ticker):
+    digest = hashlib.sha256()
+    for name in (f"{ticker.lower()}_triples_verified.json", f"{ticker.lower()}_sentiment.json"):
+        path = os.path.join(base_dir, name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
+
+def render_cache_path(base_dir, ticker):
+    return os.path.join(base_dir, f"{ticker.lower()}_render_cache.json")
 
 # 建立 NetworkX 圖形
 def build_graph(data, ticker):
@@ -57,18 +65,45 @@ def build_graph(data, ticker):
             G.add_node(head, label=head, title=head, color=COLOR_MAP.get(head_type, "#97c2fc"), group=head_type)
             G.add_node(tail, label=tail, title=tail, color=COLOR_MAP.get(tail_type, "#97c2fc"), group=tail_type)
 
-            G.add_edge(head, tail, title=relation, label=relation, arrows="to")
+            # tooltip 顯示 03 標註的證據句，不必回頭翻整篇文章
+            evidence = triple.get("evidence")
+            title = relation
+            if evidence:
+                title += "\n\n" + textwrap.fill(f"\"{evidence['text']}\"", TOOLTIP_WIDTH) + "\n" + textwrap.fill(f"({news.get('title', '')})", TOOLTIP_WIDTH)
 
-    # 根據 degree 動態設定節點大小
+            # 固定的邊 id 讓之後的差異補丁可以更新或刪除這條邊
+            G.add_edge(head, tail, id=graph_diff.edge_id(head, tail), title=title, label=relation, arrows="to")
+
+    apply_degree_sizing(G)
+
+    return G
+
+# 根據 degree 動態設定節點大小
+def apply_degree_sizing(G):
     degrees = dict(G.degree())
     for node in G.nodes():
         degree = degrees.get(node, 1)
         # degree 1 → size 10, degree 10+ → size 40, 上限 50
         size = min(10 + degree * 3, 50)
         G.nodes[node]["size"] = size
-
     return G
 
+# 將 NetworkX 圖轉成 Pyvis Network 並設定物理引擎參數
+def create_network(G):
+    net = Network(height="900px", width="100%", bgcolor="#111111", font_color="white", directed=True)
+    net.from_nx(G)
+
+    # 調整物理引擎參數
+    net.force_atlas_2based(
+        gravity=-50,
+        central_gravity=0.01,
+        spring_length=120,
+        spring_strength=0.08,
+        damping=0.4,
+        overlap=0
+    )
+    return net
+
 # 
 def inject_watermark(html_path, sentiment_data):
     if not sentiment_data:
@@ -89,8 +124,8 @@ def inject_watermark(html_path, sentiment_data):
     score = sentiment_data.get("score", 0)
     summary = sentiment_data.get("summary", "No summary available.")
 
-    # 設計浮水印的 HTML/CSS
-    watermark_html = f"""
+    # 設計浮水印的 HTML/CSS (前後加上標記，重新注入時會取代舊的)
+    watermark_html = f"""<!-- sentiment-watermark -->
     <div style="
         position: fixed; 
         bottom: 20px; 
@@ -114,36 +149,43 @@ def inject_watermark(html_path, sentiment_data):
             {summary}
         </p>
     </div>
-    """
+    <!-- /sentiment-watermark -->"""
 
     # 讀取原始 HTML
     with open(html_path, "r", encoding="utf-8") as f:
         content = f.read()
+    content = re.sub(r"<!-- sentiment-watermark -->.*?<!-- /sentiment-watermark -->\n?", "", content, flags=re.S)
 
     # 在 </body> 前插入浮水印
     if "</body>" in content:
         new_content = content.replace("</body>", f"{watermark_html}\n</body>")
         
-        # 寫回檔案
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(new_content)
+        # 以原子方式寫回檔案
+        atomic_write_text(html_path, new_content)
         print(" -> Watermark injected successfully.")
     else:
         print(" -> Error: Could not find </body> tag to inject watermark.")
 
 # 執行視覺化流程
-def run_visualization(ticker):
+# incremental=True 時與上次的快照比較，變動不大就只把差異補進既有 HTML，並標示新增的邊
+# output_root 預設為專案的 output/ 資料夾
+def run_visualization(ticker, incremental=True, output_root=None):
     print(f"Starting Visualization for {ticker}...")
     
     # 設定檔案路徑
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    base_dir = os.path.join(current_dir, "..", "output", f"{ticker.lower()}_data")
+    if output_root is None:
+        output_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
+    base_dir = os.path.join(output_root, f"{ticker.lower()}_data")
     
     triples_path = os.path.join(base_dir, f"{ticker.lower()}_triples_verified.json")
     sentiment_path = os.path.join(base_dir, f"{ticker.lower()}_sentiment.json")
     output_html_path = os.path.join(base_dir, f"{ticker.lower()}_knowledge_graph.html")
+    snapshot_path = os.path.join(base_dir, f"{ticker.lower()}_graph_snapshot.json")
+    base_snapshot_path = os.path.join(base_dir, f"{ticker.lower()}_graph_base.json")
+    delta_path = os.path.join(base_dir, f"{ticker.lower()}_graph_delta.json")
 
-    # 讀取資料
+    # 讀取資料 (先算輸入雜湊，確保記錄的是這次實際讀到的內容)
+    fingerprint = input_fingerprint(base_dir, ticker)
     triples_data = load_json(triples_path)
     sentiment_data = load_json(sentiment_path)
 
@@ -153,33 +195,54 @@ def run_visualization(ticker):
 
     # 建立圖譜
     print(f"Building graph from {len(triples_data)} documents...")
-    G = build_graph(triples_data, ticker)
-    
-    # 使用 Pyvis 生成基礎 HTML
-    net = Network(height="900px", width="100%", bgcolor="#111111", font_color="white", directed=True)
-    net.from_nx(G)
-    
-    # 調整物理引擎參數
-    net.force_atlas_2based(
-        gravity=-50,
-        central_gravity=0.01,
-        spring_length=120,
-        spring_strength=0.08,
-        damping=0.4,
-        overlap=0
-    )
-    
-    # 存檔 
-    net.write_html(output_html_path)
-    print(f"Graph generated at: {output_html_path}")
+    with tracing.span("build_graph", cat="render"):
+        G = build_graph(triples_data, ticker)
+
+    # 與上一次執行的快照比較，差異另存成 JSON 供「上次之後有什麼變化」查詢
+    with tracing.span("graph_diff", cat="render"):
+        current = graph_diff.graph_snapshot(G)
+        previous = load_json(snapshot_path) if os.path.exists(snapshot_path) else None
+        delta = graph_diff.diff_snapshots(previous, current)
+        highlight = graph_diff.highlighted_edges(delta) if previous else []
+    atomic_write_json(delta_path, delta)
+    print(f"Graph delta since last run: {graph_diff.summarize(delta)}")
+
+    # base 是目前 HTML 內嵌資料對應的快照；HTML 還在且差異不大時只套用補丁
+    base = load_json(base_snapshot_path) if os.path.exists(base_snapshot_path) else None
+    can_patch = incremental and base and os.path.exists(output_html_path) and graph_diff.patch_is_small(base, current)
+
+    if can_patch:
+        with tracing.span("apply_graph_patch", cat="render"):
+            can_patch = graph_diff.apply_patch_to_html(output_html_path, graph_diff.vis_patch(base, current, highlight))
+        if can_patch:
+            print(f"Graph patched with delta (Pyvis render skipped): {output_html_path}")
+
+    if not can_patch:
+        graph_diff.highlight_graph_edges(G, highlight)
+
+        # 使用 Pyvis 生成基礎 HTML
+        with tracing.span("pyvis.from_nx", cat="render", nodes=G.number_of_nodes(), edges=G.number_of_edges()):
+            net = create_network(G)
+
+        # 存檔：先寫到暫存檔再改名，避免中斷時留下不完整的 HTML
+        tmp_html_path = f"{output_html_path}.partial.html"
+        with tracing.span("write_html", cat="render"):
+            net.write_html(tmp_html_path)
+        os.replace(tmp_html_path, output_html_path)
+        atomic_write_json(base_snapshot_path, {**current, "highlighted": highlight})
+        print(f"Graph generated at: {output_html_path}")
+
+    atomic_write_json(snapshot_path, current)
 
     # 注入浮水印
     if sentiment_data:
         print("Injecting sentiment analysis watermark...")
-        inject_watermark(output_html_path, sentiment_data)
+        with tracing.span("inject_watermark", cat="render"):
+            inject_watermark(output_html_path, sentiment_data)
     else:
         print("Warning: No sentiment data found. Skipping watermark.")
 
+    atomic_write_json(render_cache_path(base_dir, ticker), {"fingerprint": fingerprint})
     return output_html_path
 
 if __name__ == "__main__":
@@ -1,22 +1,25 @@
 import streamlit as st
 import os
 import sys
-import importlib.util
+import json
 import time
+import threading
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# 讓 src/ 底下的共用模組 (chunking, kg_schema, exposure_index...) 可被直接匯入
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from exposure_index import ExposureIndex, update_index_for_ticker, default_index_path
+from module_loader import import_module_from_file
+import llm_gateway
+import tracing
+import graph_diff
+from watchlist_graph import run_watchlist_view, DEFAULT_MAX_NODES, DEFAULT_MAX_EDGES
 
 # 設定網頁標題與寬度
 st.set_page_config(page_title="AI Supply Chain Analyst", layout="wide")
 
-# 動態匯入模組函數
-def import_module_from_file(module_name, file_name):
-    file_path = os.path.join(os.path.dirname(__file__), file_name)
-    spec = importlib.util.spec_from_file_location(module_name, file_path)
-    module = importlib.util.module_from_spec(spec)
-    sys.modules[module_name] = module
-    spec.loader.exec_module(module)
-    return module
-
 # 載入所有模組 (快取以避免重複載入)
 @st.cache_resource
 def load_modules():
@@ -33,6 +36,16 @@ def load_modules():
 
 mod_01, mod_02, mod_03, mod_04, mod_05 = load_modules()
 
+# 曝險索引載入時要重建可達表，以檔案修改時間為 key 快取，索引更新後才重新載入
+# 快取的索引在各 session 間共用，查詢 API 不會修改它
+@st.cache_resource(max_entries=1)
+def load_exposure_index(index_mtime):
+    return ExposureIndex.load()
+
+def current_exposure_index():
+    path = default_index_path()
+    return load_exposure_index(os.path.getmtime(path) if os.path.exists(path) else None)
+
 # UI 介面設計
 st.title("AI Financial Supply Chain Risk Analyzer")
 st.markdown("Enter a stock ticker to automatically run: News Crawling -> Knowledge Extraction -> Relation Verification -> Sentiment Analysis -> Knowledge Graph")
@@ -41,6 +54,12 @@ st.markdown("Enter a stock ticker to automatically run: News Crawling -> Knowled
 with st.sidebar:
     st.header("Control Panel")
     ticker = st.text_input("Stock Ticker", value="PLTR").upper()
+    single_pass = st.checkbox("Single-pass extract & verify (fewer LLM calls)", value=False)
+    rolling_sentiment = st.checkbox("Rolling sentiment (score only new articles)", value=False)
+    resume_run = st.checkbox("Resume interrupted run (skip completed articles)", value=False)
+    stream_extraction = st.checkbox("Stream extraction (show triples as they arrive)", value=False)
+    record_trace = st.checkbox("Record timeline trace (Perfetto)", value=False)
+    profile_stages = st.checkbox("Profile stages (cProfile + tracemalloc)", value=False)
     run_btn = st.button("Start Analysis", type="primary")
 
 # 主執行邏輯
@@ -48,52 +67,173 @@ if run_btn and ticker:
     status_area = st.empty()
     progress_bar = st.progress(0)
     
-    try:
-        # Step 1
-        status_area.info(f"Step 1: Crawling news for {ticker}...")
-        news_file = mod_01.run_data_collection(ticker)
-        progress_bar.progress(20)
-        
-        # Step 2
-        status_area.info("Step 2: Running LLM knowledge triple extraction (this may take a while)...")
-        draft_file = mod_02.run_llm_extraction(news_file, ticker)
-        progress_bar.progress(40)
+    # 追蹤檔與 profile 輸出位置
+    trace_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output", "traces")
+    trace_path = os.path.join(trace_dir, f"{ticker.lower()}_trace.json")
+    if record_trace or profile_stages:
+        tracing.enable_tracing(os.path.join(trace_dir, f"{ticker.lower()}_profile") if profile_stages else None)
+
+    # 網頁上的分析屬於互動式工作，LLM gateway 會讓它優先於背景批次工作
+    with llm_gateway.priority_scope(llm_gateway.INTERACTIVE):
+        try:
+            # Step 1
+            status_area.info(f"Step 1: Crawling news for {ticker}...")
+            with tracing.stage("01_data_collection", ticker=ticker):
+                news_file = mod_01.run_data_collection(ticker, resume=resume_run)
+            progress_bar.progress(20)
+            if not news_file:
+                raise RuntimeError(f"Data collection produced no news file for {ticker}.")
         
-        # Step 3
-        status_area.info("Step 3: Running GPT auto verification and cleaning...")
-        verified_file = mod_03.run_auto_verifier(draft_file, news_file, ticker)
-        progress_bar.progress(60)
+            if single_pass:
+                # Step 2 + 3 合併為一次呼叫
+                status_area.info("Step 2-3: Running single-pass extraction and verification (this may take a while)...")
+                with tracing.stage("02_single_pass", ticker=ticker):
+                    verified_file = mod_02.run_single_pass_extraction(news_file, ticker, resume=resume_run)
+                progress_bar.progress(60)
+            else:
+                # Step 2
+                status_area.info("Step 2: Running LLM knowledge triple extraction (this may take a while)...")
+                on_triple = None
+                if stream_extraction:
+                    live_area = st.empty()
+                    live_triples = []
+                    live_lock = threading.Lock()
+                    script_ctx = get_script_run_ctx()
+
+                    # on_triple 在 chunk 工作執行緒中被呼叫，需附上 script context 才能更新畫面
+                    def on_triple(triple):
+                        add_script_run_ctx(threading.current_thread(), script_ctx)
+                        with live_lock:
+                            live_triples.append({"head": triple["head"], "relation": triple["relation"], "tail": triple["tail"]})
+                            live_area.table(live_triples[-20:])
+
+                with tracing.stage("02_llm_extraction", ticker=ticker):
+                    draft_file = mod_02.run_llm_extraction(news_file, ticker, stream=stream_extraction, on_triple=on_triple, resume=resume_run)
+                progress_bar.progress(40)
+                if not draft_file:
+                    raise RuntimeError("Extraction produced no draft file.")
+
+                # Step 3
+                status_area.info("Step 3: Running GPT auto verification and cleaning...")
+                with tracing.stage("03_auto_verifier", ticker=ticker):
+                    verified_file = mod_03.run_auto_verifier(draft_file, news_file, ticker, resume=resume_run)
+                progress_bar.progress(60)
+
+            # 驗證失敗時沒有輸出檔，後面的情緒分析與視覺化無法執行
+            if not verified_file:
+                raise RuntimeError("Extraction / verification produced no verified file; skipping sentiment and visualization.")
+
+            # 把新的驗證結果併入跨 ticker 的曝險索引
+            with tracing.stage("exposure_index", ticker=ticker):
+                update_index_for_ticker(ticker, verified_file)
         
-        # Step 4
-        status_area.info("Step 4: Analyzing market sentiment...")
-        sentiment_file = mod_04.run_market_sentiment(verified_file, ticker)
-        progress_bar.progress(80)
+            # Step 4
+            status_area.info("Step 4: Analyzing market sentiment...")
+            with tracing.stage("04_market_sentiment", ticker=ticker):
+                if rolling_sentiment:
+                    sentiment_file = mod_04.run_rolling_sentiment(verified_file, ticker)
+                else:
+                    sentiment_file = mod_04.run_market_sentiment(verified_file, ticker)
+            progress_bar.progress(80)
         
-        # Step 5
-        status_area.info("Step 5: Generating interactive knowledge graph...")
-        html_path = mod_05.run_visualization(ticker)
-        progress_bar.progress(100)
+            # Step 5
+            status_area.info("Step 5: Generating interactive knowledge graph...")
+            with tracing.stage("05_visualization", ticker=ticker):
+                html_path = mod_05.run_visualization(ticker)
+            progress_bar.progress(100)
         
-        status_area.success("Analysis completed!")
+            status_area.success("Analysis completed!")
         
-        # 顯示結果
-        st.subheader(f"{ticker} Supply Chain Risk Knowledge Graph")
+            # 顯示結果
+            st.subheader(f"{ticker} Supply Chain Risk Knowledge Graph")
         
-        # 讀取 HTML 並顯示在網頁中
-        with open(html_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+            # 上次執行之後新增 / 刪除 / 變更的邊 (新增的邊在圖上以螢光綠標示)
+            delta_path = os.path.join(os.path.dirname(html_path), f"{ticker.lower()}_graph_delta.json")
+            if os.path.exists(delta_path):
+                with open(delta_path, "r", encoding="utf-8") as f:
+                    delta = json.load(f)
+                with st.expander(f"What changed since last run ({delta.get('since') or 'first run'})"):
+                    st.json(graph_diff.summarize(delta))
+                    st.table([
+                        {"change": change, "head": edge["from"], "relation": edge["label"], "tail": edge["to"]}
+                        for change in ("added", "changed", "removed")
+                        for edge in delta["edges"][change].values()
+                    ][:200])
+
+            # 讀取 HTML 並顯示在網頁中
+            with open(html_path, 'r', encoding='utf-8') as f:
+                html_content = f.read()
         
-        # 使用 iframe 嵌入互動圖表
-        components.html(html_content, height=850, scrolling=True)
+            # 使用 iframe 嵌入互動圖表
+            components.html(html_content, height=850, scrolling=True)
         
-        # 提供下載按鈕
-        with open(html_path, "rb") as f:
-            st.download_button(
-                label="Download HTML Report",
-                data=f,
-                file_name=f"{ticker}_report.html",
-                mime="text/html"
-            )
+            # 提供下載按鈕
+            with open(html_path, "rb") as f:
+                st.download_button(
+                    label="Download HTML Report",
+                    data=f,
+                    file_name=f"{ticker}_report.html",
+                    mime="text/html"
+                )
 
-    except Exception as e:
-        status_area.error(f"An error occurred during execution: {str(e)}")
\ No newline at end of file
+        except Exception as e:
+            status_area.error(f"An error occurred during execution: {str(e)}")
+
+        finally:
+            # 失敗時也保留 trace，方便找出卡在哪個階段
+            if tracing.is_enabled():
+                tracing.save_trace(trace_path)
+                tracing.disable_tracing()
+                with open(trace_path, "rb") as f:
+                    st.download_button(
+                        label="Download Trace (open in ui.perfetto.dev)",
+                        data=f,
+                        file_name=f"{ticker}_trace.json",
+                        mime="application/json"
+                    )
+
+# 跨 ticker 曝險查詢 (使用預先計算的 k-hop 索引，不需重建圖)
+st.divider()
+st.subheader("Cross-Ticker Exposure Query")
+query_col, hops_col = st.columns([3, 1])
+with query_col:
+    query_entity = st.text_input("Entity (e.g., a supplier or risk)", value="")
+with hops_col:
+    query_hops = st.number_input("Max hops", min_value=1, max_value=3, value=2)
+
+if query_entity:
+    exposure_index = current_exposure_index()
+    exposed = exposure_index.exposed_tickers(query_entity, int(query_hops))
+    if exposed:
+        st.table(exposed)
+        for item in exposed:
+            path = exposure_index.find_path(query_entity, item["via"], int(query_hops))
+            if path:
+                st.caption(" -> ".join([path[0]["head"]] + [f"[{'/'.join(p['relations'])}] {p['tail']}" for p in path]))
+    else:
+        st.info("No indexed tickers within the selected hops. Run an analysis first to build the index.")
+
+# 多 ticker 合併視圖：共同實體成為橋接節點，各 ticker 圖譜平行產生並快取
+st.divider()
+st.subheader("Watchlist Merged Graph")
+watchlist_input = st.text_input("Tickers (comma separated, already analyzed)", value="")
+lod_nodes_col, lod_edges_col = st.columns(2)
+with lod_nodes_col:
+    lod_nodes = st.slider("Max nodes", min_value=50, max_value=2000, value=DEFAULT_MAX_NODES, step=50)
+with lod_edges_col:
+    lod_edges = st.slider("Max edges", min_value=100, max_value=5000, value=DEFAULT_MAX_EDGES, step=100)
+
+if st.button("Build Merged Graph"):
+    watchlist = [t.strip().upper() for t in watchlist_input.split(",") if t.strip()]
+    if len(watchlist) < 2:
+        st.warning("Enter at least two tickers.")
+    else:
+        with st.spinner("Rendering ticker graphs in parallel and merging..."):
+            view = run_watchlist_view(watchlist, max_nodes=lod_nodes, max_edges=lod_edges)
+        stats = view["stats"]
+        st.caption(
+            f"{stats.get('nodes', 0)} nodes / {stats.get('edges', 0)} edges shown, {stats.get('bridges', 0)} bridge entities"
+            f"{' (cached)' if view['cached'] else ''}"
+        )
+        with open(view["html"], "r", encoding="utf-8") as f:
+            components.html(f.read(), height=850, scrolling=True)
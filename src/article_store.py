@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+import os
+import glob
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import threading
+from checkpoint import atomic_write_json
+
+# 有安裝 zstandard 就用 zstd，否則退回標準函式庫的 gzip；讀取時兩種格式都支援
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 跨 ticker 共用的文章全文庫：同一篇文章 (清洗後段落相同) 只存一份壓縮檔
+# 各 ticker 的 {ticker}_news.json 只保留 metadata 與 content_hash
+# gc 只刪除超過這個秒數未被寫入的文章：正在執行的 pipeline 已 put、但還沒寫進 WAL / 新聞檔的文章不會被誤刪
+DEFAULT_GC_MIN_AGE = 6 * 3600
+
+def default_store_dir():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output", "article_store"))
+
+def default_output_root():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output"))
+
+# 以清洗後段落的內容計算雜湊，不含標題、網址等 metadata
+def content_hash(paragraphs):
+    payload = json.dumps(list(paragraphs), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=9), ".gz"
+
+def _decompress(data, suffix):
+    if suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("Article was stored with zstd; install zstandard to read it.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class ArticleStore:
+    def __init__(self, root=None):
+        self.root = root or default_store_dir()
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.index_path = os.path.join(self.root, "index.json")
+        self.lock = threading.Lock()
+        self.index = {}
+        self.dirty = False
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    # objects/ab/abcdef....zst，前兩碼分資料夾避免單一目錄檔案過多
+    def _object_base(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _find_object(self, digest):
+        base = self._object_base(digest)
+        for suffix in (".zst", ".gz"):
+            if os.path.exists(base + suffix):
+                return base + suffix, suffix
+        return None, None
+
+    def has(self, digest):
+        return self._find_object(digest)[0] is not None
+
+    # 寫入段落並回傳雜湊；內容已存在時不重複寫入
+    def put(self, paragraphs, news_id=None):
+        digest = content_hash(paragraphs)
+        existing, _ = self._find_object(digest)
+        if existing:
+            # 更新修改時間，讓 gc 視為最近使用
+            os.utime(existing)
+        else:
+            data, suffix = _compress(json.dumps(list(paragraphs), ensure_ascii=False).encode("utf-8"))
+            path = self._object_base(digest) + suffix
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        if news_id:
+            with self.lock:
+                if self.index.get(news_id) != digest:
+                    self.index[news_id] = digest
+                    self.dirty = True
+        return digest
+
+    def get(self, digest):
+        path, suffix = self._find_object(digest)
+        if path is None:
+            raise KeyError(f"Article {digest} not found in store {self.root}")
+        with open(path, "rb") as f:
+            return json.loads(_decompress(f.read(), suffix).decode("utf-8"))
+
+    # 依 news_id 隨機讀取單篇文章，不需載入任何 ticker 檔
+    def get_by_news_id(self, news_id):
+        digest = self.index.get(news_id)
+        return self.get(digest) if digest else None
+
+    def save_index(self):
+        with self.lock:
+            if not self.dirty:
+                return self.index_path
+            data = dict(self.index)
+            self.dirty = False
+        atomic_write_json(self.index_path, data, indent=None)
+        return self.index_path
+
+    def object_paths(self):
+        return glob.glob(os.path.join(self.objects_dir, "*", "*.zst")) + glob.glob(os.path.join(self.objects_dir, "*", "*.gz"))
+
+    def stats(self):
+        paths = self.object_paths()
+        return {
+            "articles": len(paths),
+            "indexed_news_ids": len(self.index),
+            "bytes": sum(os.path.getsize(p) for p in paths)
+        }
+
+    # 刪除沒有被任何 ticker 檔 (含未完成的 WAL) 引用、且超過 min_age 秒沒有寫入的文章
+    def gc(self, output_root=None, dry_run=False, min_age=DEFAULT_GC_MIN_AGE):
+        cutoff = time.time() - min_age
+        referenced = collect_references(output_root or default_output_root())
+        removed = []
+        freed = 0
+        for path in self.object_paths():
+            digest = os.path.basename(path).split(".")[0]
+            if digest in referenced or os.path.getmtime(path) > cutoff:
+                continue
+            removed.append(digest)
+            freed += os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+
+        if not dry_run:
+            with self.lock:
+                removed_set = set(removed)
+                stale = [news_id for news_id, digest in self.index.items() if digest in removed_set]
+                for news_id in stale:
+                    del self.index[news_id]
+                self.dirty = self.dirty or bool(stale)
+            self.save_index()
+
+        print(f"{'Would remove' if dry_run else 'Removed'} {len(removed)} unreferenced articles ({freed / 1024:.1f} KB)")
+        return removed
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArticleStore()
+        return _default_store
+
+# 掃描所有 ticker 的新聞檔與 WAL，收集仍被引用的 content_hash
+def collect_references(output_root):
+    referenced = set()
+    for path in glob.glob(os.path.join(output_root, "*_data", "*_news.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for news in json.load(f):
+                if news.get("content_hash"):
+                    referenced.add(news["content_hash"])
+    for path in glob.glob(os.path.join(output_root, "*_data", "*_news.json.wal.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                value = record.get("value") if isinstance(record, dict) else None
+                if isinstance(value, dict) and value.get("content_hash"):
+                    referenced.add(value["content_hash"])
+    return referenced
+
+# 把全文移進 store，entry 只保留 content_hash
+def dehydrate(news, store=None):
+    if "content" not in news:
+        return news
+    store = store or get_store()
+    entry = {k: v for k, v in news.items() if k != "content"}
+    entry["content_hash"] = store.put(news["content"], news.get("news_id"))
+    return entry
+
+# 依 content_hash 取回全文；舊格式 (內嵌 content) 直接沿用
+def hydrate(news, store=None):
+    if "content" in news or not news.get("content_hash"):
+        return news
+    store = store or get_store()
+    entry = dict(news)
+    entry["content"] = store.get(news["content_hash"])
+    return entry
+
+# 讀取 {ticker}_news.json 並還原全文，給 02 / 03 等需要內文的模組使用
+def load_news(path, store=None):
+    if not os.path.exists(path):
+        print(f"File not found: {path}")
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        news_list = json.load(f)
+    store = store or get_store()
+    return [hydrate(news, store) for news in news_list]
+
+# 把舊的內嵌全文新聞檔轉成引用格式
+def migrate_news_file(path, store=None):
+    store = store or get_store()
+    with open(path, "r", encoding="utf-8") as f:
+        news_list = json.load(f)
+    before = os.path.getsize(path)
+    atomic_write_json(path, [dehydrate(news, store) for news in news_list], indent=4)
+    store.save_index()
+    return before, os.path.getsize(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the shared content-addressed article store.")
+    parser.add_argument("--store", help="store directory (default: output/article_store)")
+    parser.add_argument("--output-root", help="directory holding {ticker}_data folders (default: output)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="print article count and disk usage")
+    p_gc = sub.add_parser("gc", help="delete articles no longer referenced by any ticker")
+    p_gc.add_argument("--dry-run", action="store_true")
+    p_gc.add_argument("--min-age", type=float, default=DEFAULT_GC_MIN_AGE, help="only delete articles not written for this many seconds")
+    sub.add_parser("migrate", help="move inline article text of existing ticker files into the store")
+    p_get = sub.add_parser("get", help="print one article by news_id")
+    p_get.add_argument("news_id")
+    args = parser.parse_args()
+
+    store = ArticleStore(args.store)
+    output_root = args.output_root or default_output_root()
+
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "gc":
+        store.gc(output_root, args.dry_run, args.min_age)
+    elif args.command == "migrate":
+        for path in sorted(glob.glob(os.path.join(output_root, "*_data", "*_news.json"))):
+            before, after = migrate_news_file(path, store)
+            print(f"{path}: {before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+        print(json.dumps(store.stats(), indent=2))
+    else:
+        paragraphs = store.get_by_news_id(args.news_id)
+        if paragraphs is None:
+            print(f"news_id {args.news_id} not found in store index.")
+        else:
+            print("\n\n".join(paragraphs))
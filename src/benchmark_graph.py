@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime, timezone
+from module_loader import import_module_from_file
+
+# 以合成三元組量測 05 各階段 (實體分類、建圖 (含 degree sizing)、degree sizing 單獨、Pyvis 轉換、HTML 輸出、浮水印) 的耗時與記憶體
+# 用法：python src/benchmark_graph.py --sizes 1000 10000 100000 --compare output/benchmarks/<舊結果>.json
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# 超過此三元組數就跳過 Pyvis/HTML 階段 (輸出檔會大到瀏覽器無法開啟)，可用 --render-limit 調整
+DEFAULT_RENDER_LIMIT = 100000
+
+# 依實際輸出觀察到的關係分佈設定權重：報導、宣布類最常見，風險類次之
+RELATION_DISTRIBUTION = {
+    "REPORTS": 18, "ANNOUNCES": 12, "AFFECTS": 10, "COMMENTS_ON": 8, "INCREASES": 6,
+    "DECREASES": 5, "PARTNERS_WITH": 5, "LAUNCHES": 4, "EXPANDS": 4, "INVESTS_IN": 4,
+    "WARNS": 3, "COMPETES_WITH": 3, "DEVELOPS": 3, "BENEFITS_FROM": 3, "LOWERS": 2,
+    "OWNS": 2, "DELAYS": 2, "HAMPERS": 2, "REGULATES": 1, "MISSES": 1, "INCURS": 1,
+    "CANCELS": 1, "REDUCES": 1, "WITHDRAWS": 1, "SCALE_BACK": 1, "MANAGES": 1, "TESTIFIES_BEFORE": 1,
+}
+
+# 實體名稱樣板，刻意涵蓋 infer_entity_type 的各個分支 (ticker、風險、財務數據、一般實體)
+ENTITY_TEMPLATES = [
+    "{ticker} Inc.", "{ticker} Q{q} revenue", "{ticker} EPS guidance", "Supplier {i}", "Customer {i}",
+    "Regulator {i}", "Product line {i}", "Supply risk {i}", "Debt concern {i}", "Analyst {i}",
+    "Margin outlook {i}", "{pct}% price target change", "Factory {i}", "Chip shortage {i}",
+]
+
+# 產生 n 個三元組，實體出現頻率近似 Zipf 分佈 (少數核心節點、大量長尾節點)
+def generate_synthetic_triples(n, ticker="SYNTH", triples_per_news=15, seed=42):
+    rng = random.Random(seed)
+    relations = list(RELATION_DISTRIBUTION)
+    relation_weights = list(RELATION_DISTRIBUTION.values())
+
+    entity_count = max(50, int(n ** 0.8))
+    entities = []
+    for i in range(entity_count):
+        template = ENTITY_TEMPLATES[i % len(ENTITY_TEMPLATES)]
+        entities.append(template.format(ticker=ticker, i=i, q=i % 4 + 1, pct=i % 40))
+    entity_weights = [1.0 / (rank + 1) for rank in range(entity_count)]
+
+    heads = rng.choices(entities, weights=entity_weights, k=n)
+    tails = rng.choices(entities, weights=entity_weights, k=n)
+    rels = rng.choices(relations, weights=relation_weights, k=n)
+
+    data = []
+    for start in range(0, n, triples_per_news):
+        data.append({
+            "news_id": f"news_synthetic_{start // triples_per_news}",
+            "title": f"Synthetic article {start // triples_per_news}",
+            "publish_time": "2026-01-01T00:00:00Z",
+            "triples": [
+                {"head": heads[i], "relation": rels[i], "tail": tails[i]}
+                for i in range(start, min(start + triples_per_news, n))
+            ]
+        })
+    return data
+
+# 量測一個階段的耗時與 tracemalloc 峰值記憶體
+# tracemalloc 會讓執行慢上數倍，所以先在沒有追蹤的情況下計時，再另外跑一次量記憶體 (回傳第一次的結果)
+def measure(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": round(elapsed, 4), "peak_mb": round(peak / 1024 / 1024, 2)}
+
+def run_benchmark(sizes, output_dir, render_limit=DEFAULT_RENDER_LIMIT, ticker="SYNTH"):
+    viz = import_module_from_file("mod_05", "05_interactive_visualization.py")
+    os.makedirs(output_dir, exist_ok=True)
+
+    sentiment = {"signal": "Neutral", "score": 0, "summary": "Synthetic benchmark run."}
+    results = []
+
+    for n in sizes:
+        print(f"\nBenchmarking {n} triples...")
+        data = generate_synthetic_triples(n, ticker)
+        stages = {}
+
+        def type_entities():
+            types = {}
+            for news in data:
+                for triple in news["triples"]:
+                    for name in (triple["head"], triple["tail"]):
+                        types[name] = viz.infer_entity_type(name, ticker)
+            return types
+
+        _, stages["entity_typing"] = measure(type_entities)
+        # build_graph 內已呼叫 apply_degree_sizing，所以 graph_build+sizing 包含 sizing 的時間；
+        # degree_sizing 在建好的圖上單獨重跑一次，用來看 sizing 本身的成本 (兩者不可相加)
+        G, stages["graph_build+sizing"] = measure(viz.build_graph, data, ticker)
+        _, stages["degree_sizing"] = measure(viz.apply_degree_sizing, G)
+
+        entry = {
+            "triples": n,
+            "nodes": G.number_of_nodes(),
+            "edges": G.number_of_edges(),
+            "stages": stages
+        }
+
+        if n <= render_limit:
+            html_path = os.path.join(output_dir, f"bench_{n}.html")
+            net, stages["pyvis_from_nx"] = measure(viz.create_network, G)
+            _, stages["write_html"] = measure(net.write_html, html_path)
+            _, stages["inject_watermark"] = measure(viz.inject_watermark, html_path, sentiment)
+            entry["html_bytes"] = os.path.getsize(html_path)
+            os.remove(html_path)
+        else:
+            entry["render_skipped"] = f"above render limit ({render_limit})"
+
+        for name, stat in stages.items():
+            print(f"  {name:<18} {stat['seconds']:>9.3f}s  peak {stat['peak_mb']:>9.2f} MB")
+        if "html_bytes" in entry:
+            print(f"  html size          {entry['html_bytes'] / 1024 / 1024:>9.2f} MB")
+        results.append(entry)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "render_limit": render_limit,
+        "results": results
+    }
+
+# 與先前的結果比較，列出各階段耗時與記憶體的倍率變化
+def compare_reports(previous, current):
+    previous_map = {r["triples"]: r for r in previous.get("results", [])}
+    print("\nComparison against previous run (current / previous):")
+    for entry in current["results"]:
+        old = previous_map.get(entry["triples"])
+        if not old:
+            continue
+        for stage, stat in entry["stages"].items():
+            old_stat = old.get("stages", {}).get(stage)
+            if not old_stat or not old_stat["seconds"]:
+                continue
+            time_ratio = stat["seconds"] / old_stat["seconds"]
+            mem_ratio = stat["peak_mb"] / old_stat["peak_mb"] if old_stat["peak_mb"] else 0
+            flag = "  <-- regression" if time_ratio > 1.2 else ""
+            print(f"  {entry['triples']:>8} {stage:<18} time x{time_ratio:.2f}  memory x{mem_ratio:.2f}{flag}")
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    default_output = os.path.normpath(os.path.join(current_dir, "..", "output", "benchmarks"))
+
+    parser = argparse.ArgumentParser(description="Synthetic-scale benchmark for graph build and HTML rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--render-limit", type=int, default=DEFAULT_RENDER_LIMIT)
+    parser.add_argument("--output-dir", default=default_output)
+    parser.add_argument("--compare", help="previous benchmark JSON to diff against")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sizes, args.output_dir, args.render_limit)
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report_path = os.path.join(args.output_dir, f"graph_benchmark_{stamp}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nBenchmark results saved to: {report_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_reports(json.load(f), report)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import tempfile
+
+# 先寫到同資料夾的暫存檔，fsync 後再 os.replace，確保不會留下寫一半的 JSON
+def atomic_write_json(path, data, indent=2):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# 文字檔 (例如 HTML) 的原子寫入
+def atomic_write_text(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=os.path.splitext(path)[1], dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# 每個輸出檔對應一個 write-ahead log ({output}.wal.jsonl)，每完成一篇文章就追加一行
+# 正式輸出檔只在 finalize 時以原子方式寫出，之後刪除 WAL (仍有失敗項目時保留，讓 resume 重試)
+class Checkpoint:
+    def __init__(self, output_path, resume=False):
+        self.output_path = output_path
+        self.wal_path = f"{output_path}.wal.jsonl"
+        self.completed = {}
+        self.failed = set()
+
+        if resume:
+            self.completed = self._load()
+            if self.completed:
+                print(f"Resuming from checkpoint: {len(self.completed)} items already completed ({self.wal_path})")
+        elif os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
+
+    # 讀回 WAL，最後一行若因中斷而不完整就忽略，並重寫 WAL 避免之後的追加接在壞行後面
+    def _load(self):
+        completed = {}
+        if not os.path.exists(self.wal_path):
+            return completed
+        truncated = False
+        with open(self.wal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print("Ignoring truncated checkpoint record.")
+                    truncated = True
+                    continue
+                completed[record["key"]] = record["value"]
+
+        if truncated:
+            lines = "".join(
+                json.dumps({"key": k, "value": v}, ensure_ascii=False) + "\n" for k, v in completed.items()
+            )
+            atomic_write_text(self.wal_path, lines)
+        return completed
+
+    def is_done(self, key):
+        return key in self.completed
+
+    def get(self, key):
+        return self.completed.get(key)
+
+    def record(self, key, value):
+        self.completed[key] = value
+        with open(self.wal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "value": value}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # 失敗的項目不寫入 WAL，finalize 時會保留 WAL，下次 --resume 只重跑這些項目
+    def mark_failed(self, key):
+        self.failed.add(key)
+
+    # 把上一次正式輸出中已完成的項目視為完成 (不寫入 WAL)，增量執行時只處理新的項目
+    def prefill(self, items):
+        for key, value in items.items():
+            self.completed.setdefault(key, value)
+
+    def finalize(self, data, indent=2):
+        atomic_write_json(self.output_path, data, indent)
+        if self.failed:
+            # WAL 可能還沒建立 (所有項目都失敗)，建立空檔讓 resume 知道有檢查點
+            open(self.wal_path, "a", encoding="utf-8").close()
+            print(f"{len(self.failed)} item(s) failed; checkpoint kept at {self.wal_path}, rerun with resume to retry them.")
+        elif os.path.exists(self.wal_path):
+            os.remove(self.wal_path)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import re
+
+# 每個 chunk 的 token 預算，02 抽取與 03 驗證共用同一個切分結果
+DEFAULT_CHUNK_TOKENS = 1500
+
+# 有安裝 tiktoken 就用精準計數，否則以「約 4 個字元 = 1 token」估算
+try:
+    import tiktoken
+    _ENCODER = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODER = None
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?。！？])\s+")
+
+# 估算文字的 token 數
+def estimate_tokens(text):
+    if not text:
+        return 0
+    if _ENCODER is not None:
+        return len(_ENCODER.encode(text))
+    return max(1, len(text) // 4)
+
+# 把過長的句子硬切成不超過 max_tokens 的片段
+# 有 tiktoken 時依 token 切：用每個 token 的起始字元位置切原字串，避免多位元組字元被切成亂碼；
+# 沒有時以「約 4 個字元 = 1 token」切字元
+def hard_split(text, max_tokens):
+    if _ENCODER is None:
+        step = max_tokens * 4
+        return [text[start:start + step] for start in range(0, len(text), step)]
+
+    decoded, offsets = _ENCODER.decode_with_offsets(_ENCODER.encode(text))
+    cuts = sorted({offsets[i] for i in range(max_tokens, len(offsets), max_tokens)} - {0})
+    bounds = [0] + cuts + [len(decoded)]
+    return [decoded[start:end] for start, end in zip(bounds, bounds[1:]) if decoded[start:end]]
+
+# 把超過預算的單一段落再依句子切開，句子仍過長就直接硬切
+def split_long_paragraph(paragraph, max_tokens):
+    pieces = []
+    for sentence in SENTENCE_PATTERN.split(paragraph):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        pieces.extend(hard_split(sentence, max_tokens))
+    return pieces
+
+# 依段落邊界把文章切成多個 chunk，每個 chunk 不超過 max_tokens
+def split_into_chunks(paragraphs, max_tokens=DEFAULT_CHUNK_TOKENS):
+    if isinstance(paragraphs, str):
+        paragraphs = [paragraphs]
+
+    units = []
+    for paragraph in paragraphs:
+        paragraph = str(paragraph).strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) > max_tokens:
+            units.extend(split_long_paragraph(paragraph, max_tokens))
+        else:
+            units.append(paragraph)
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += unit_tokens
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return chunks
+
+# 三元組去重用的 key，忽略大小寫與前後空白
+def triple_key(triple):
+    return (
+        str(triple.get("head", "")).strip().lower(),
+        str(triple.get("relation", "")).strip().upper(),
+        str(triple.get("tail", "")).strip().lower(),
+    )
+
+# 合併各 chunk 抽出的三元組並去重，保留第一次出現的 chunk_index
+def merge_chunk_triples(chunk_results):
+    merged = []
+    seen = set()
+    for chunk_index, triples in enumerate(chunk_results):
+        for triple in triples or []:
+            if not isinstance(triple, dict):
+                continue
+            if not triple.get("head") or not triple.get("relation") or not triple.get("tail"):
+                continue
+            key = triple_key(triple)
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = dict(triple)
+            entry["chunk_index"] = chunk_index
+            merged.append(entry)
+    return merged
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import argparse
+from chunking import DEFAULT_CHUNK_TOKENS, estimate_tokens, split_into_chunks, triple_key
+from kg_schema import VALID_RELATIONS
+from article_store import load_news
+
+# 離線比較「兩段式 (02 + 03)」與「單次抽取 + 驗證」的品質與成本，不會呼叫任何 LLM
+# 用法：python src/compare_extraction_modes.py news.json two_pass_verified.json single_pass_verified.json
+
+def load_json(filepath):
+    if not os.path.exists(filepath):
+        print(f"File not found: {filepath}")
+        return []
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def collect_triples(data):
+    triples = {}
+    for news in data:
+        for triple in news.get("triples", []):
+            triples[triple_key(triple)] = triple
+    return triples
+
+# 以文章 token 數估算兩種模式送出的輸入量與呼叫次數
+def estimate_cost(news_data, verified_data, passes):
+    verified_map = {news["news_id"]: news for news in verified_data}
+    calls = 0
+    input_tokens = 0
+    for news in news_data:
+        entry = verified_map.get(news["news_id"])
+        if entry is None:
+            continue
+        chunks = split_into_chunks(news.get("content", []), entry.get("chunk_tokens", DEFAULT_CHUNK_TOKENS))
+        calls += len(chunks) * passes
+        input_tokens += sum(estimate_tokens(c) for c in chunks) * passes
+    return {"llm_calls": calls, "article_input_tokens": input_tokens}
+
+def compare_modes(news_data, two_pass_data, single_pass_data):
+    reference = collect_triples(two_pass_data)
+    candidate = collect_triples(single_pass_data)
+
+    shared = set(reference) & set(candidate)
+    precision = len(shared) / len(candidate) if candidate else 0.0
+    recall = len(shared) / len(reference) if reference else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    # 同一組 (head, tail) 下兩種模式給出的關係是否一致
+    reference_pairs = {(k[0], k[2]): k[1] for k in reference}
+    candidate_pairs = {(k[0], k[2]): k[1] for k in candidate}
+    common_pairs = set(reference_pairs) & set(candidate_pairs)
+    relation_agreement = (
+        sum(1 for p in common_pairs if reference_pairs[p] == candidate_pairs[p]) / len(common_pairs)
+        if common_pairs else 0.0
+    )
+
+    def schema_rate(triples):
+        if not triples:
+            return 0.0
+        return sum(1 for k in triples if k[1] in VALID_RELATIONS) / len(triples)
+
+    return {
+        "two_pass": {
+            "triples": len(reference),
+            "schema_valid_rate": round(schema_rate(reference), 4),
+            **estimate_cost(news_data, two_pass_data, passes=2)
+        },
+        "single_pass": {
+            "triples": len(candidate),
+            "schema_valid_rate": round(schema_rate(candidate), 4),
+            **estimate_cost(news_data, single_pass_data, passes=1)
+        },
+        "agreement": {
+            "shared_triples": len(shared),
+            "precision_vs_two_pass": round(precision, 4),
+            "recall_vs_two_pass": round(recall, 4),
+            "f1_vs_two_pass": round(f1, 4),
+            "relation_agreement_on_shared_pairs": round(relation_agreement, 4)
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two-pass and single-pass extraction outputs offline.")
+    parser.add_argument("news_file", help="{ticker}_news.json from module 01")
+    parser.add_argument("two_pass_file", help="verified triples produced by 02 + 03")
+    parser.add_argument("single_pass_file", help="verified triples produced by 02 single-pass mode")
+    parser.add_argument("--output", help="optional path to save the comparison report as JSON")
+    args = parser.parse_args()
+
+    report = compare_modes(
+        load_news(args.news_file),
+        load_json(args.two_pass_file),
+        load_json(args.single_pass_file)
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Comparison report saved to: {args.output}")
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import argparse
+from checkpoint import atomic_write_json
+
+# 文章段落的倒排索引：正規化後的實體 token -> 句子 (段落編號, 字元起訖)
+# 01 抓完新聞時建立；03 用它只把相關句子送給驗證器；02/03 用它替每個三元組標上最佳證據句
+
+# tooltip 與驗證 prompt 中證據句的長度上限 (字元)
+MAX_SNIPPET_CHARS = 300
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "by", "with", "from", "as",
+    "is", "are", "was", "were", "be", "its", "it", "this", "that", "inc", "corp", "co", "ltd", "plc", "llc"
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9&$%.\-]*")
+_SENTENCE_RE = re.compile(r"[^.!?]+(?:[.!?]+[\"')\]]*|$)")
+
+# 小寫、去標點、去停用詞，並去掉複數結尾，讓 "Suppliers" 與 "supplier" 對得上
+def normalize_tokens(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(str(text).lower()):
+        token = token.strip(".-")
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        tokens.append(token)
+    return tokens
+
+# 回傳段落內每個句子的 (start, end) 字元位置
+def split_sentences(paragraph):
+    spans = []
+    for match in _SENTENCE_RE.finditer(paragraph):
+        start, end = match.start(), match.end()
+        while start < end and paragraph[start].isspace():
+            start += 1
+        while end > start and paragraph[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end))
+    return spans
+
+# 單篇文章的索引：sentences[i] = [段落編號, start, end]，postings[token] = [句子編號...]
+def build_article_index(paragraphs):
+    sentences = []
+    postings = {}
+    for p_index, paragraph in enumerate(paragraphs):
+        for start, end in split_sentences(paragraph):
+            sentence_id = len(sentences)
+            sentences.append([p_index, start, end])
+            for token in set(normalize_tokens(paragraph[start:end])):
+                postings.setdefault(token, []).append(sentence_id)
+    return {"sentences": sentences, "postings": postings}
+
+def _coverage(tokens, postings):
+    hits = {}
+    for token in tokens:
+        for sentence_id in postings.get(token, []):
+            hits[sentence_id] = hits.get(sentence_id, 0) + 1
+    return {sentence_id: count / len(tokens) for sentence_id, count in hits.items()} if tokens else {}
+
+def sentence_text(paragraphs, sentence):
+    p_index, start, end = sentence
+    return paragraphs[p_index][start:end]
+
+# 找出最能支持 (head, tail) 的句子；head 與 tail 必須同時出現在同一句或同段落相鄰兩句
+# 回傳 {"paragraph", "sentence", "start", "end", "score", "text"}，只命中其中一端時回傳 None
+def find_evidence(article_index, paragraphs, head, tail):
+    sentences = article_index["sentences"]
+    postings = article_index["postings"]
+    head_cov = _coverage(set(normalize_tokens(head)), postings)
+    tail_cov = _coverage(set(normalize_tokens(tail)), postings)
+
+    best = None
+    for sentence_id in head_cov:
+        candidates = []
+        if sentence_id in tail_cov:
+            candidates.append((sentence_id, sentence_id, head_cov[sentence_id] + tail_cov[sentence_id]))
+        # head 與 tail 分在相鄰兩句
+        for other in (sentence_id - 1, sentence_id + 1):
+            if other in tail_cov and sentences[other][0] == sentences[sentence_id][0]:
+                score = max(head_cov[sentence_id], head_cov.get(other, 0)) + max(tail_cov[other], tail_cov.get(sentence_id, 0))
+                # 跨兩句的證據打個折，同分時優先單句
+                candidates.append((min(sentence_id, other), max(sentence_id, other), score * 0.9))
+        for first, last, score in candidates:
+            if best is None or score > best[2]:
+                best = (first, last, score)
+
+    if best is None:
+        return None
+
+    first, last, score = best
+    p_index, start, _ = sentences[first]
+    end = sentences[last][2]
+    text = paragraphs[p_index][start:end]
+    if len(text) > MAX_SNIPPET_CHARS:
+        text = text[:MAX_SNIPPET_CHARS].rsplit(" ", 1)[0] + "..."
+    return {"paragraph": p_index, "sentence": first, "start": start, "end": end, "score": round(score, 3), "text": text}
+
+# 為每個三元組加上 "evidence" 欄位 (找不到證據的保持原樣)
+def annotate_triples(triples, article_index, paragraphs):
+    annotated = []
+    for triple in triples:
+        evidence = find_evidence(article_index, paragraphs, triple.get("head", ""), triple.get("tail", ""))
+        annotated.append({**triple, "evidence": evidence} if evidence else triple)
+    return annotated
+
+# 組出只含相關句子 (加上前後各一句上下文) 的驗證用文字
+# 有任何三元組找不到證據時回傳 None，由呼叫端退回完整 chunk，避免把真實的三元組誤刪
+def evidence_context(triples, article_index, paragraphs, window=1):
+    sentences = article_index["sentences"]
+    selected = set()
+    for triple in triples:
+        evidence = triple.get("evidence") or find_evidence(article_index, paragraphs, triple.get("head", ""), triple.get("tail", ""))
+        if not evidence:
+            return None
+        last = evidence["sentence"]
+        while last + 1 < len(sentences) and sentences[last + 1][0] == evidence["paragraph"] and sentences[last + 1][1] < evidence["end"]:
+            last += 1
+        for sentence_id in range(evidence["sentence"] - window, last + window + 1):
+            if 0 <= sentence_id < len(sentences) and sentences[sentence_id][0] == evidence["paragraph"]:
+                selected.add(sentence_id)
+
+    # 依原文順序輸出，同段落的連續句子合併，不同段落之間以 "..." 分隔
+    parts = []
+    previous = None
+    for sentence_id in sorted(selected):
+        text = sentence_text(paragraphs, sentences[sentence_id])
+        if previous is not None and sentence_id == previous + 1 and sentences[previous][0] == sentences[sentence_id][0]:
+            parts[-1] += " " + text
+        else:
+            parts.append(text)
+        previous = sentence_id
+    return "\n...\n".join(parts)
+
+# 整個 ticker 的索引檔 ({ticker}_evidence_index.json)，以 news_id 為鍵，content_hash 不同時重建
+class EvidenceIndex:
+    def __init__(self, path):
+        self.path = path
+        self.articles = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.articles = json.load(f)
+
+    def add_article(self, news_id, paragraphs, content_hash=None):
+        existing = self.articles.get(news_id)
+        if existing and content_hash and existing.get("content_hash") == content_hash:
+            return existing
+        article_index = build_article_index(paragraphs)
+        article_index["content_hash"] = content_hash
+        self.articles[news_id] = article_index
+        return article_index
+
+    def get(self, news_id):
+        return self.articles.get(news_id)
+
+    # 沒有預先建好的索引 (舊資料) 或內容已變時即時建立，不寫回檔案
+    def get_or_build(self, news_id, paragraphs, content_hash=None):
+        existing = self.articles.get(news_id)
+        if existing and (content_hash is None or existing.get("content_hash") in (None, content_hash)):
+            return existing
+        return build_article_index(paragraphs)
+
+    def retain(self, news_ids):
+        news_ids = set(news_ids)
+        for news_id in [n for n in self.articles if n not in news_ids]:
+            del self.articles[news_id]
+
+    def save(self):
+        atomic_write_json(self.path, self.articles, indent=None)
+        return self.path
+
+# {ticker}_news.json 旁邊的索引檔路徑
+def index_path_for(news_file):
+    return news_file.replace("_news.json", "_evidence_index.json")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up the evidence sentence for a triple.")
+    parser.add_argument("ticker")
+    parser.add_argument("news_id")
+    parser.add_argument("head")
+    parser.add_argument("tail")
+    args = parser.parse_args()
+
+    from article_store import load_news
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    news_file = os.path.join(current_dir, "..", "output", f"{args.ticker.lower()}_data", f"{args.ticker.lower()}_news.json")
+    news = next((n for n in load_news(news_file) if n["news_id"] == args.news_id), None)
+    if news is None:
+        print(f"news_id {args.news_id} not found in {news_file}")
+    else:
+        index = EvidenceIndex(index_path_for(news_file))
+        evidence = find_evidence(index.get_or_build(args.news_id, news["content"]), news["content"], args.head, args.tail)
+        print(json.dumps(evidence, ensure_ascii=False, indent=2) if evidence else "No evidence found.")
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from checkpoint import atomic_write_json
+
+# 預先計算的最大跳數，查詢時 max_hops 不可超過此值
+DEFAULT_MAX_HOPS = 3
+
+# 讀取 -> 更新 -> 存檔需整段互斥，否則同一行程內同時跑的 pipeline (news_watcher --workers > 1) 會互相覆蓋
+_UPDATE_LOCK = threading.Lock()
+
+def default_index_path():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output", "exposure_index.json"))
+
+def load_json(filepath):
+    if not os.path.exists(filepath):
+        print(f"File not found: {filepath}")
+        return []
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# 在合併後的多 ticker 圖上維護 k-hop 可達表 (正向 / 反向)，邊變動時只重算受影響的節點
+# 存檔只保存邊，可達表在載入時重建 (全部節點的可達表會隨節點數 × 可達範圍成長)
+class ExposureIndex:
+    def __init__(self, max_hops=DEFAULT_MAX_HOPS):
+        self.max_hops = max_hops
+        self.out_adj = {}       # head -> {tail: {relation: {"sources": {ticker: set(news_id)}}}}
+        self.in_adj = {}        # tail -> set(head)
+        self.reach_out = {}     # node -> {node: hops}，沿邊方向 (head -> tail) 可達
+        self.reach_in = {}      # node -> {node: hops}，逆邊方向可達
+        self.tickers = {}       # ticker -> set(anchor node)
+        self.aliases = {}       # lower-case name -> node
+
+    # ---------- 建立與增量更新 ----------
+
+    def _add_node(self, node):
+        if node in self.out_adj:
+            return False
+        self.out_adj[node] = {}
+        self.in_adj[node] = set()
+        self.reach_out[node] = {}
+        self.reach_in[node] = {}
+        self.aliases.setdefault(node.lower(), node)
+        for ticker, anchors in self.tickers.items():
+            if ticker.lower() in node.lower():
+                anchors.add(node)
+        return True
+
+    def add_ticker(self, ticker):
+        ticker = ticker.upper()
+        if ticker in self.tickers:
+            return
+        # 與 05 的 infer_entity_type 一致：名稱包含 ticker 的節點視為該公司本身
+        self.tickers[ticker] = {node for node in self.out_adj if ticker.lower() in node.lower()}
+
+    def _bfs(self, start, adjacency, limit):
+        distances = {}
+        queue = deque([(start, 0)])
+        seen = {start}
+        while queue:
+            node, hops = queue.popleft()
+            if hops == limit:
+                continue
+            for neighbor in adjacency(node):
+                if neighbor in seen:
+                    continue
+                seen.add(neighbor)
+                distances[neighbor] = hops + 1
+                queue.append((neighbor, hops + 1))
+        return distances
+
+    def _successors(self, node):
+        return self.out_adj.get(node, {}).keys()
+
+    def _predecessors(self, node):
+        return self.in_adj.get(node, ())
+
+    # 邊 (u -> v) 變動後：能在 K-1 跳內到達 u 的節點需重算正向表，v 在 K-1 跳內能到的節點需重算反向表
+    def _refresh_around(self, heads, tails):
+        stale_out = set()
+        for u in heads:
+            stale_out.add(u)
+            stale_out.update(self._bfs(u, self._predecessors, self.max_hops - 1))
+        stale_in = set()
+        for v in tails:
+            stale_in.add(v)
+            stale_in.update(self._bfs(v, self._successors, self.max_hops - 1))
+
+        for node in stale_out:
+            self.reach_out[node] = self._bfs(node, self._successors, self.max_hops)
+        for node in stale_in:
+            self.reach_in[node] = self._bfs(node, self._predecessors, self.max_hops)
+        return len(stale_out) + len(stale_in)
+
+    def _normalize(self, triple):
+        head = str(triple.get("head", "")).strip()
+        tail = str(triple.get("tail", "")).strip()
+        relation = str(triple.get("relation", "")).strip()
+        if not head or not tail or head == tail:
+            return None
+        return head, tail, relation
+
+    # 新增一條 (head, relation, tail) 的來源，回傳 (是否為新的 head -> tail 邊, 是否為新的關係)
+    def _add_relation(self, head, tail, relation, ticker, news_ids):
+        self._add_node(head)
+        self._add_node(tail)
+        is_new_edge = tail not in self.out_adj[head]
+        relations = self.out_adj[head].setdefault(tail, {})
+        is_new_relation = relation not in relations
+        meta = relations.setdefault(relation, {"sources": {}})
+        meta["sources"].setdefault(ticker or "", set()).update(news_ids)
+        if is_new_edge:
+            self.in_adj[tail].add(head)
+        return is_new_edge, is_new_relation
+
+    # 加入一批三元組，回傳實際新增的邊數
+    def add_triples(self, triples, ticker=None, news_id=None):
+        if ticker:
+            self.add_ticker(ticker)
+            ticker = ticker.upper()
+
+        new_heads, new_tails = set(), set()
+        added = 0
+        for triple in triples:
+            normalized = self._normalize(triple)
+            if normalized is None:
+                continue
+            head, tail, relation = normalized
+            source_id = triple.get("news_id", news_id)
+            is_new_edge, is_new_relation = self._add_relation(head, tail, relation, ticker, [source_id] if source_id else [])
+            added += is_new_relation
+            if is_new_edge:
+                new_heads.add(head)
+                new_tails.add(tail)
+
+        if new_heads:
+            self._refresh_around(new_heads, new_tails)
+        return added
+
+    # 以某 ticker 最新的驗證結果取代它先前貢獻的邊：新結果中已不存在的關係會移除，回傳 (新增, 移除) 的關係數
+    def replace_ticker_triples(self, news_list, ticker):
+        ticker = ticker.upper()
+        self.add_ticker(ticker)
+
+        wanted = {}
+        for news in news_list:
+            for triple in news.get("triples", []):
+                normalized = self._normalize(triple)
+                if normalized is None:
+                    continue
+                source_id = triple.get("news_id", news.get("news_id"))
+                ids = wanted.setdefault(normalized, set())
+                if source_id:
+                    ids.add(source_id)
+
+        removed = 0
+        emptied = []
+        for head, tails in self.out_adj.items():
+            for tail, relations in tails.items():
+                for relation in list(relations):
+                    sources = relations[relation]["sources"]
+                    if ticker in sources and (head, tail, relation) not in wanted:
+                        del sources[ticker]
+                        if not sources:
+                            del relations[relation]
+                            removed += 1
+                if not relations:
+                    emptied.append((head, tail))
+        self._remove_edges(emptied)
+
+        new_heads, new_tails = set(), set()
+        added = 0
+        for (head, tail, relation), ids in wanted.items():
+            is_new_edge, is_new_relation = self._add_relation(head, tail, relation, ticker, ())
+            # 來源文章以最新結果為準
+            self.out_adj[head][tail][relation]["sources"][ticker] = set(ids)
+            added += is_new_relation
+            if is_new_edge:
+                new_heads.add(head)
+                new_tails.add(tail)
+        if new_heads:
+            self._refresh_around(new_heads, new_tails)
+        return added, removed
+
+    # 讀取 03 的驗證結果並取代該 ticker 先前的邊，只有變動的邊會觸發可達表更新
+    def update_from_verified(self, verified_file, ticker):
+        return self.replace_ticker_triples(load_json(verified_file) or [], ticker)
+
+    # 批次刪邊：先以舊圖找出受影響節點，刪邊後一次重算，最後移除變成孤立的節點
+    def _remove_edges(self, pairs):
+        pairs = [(h, t) for h, t in pairs if t in self.out_adj.get(h, {})]
+        if not pairs:
+            return 0
+        stale_out, stale_in = set(), set()
+        for head, tail in pairs:
+            stale_out.add(head)
+            stale_out.update(self._bfs(head, self._predecessors, self.max_hops - 1))
+            stale_in.add(tail)
+            stale_in.update(self._bfs(tail, self._successors, self.max_hops - 1))
+        for head, tail in pairs:
+            del self.out_adj[head][tail]
+            self.in_adj[tail].discard(head)
+
+        isolated = {n for pair in pairs for n in pair if not self.out_adj[n] and not self.in_adj[n]}
+        for node in isolated:
+            del self.out_adj[node], self.in_adj[node], self.reach_out[node], self.reach_in[node]
+            if self.aliases.get(node.lower()) == node:
+                del self.aliases[node.lower()]
+            for anchors in self.tickers.values():
+                anchors.discard(node)
+
+        for node in stale_out - isolated:
+            self.reach_out[node] = self._bfs(node, self._successors, self.max_hops)
+        for node in stale_in - isolated:
+            self.reach_in[node] = self._bfs(node, self._predecessors, self.max_hops)
+        return len(pairs)
+
+    def remove_edge(self, head, tail):
+        return self._remove_edges([(head, tail)]) == 1
+
+    # 從邊重建全部可達表 (載入索引時使用)
+    def rebuild_reachability(self):
+        for node in self.out_adj:
+            self.reach_out[node] = self._bfs(node, self._successors, self.max_hops)
+            self.reach_in[node] = self._bfs(node, self._predecessors, self.max_hops)
+
+    # ---------- 查詢 API ----------
+
+    def resolve(self, name):
+        name = name.strip()
+        if name in self.out_adj:
+            return name
+        return self.aliases.get(name.lower())
+
+    def _reach(self, node, direction):
+        if direction == "out":
+            return self.reach_out.get(node, {})
+        if direction == "in":
+            return self.reach_in.get(node, {})
+        merged = dict(self.reach_in.get(node, {}))
+        for other, hops in self.reach_out.get(node, {}).items():
+            merged[other] = min(hops, merged.get(other, hops))
+        return merged
+
+    # 某實體在 max_hops 內可影響到哪些 ticker (direction="out" 表示沿關係方向傳遞)
+    def exposed_tickers(self, entity, max_hops=2, direction="out"):
+        node = self.resolve(entity)
+        if node is None:
+            return []
+        max_hops = min(max_hops, self.max_hops)
+        reach = self._reach(node, direction)
+
+        results = []
+        for ticker, anchors in self.tickers.items():
+            best = None
+            for anchor in anchors:
+                hops = 0 if anchor == node else reach.get(anchor)
+                if hops is not None and hops <= max_hops and (best is None or hops < best[0]):
+                    best = (hops, anchor)
+            if best:
+                results.append({"ticker": ticker, "hops": best[0], "via": best[1]})
+        return sorted(results, key=lambda r: (r["hops"], r["ticker"]))
+
+    # 某 ticker 在 max_hops 內的上游實體 (可能把風險傳遞過來的節點)
+    def ticker_exposures(self, ticker, max_hops=2, direction="in"):
+        anchors = self.tickers.get(ticker.upper(), set())
+        max_hops = min(max_hops, self.max_hops)
+        best = {}
+        for anchor in anchors:
+            for node, hops in self._reach(anchor, direction).items():
+                if hops <= max_hops and (node not in best or hops < best[node]):
+                    best[node] = hops
+        return sorted(({"entity": n, "hops": h} for n, h in best.items()), key=lambda r: (r["hops"], r["entity"]))
+
+    def neighbors(self, entity, max_hops=1, direction="any"):
+        node = self.resolve(entity)
+        if node is None:
+            return []
+        max_hops = min(max_hops, self.max_hops)
+        reach = self._reach(node, direction)
+        return sorted(({"entity": n, "hops": h} for n, h in reach.items() if h <= max_hops), key=lambda r: (r["hops"], r["entity"]))
+
+    # 兩實體之間的最短關係路徑，先用可達表 O(1) 排除不可達，再 BFS 還原路徑
+    def find_path(self, source, target, max_hops=None):
+        start, goal = self.resolve(source), self.resolve(target)
+        if start is None or goal is None:
+            return None
+        max_hops = min(max_hops or self.max_hops, self.max_hops)
+        if start != goal and self.reach_out.get(start, {}).get(goal, max_hops + 1) > max_hops:
+            return None
+
+        parents = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            node, hops = queue.popleft()
+            if node == goal:
+                break
+            if hops == max_hops:
+                continue
+            for neighbor in self.out_adj.get(node, {}):
+                if neighbor not in parents:
+                    parents[neighbor] = node
+                    queue.append((neighbor, hops + 1))
+
+        if goal not in parents:
+            return None
+        path = []
+        node = goal
+        while parents[node] is not None:
+            head = parents[node]
+            relations = self.out_adj[head][node]
+            path.append({
+                "head": head,
+                "relations": sorted(relations),
+                "tail": node,
+                "tickers": sorted(t for m in relations.values() for t in m["sources"] if t),
+                "news_ids": sorted(set().union(*(ids for m in relations.values() for ids in m["sources"].values())))
+            })
+            node = head
+        return list(reversed(path))
+
+    # ---------- 存檔 / 讀檔 ----------
+
+    def to_dict(self):
+        edges = []
+        for head, tails in self.out_adj.items():
+            for tail, relations in tails.items():
+                for relation, meta in relations.items():
+                    edges.append({
+                        "head": head, "relation": relation, "tail": tail,
+                        "sources": {t: sorted(ids) for t, ids in meta["sources"].items()}
+                    })
+        return {
+            "max_hops": self.max_hops,
+            "tickers": {t: sorted(a) for t, a in self.tickers.items()},
+            "nodes": list(self.out_adj),
+            "edges": edges
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls(data.get("max_hops", DEFAULT_MAX_HOPS))
+        for node in data.get("nodes", []):
+            index._add_node(node)
+        for edge in data.get("edges", []):
+            head, tail = edge["head"], edge["tail"]
+            index._add_node(head)
+            index._add_node(tail)
+            sources = index.out_adj[head].setdefault(tail, {}).setdefault(edge["relation"], {"sources": {}})["sources"]
+            if "sources" in edge:
+                for ticker, ids in edge["sources"].items():
+                    sources.setdefault(ticker, set()).update(ids)
+            else:
+                # 舊格式只有 tickers / news_ids，無法區分文章來自哪個 ticker
+                for ticker in edge.get("tickers", []) or [""]:
+                    sources.setdefault(ticker, set()).update(edge.get("news_ids", []))
+            index.in_adj[tail].add(head)
+        index.tickers = {t: set(a) for t, a in data.get("tickers", {}).items()}
+        index.rebuild_reachability()
+        return index
+
+    def save(self, path=None):
+        path = path or default_index_path()
+        atomic_write_json(path, self.to_dict(), indent=None)
+        return path
+
+    @classmethod
+    def load(cls, path=None, max_hops=DEFAULT_MAX_HOPS):
+        path = path or default_index_path()
+        if not os.path.exists(path):
+            return cls(max_hops)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+# 供 app.py 與 CLI 共用：把某 ticker 的驗證結果併入索引並存檔
+def update_index_for_ticker(ticker, verified_file=None, index_path=None):
+    if verified_file is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        verified_file = os.path.join(current_dir, "..", "output", f"{ticker.lower()}_data", f"{ticker.lower()}_triples_verified.json")
+    with _UPDATE_LOCK:
+        index = ExposureIndex.load(index_path)
+        added, removed = index.update_from_verified(os.path.normpath(verified_file), ticker.upper())
+        path = index.save(index_path)
+    print(f"Exposure index updated for {ticker.upper()}: {added} new edges, {removed} removed, saved to {path}")
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-hop supply-chain exposure index.")
+    parser.add_argument("--index", help="index file path (default: output/exposure_index.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_update = sub.add_parser("update", help="merge verified triples of tickers into the index")
+    p_update.add_argument("tickers", nargs="+")
+
+    p_exposed = sub.add_parser("exposed", help="tickers within N hops of an entity")
+    p_exposed.add_argument("entity")
+    p_exposed.add_argument("--hops", type=int, default=2)
+    p_exposed.add_argument("--direction", choices=["out", "in", "any"], default="out")
+
+    p_ticker = sub.add_parser("ticker", help="entities within N hops upstream of a ticker")
+    p_ticker.add_argument("ticker")
+    p_ticker.add_argument("--hops", type=int, default=2)
+    p_ticker.add_argument("--direction", choices=["out", "in", "any"], default="in")
+
+    p_path = sub.add_parser("path", help="shortest relation path between two entities")
+    p_path.add_argument("source")
+    p_path.add_argument("target")
+    p_path.add_argument("--hops", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "update":
+        for ticker in args.tickers:
+            update_index_for_ticker(ticker, index_path=args.index)
+    else:
+        # 載入時會重建可達表，與查詢時間分開列出
+        start = time.perf_counter()
+        index = ExposureIndex.load(args.index)
+        load_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        if args.command == "exposed":
+            result = index.exposed_tickers(args.entity, args.hops, args.direction)
+        elif args.command == "ticker":
+            result = index.ticker_exposures(args.ticker, args.hops, args.direction)
+        else:
+            result = index.find_path(args.source, args.target, args.hops)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        print(f"Load time (incl. reachability rebuild): {load_ms:.2f} ms, query time: {elapsed_ms:.2f} ms")
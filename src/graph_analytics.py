@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import argparse
+import numpy as np
+import scipy.sparse as sp
+
+# 關係的風險傳遞權重：負值代表負面衝擊 (風險)，正值代表正面影響
+RELATION_WEIGHTS = {
+    "HAMPERS": -1.0, "DELAYS": -1.0, "WARNS": -1.0, "CANCELS": -1.0,
+    "MISSES": -1.0, "LOWERS": -0.8, "WITHDRAWS": -0.8, "SCALE_BACK": -0.8,
+    "INCURS": -0.8, "DECREASES": -0.6, "REDUCES": -0.6,
+    "BENEFITS_FROM": 1.0, "PARTNERS_WITH": 0.8, "INVESTS_IN": 0.8,
+    "EXPANDS": 0.8, "LAUNCHES": 0.6, "INCREASES": 0.6, "DEVELOPS": 0.6,
+    "COMPETES_WITH": -0.3,
+}
+
+# 其他中性關係 (AFFECTS, REPORTS, OWNS...) 只傳遞影響，不改變正負號
+DEFAULT_RELATION_WEIGHT = 0.5
+
+def relation_weight(relation):
+    return RELATION_WEIGHTS.get(str(relation).upper(), DEFAULT_RELATION_WEIGHT)
+
+def load_json(filepath):
+    if not os.path.exists(filepath):
+        print(f"File not found: {filepath}")
+        return []
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# 讀取多個 ticker 的驗證結果並攤平成 (head, relation, tail) 列表
+def load_watchlist_triples(tickers, output_root=None):
+    if output_root is None:
+        output_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
+
+    triples = []
+    for ticker in tickers:
+        path = os.path.join(output_root, f"{ticker.lower()}_data", f"{ticker.lower()}_triples_verified.json")
+        for news in load_json(path) or []:
+            for triple in news.get("triples", []):
+                head = str(triple.get("head", "")).strip()
+                tail = str(triple.get("tail", "")).strip()
+                if head and tail:
+                    triples.append((head, triple.get("relation", ""), tail))
+    return triples
+
+# 節點名稱到矩陣索引的映射，可在增量更新時持續擴充
+class NodeIndex:
+    def __init__(self, nodes=None):
+        self.nodes = []
+        self.index = {}
+        for node in nodes or []:
+            self.add(node)
+
+    def add(self, node):
+        idx = self.index.get(node)
+        if idx is None:
+            idx = len(self.nodes)
+            self.index[node] = idx
+            self.nodes.append(node)
+        return idx
+
+    def __len__(self):
+        return len(self.nodes)
+
+# 將三元組轉成 COO 邊陣列 (rows, cols, weights)
+def triples_to_edges(triples, node_index):
+    count = len(triples)
+    rows = np.empty(count, dtype=np.int64)
+    cols = np.empty(count, dtype=np.int64)
+    weights = np.empty(count, dtype=np.float64)
+    add = node_index.add
+    for i, (head, relation, tail) in enumerate(triples):
+        rows[i] = add(head)
+        cols[i] = add(tail)
+        weights[i] = relation_weight(relation)
+    return rows, cols, weights
+
+# 將 build_graph 產生的 NetworkX 圖 (或多個 ticker 合併後的圖) 轉成帶號稀疏矩陣
+# 傳入的 node_index (即使是空的) 會被就地擴充，呼叫端可沿用同一份索引
+def graph_to_sparse(G, node_index=None):
+    if node_index is None:
+        node_index = NodeIndex()
+    for node in G.nodes():
+        node_index.add(node)
+    triples = [
+        (head, data.get("label") or data.get("title") or "", tail)
+        for head, tail, data in G.edges(data=True)
+    ]
+    rows, cols, weights = triples_to_edges(triples, node_index)
+    n = len(node_index)
+    matrix = sp.coo_matrix((weights, (rows, cols)), shape=(n, n)).tocsr()
+    return matrix, node_index
+
+def triples_to_sparse(triples, node_index=None):
+    if node_index is None:
+        node_index = NodeIndex()
+    rows, cols, weights = triples_to_edges(triples, node_index)
+    n = len(node_index)
+    matrix = sp.coo_matrix((weights, (rows, cols)), shape=(n, n)).tocsr()
+    return matrix, node_index
+
+# 依出度 (絕對值總和) 做列正規化，重複邊在 tocsr 時已加總
+def row_normalize(matrix):
+    out_strength = np.asarray(abs(matrix).sum(axis=1)).ravel()
+    inv = np.zeros_like(out_strength)
+    nonzero = out_strength > 0
+    inv[nonzero] = 1.0 / out_strength[nonzero]
+    return sp.diags(inv) @ matrix, ~nonzero
+
+# 由節點名稱 → 權重 的 dict 建立種子向量，None 代表所有節點均勻
+def seed_vector(node_index, seeds=None):
+    n = len(node_index)
+    vector = np.zeros(n)
+    if not seeds:
+        vector[:] = 1.0 / n if n else 0.0
+        return vector
+    for node, weight in seeds.items():
+        idx = node_index.index.get(node)
+        if idx is not None:
+            vector[idx] = weight
+    total = np.abs(vector).sum()
+    if total > 0:
+        vector /= total
+    return vector
+
+# Personalized PageRank (power iteration)，使用權重絕對值，dangling 節點的機率回到種子分佈
+def personalized_pagerank(matrix, personalization, alpha=0.85, tol=1e-8, max_iter=100, start=None):
+    transition, dangling = row_normalize(abs(matrix).tocsr())
+    transition_t = transition.T.tocsr()
+    p = personalization / personalization.sum() if personalization.sum() > 0 else personalization
+    x = p.copy() if start is None or len(start) != len(p) else start / max(start.sum(), 1e-12)
+
+    for iteration in range(max_iter):
+        dangling_mass = x[dangling].sum()
+        x_next = alpha * (transition_t @ x + dangling_mass * p) + (1 - alpha) * p
+        if np.abs(x_next - x).sum() < tol:
+            return x_next, iteration + 1
+        x = x_next
+    return x, max_iter
+
+# 帶號風險傳遞：r = s + beta * W^T r (Katz 型)，W 為列正規化後的帶號矩陣
+# beta < 1 保證收斂；負分代表該節點承受的下游風險曝險
+def risk_propagation(matrix, seeds, beta=0.5, tol=1e-8, max_iter=100, start=None):
+    transition, _ = row_normalize(matrix.tocsr())
+    transition_t = transition.T.tocsr()
+    r = seeds.copy() if start is None or len(start) != len(seeds) else start.copy()
+
+    for iteration in range(max_iter):
+        r_next = seeds + beta * (transition_t @ r)
+        if np.abs(r_next - r).sum() < tol:
+            return r_next, iteration + 1
+        r = r_next
+    return r, max_iter
+
+# 可增量更新的分析引擎：邊變動時只更新 COO 陣列，並以上一輪結果作為迭代起點 (warm start)
+class RiskEngine:
+    def __init__(self, triples=None, alpha=0.85, beta=0.5):
+        self.alpha = alpha
+        self.beta = beta
+        self.node_index = NodeIndex()
+        self.relation_index = NodeIndex()
+        self.rows = np.empty(0, dtype=np.int64)
+        self.cols = np.empty(0, dtype=np.int64)
+        self.relations = np.empty(0, dtype=np.int64)
+        self.matrix = None
+        self.pagerank = None
+        self.risk = None
+        if triples:
+            self.add_edges(triples)
+
+    def _encode(self, triples):
+        count = len(triples)
+        rows = np.empty(count, dtype=np.int64)
+        cols = np.empty(count, dtype=np.int64)
+        relations = np.empty(count, dtype=np.int64)
+        add_node = self.node_index.add
+        add_relation = self.relation_index.add
+        for i, (head, relation, tail) in enumerate(triples):
+            rows[i] = add_node(head)
+            cols[i] = add_node(tail)
+            relations[i] = add_relation(str(relation).upper())
+        return rows, cols, relations
+
+    # 每條邊的唯一整數 key，用於向量化比對刪除
+    def _edge_keys(self, rows, cols, relations):
+        n = len(self.node_index)
+        r = max(len(self.relation_index), 1)
+        return (rows * n + cols) * r + relations
+
+    def add_edges(self, triples):
+        rows, cols, relations = self._encode(list(triples))
+        self.rows = np.concatenate([self.rows, rows])
+        self.cols = np.concatenate([self.cols, cols])
+        self.relations = np.concatenate([self.relations, relations])
+        self.matrix = None
+
+    def remove_edges(self, triples):
+        index = self.node_index.index
+        known = [
+            t for t in triples
+            if t[0] in index and t[2] in index and str(t[1]).upper() in self.relation_index.index
+        ]
+        if not known:
+            return
+        rows, cols, relations = self._encode(known)
+        keep = ~np.isin(self._edge_keys(self.rows, self.cols, self.relations), self._edge_keys(rows, cols, relations))
+        self.rows, self.cols, self.relations = self.rows[keep], self.cols[keep], self.relations[keep]
+        self.matrix = None
+
+    def edge_weights(self):
+        weights = np.array([relation_weight(r) for r in self.relation_index.nodes], dtype=np.float64)
+        return weights[self.relations] if len(self.relations) else np.empty(0)
+
+    def build_matrix(self):
+        if self.matrix is None:
+            n = len(self.node_index)
+            self.matrix = sp.coo_matrix((self.edge_weights(), (self.rows, self.cols)), shape=(n, n)).tocsr()
+        return self.matrix
+
+    # 新節點加入後，把舊結果補零到新長度當作 warm start
+    def _warm_start(self, previous):
+        n = len(self.node_index)
+        if previous is None:
+            return None
+        start = np.zeros(n)
+        start[:len(previous)] = previous[:n]
+        return start
+
+    def compute(self, seeds=None):
+        matrix = self.build_matrix()
+        personalization = seed_vector(self.node_index, seeds)
+        self.pagerank, pr_iter = personalized_pagerank(
+            matrix, personalization, self.alpha, start=self._warm_start(self.pagerank)
+        )
+        self.risk, risk_iter = risk_propagation(
+            matrix, personalization, self.beta, start=self._warm_start(self.risk)
+        )
+        return {"pagerank_iterations": pr_iter, "risk_iterations": risk_iter}
+
+    # 依風險分數排序 (最負面在前)
+    def top_exposures(self, k=20):
+        if self.risk is None:
+            self.compute()
+        order = np.argsort(self.risk)[:k]
+        return [
+            {"node": self.node_index.nodes[i], "risk_score": float(self.risk[i]), "pagerank": float(self.pagerank[i])}
+            for i in order
+        ]
+
+# 以 ticker 名稱比對出的節點作為種子 (與 05 的 infer_entity_type 判斷方式一致)
+def ticker_seeds(node_index, tickers):
+    seeds = {}
+    lowered = [t.lower() for t in tickers]
+    for node in node_index.nodes:
+        name = node.lower()
+        if any(t in name for t in lowered):
+            seeds[node] = 1.0
+    return seeds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank supply-chain risk exposure across a watchlist.")
+    parser.add_argument("tickers", nargs="+", help="tickers whose verified triples should be merged")
+    parser.add_argument("--top", type=int, default=20, help="number of nodes to print")
+    parser.add_argument("--output", help="optional path to save the ranking as JSON")
+    args = parser.parse_args()
+
+    tickers = [t.upper() for t in args.tickers]
+    triples = load_watchlist_triples(tickers)
+    if not triples:
+        print("No verified triples found. Please run the pipeline first.")
+    else:
+        engine = RiskEngine(triples)
+        iterations = engine.compute(ticker_seeds(engine.node_index, tickers))
+        print(f"Merged graph: {len(engine.node_index)} nodes, {len(engine.rows)} edges ({iterations})")
+
+        ranking = engine.top_exposures(args.top)
+        for rank, item in enumerate(ranking, 1):
+            print(f"{rank:>3}. {item['node'][:60]:<60} risk={item['risk_score']:+.5f} pagerank={item['pagerank']:.5f}")
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(ranking, f, ensure_ascii=False, indent=2)
+            print(f"Ranking saved to: {args.output}")
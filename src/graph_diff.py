@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from checkpoint import atomic_write_text
+
+# 比較兩次執行之間的圖譜差異 (新增 / 刪除 / 變更的節點與邊)
+# 05 用它只把差異打進既有的 HTML，並標示本次新增的邊
+
+# 本次新增或關係改變的邊的樣式
+HIGHLIGHT_EDGE_COLOR = "#39ff14"
+HIGHLIGHT_EDGE_WIDTH = 4
+
+# 相對於 HTML 內嵌資料的差異超過此比例時改為整張重畫，避免補丁腳本比原圖還大
+MAX_PATCH_RATIO = 0.3
+
+NODE_FIELDS = ["label", "title", "color", "group", "size"]
+EDGE_FIELDS = ["label", "title"]
+
+DELTA_START = "<!-- graph-delta -->"
+DELTA_END = "<!-- /graph-delta -->"
+
+# 以 (head, tail) 的雜湊當邊 id，實體名稱含 "->" 等字元時也不會互相衝突
+def edge_id(head, tail):
+    return "e_" + hashlib.sha1(json.dumps([head, tail], ensure_ascii=False).encode("utf-8")).hexdigest()[:20]
+
+# 把 NetworkX 圖轉成可存檔、可比較的快照
+def graph_snapshot(G):
+    nodes = {}
+    for node, attrs in G.nodes(data=True):
+        nodes[node] = {field: attrs.get(field) for field in NODE_FIELDS}
+
+    edges = {}
+    for head, tail, attrs in G.edges(data=True):
+        entry = {"from": head, "to": tail}
+        entry.update({field: attrs.get(field) for field in EDGE_FIELDS})
+        edges[attrs.get("id") or edge_id(head, tail)] = entry
+
+    return {"created_at": datetime.now(timezone.utc).isoformat(), "nodes": nodes, "edges": edges}
+
+# removed 保留舊的內容，刪除的邊仍可顯示 from / to
+def _diff_section(old, new):
+    added = {key: value for key, value in new.items() if key not in old}
+    removed = {key: value for key, value in old.items() if key not in new}
+    changed = {key: value for key, value in new.items() if key in old and old[key] != value}
+    return {"added": added, "removed": removed, "changed": changed}
+
+# old 為 None 時 (第一次執行) 所有內容都算新增
+def diff_snapshots(old, new):
+    old = old or {"nodes": {}, "edges": {}}
+    return {
+        "since": old.get("created_at"),
+        "until": new.get("created_at"),
+        "nodes": _diff_section(old["nodes"], new["nodes"]),
+        "edges": _diff_section(old["edges"], new["edges"])
+    }
+
+def diff_size(diff):
+    return sum(len(diff[kind][change]) for kind in ("nodes", "edges") for change in ("added", "removed", "changed"))
+
+def is_empty(diff):
+    return diff_size(diff) == 0
+
+# 要標示的邊：新增的邊 + 關係改變的邊
+def highlighted_edges(diff):
+    return sorted(set(diff["edges"]["added"]) | set(diff["edges"]["changed"]))
+
+def summarize(diff):
+    return {
+        kind: {change: len(diff[kind][change]) for change in ("added", "removed", "changed")}
+        for kind in ("nodes", "edges")
+    }
+
+# 整張重畫時直接在圖上設定標示樣式
+def highlight_graph_edges(G, edge_ids):
+    edge_ids = set(edge_ids)
+    for head, tail, attrs in G.edges(data=True):
+        if (attrs.get("id") or edge_id(head, tail)) in edge_ids:
+            attrs["color"] = HIGHLIGHT_EDGE_COLOR
+            attrs["width"] = HIGHLIGHT_EDGE_WIDTH
+    return G
+
+def _vis_node(node_id, attrs):
+    return {"id": node_id, "shape": "dot", **attrs}
+
+def _vis_edge(eid, attrs, highlight):
+    edge = {"id": eid, "arrows": "to", **attrs}
+    if highlight:
+        edge["color"] = HIGHLIGHT_EDGE_COLOR
+        edge["width"] = HIGHLIGHT_EDGE_WIDTH
+    return edge
+
+# 產生 vis.js DataSet 的更新內容
+# base：HTML 內嵌資料對應的快照；current：本次快照；highlight：本次要標示的邊
+def vis_patch(base, current, highlight):
+    diff = diff_snapshots(base, current)
+    highlight = set(highlight)
+
+    nodes_update = [_vis_node(n, a) for n, a in {**diff["nodes"]["added"], **diff["nodes"]["changed"]}.items()]
+    edge_updates = {**diff["edges"]["added"], **diff["edges"]["changed"]}
+    edges_update = [_vis_edge(e, a, e in highlight) for e, a in edge_updates.items()]
+
+    # 本次要標示、但內容與 base 相同的邊 (例如先刪後加回)
+    for eid in highlight:
+        if eid not in edge_updates and eid in current["edges"]:
+            edges_update.append(_vis_edge(eid, current["edges"][eid], True))
+
+    # base 重畫時標示過、這次已不算新的邊：依 base 快照的內容刪掉再加回，不依賴 DataSet 對 null 欄位的處理
+    edges_reset = [
+        _vis_edge(eid, base["edges"][eid], False) for eid in base.get("highlighted", [])
+        if eid in current["edges"] and eid in base["edges"] and eid not in highlight and eid not in edge_updates
+    ]
+
+    return {
+        "nodes_update": nodes_update,
+        "nodes_remove": sorted(diff["nodes"]["removed"]),
+        "edges_update": edges_update,
+        "edges_remove": sorted(diff["edges"]["removed"]),
+        "edges_reset": edges_reset
+    }
+
+def patch_is_small(base, current):
+    size = diff_size(diff_snapshots(base, current))
+    return size <= MAX_PATCH_RATIO * max(len(base["edges"]) + len(base["nodes"]), 1)
+
+# 在 pyvis HTML 的 drawGraph() 之後套用補丁；舊補丁會被取代，不會累加
+# 檔案仍會整個讀出再寫回，省下的是重新建立 Pyvis 網路與輸出完整節點 / 邊資料的成本
+def apply_patch_to_html(html_path, patch):
+    with open(html_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    content = re.sub(re.escape(DELTA_START) + r".*?" + re.escape(DELTA_END) + r"\n?", "", content, flags=re.S)
+    payload = json.dumps(patch, ensure_ascii=False).replace("</", "<\\/")
+    script = f"""{DELTA_START}
+    <script type="text/javascript">
+        (function () {{
+            var patch = {payload};
+            edges.remove(patch.edges_remove);
+            nodes.remove(patch.nodes_remove);
+            nodes.update(patch.nodes_update);
+            edges.update(patch.edges_update);
+            edges.remove(patch.edges_reset.map(function (edge) {{ return edge.id; }}));
+            edges.add(patch.edges_reset);
+        }})();
+    </script>
+{DELTA_END}
+"""
+    if "</body>" not in content:
+        print(" -> Error: Could not find </body> tag to apply graph delta.")
+        return False
+    atomic_write_text(html_path, content.replace("</body>", f"{script}</body>", 1))
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show what changed in a ticker's knowledge graph since the previous run.")
+    parser.add_argument("ticker")
+    parser.add_argument("--limit", type=int, default=20, help="max edges to list per section")
+    args = parser.parse_args()
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    delta_path = os.path.join(current_dir, "..", "output", f"{args.ticker.lower()}_data", f"{args.ticker.lower()}_graph_delta.json")
+    if not os.path.exists(delta_path):
+        print(f"No graph delta found at {delta_path}. Run the visualization step first.")
+    else:
+        with open(delta_path, "r", encoding="utf-8") as f:
+            delta = json.load(f)
+        print(f"Changes from {delta.get('since') or '(first run)'} to {delta.get('until')}:")
+        print(json.dumps(summarize(delta), indent=2))
+        for change in ("added", "changed"):
+            for eid, edge in list(delta["edges"][change].items())[:args.limit]:
+                print(f"  [{change}] {edge['from']} -[{edge['label']}]-> {edge['to']}")
+        for eid, edge in list(delta["edges"]["removed"].items())[:args.limit]:
+            print(f"  [removed] {edge['from']} -[{edge['label']}]-> {edge['to']}")
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import networkx as nx
+from checkpoint import atomic_write_json, atomic_write_text
+from kg_schema import infer_entity_type, merged_entity_type
+
+# 把各 ticker 的驗證結果匯出成圖資料庫 / 分析工具可直接批次載入的格式
+#   neo4j   : neo4j-admin database import 用的 nodes.csv / relationships.csv
+#   graphml : Gephi、networkx 等工具
+#   parquet / arrow : 邊表 (ticker, relation, publish_time, news_id ...)
+# incremental 模式只輸出上次匯出之後新增或變更的列，另附批次 MERGE 的 Cypher 腳本
+# 用法：python src/graph_export.py full PLTR NVDA --formats neo4j parquet
+#       python src/graph_export.py incremental PLTR NVDA
+#       python src/graph_export.py validate
+
+# Parquet / Arrow 需要 pyarrow，沒安裝時其他格式仍可使用
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FORMATS = ["neo4j", "graphml", "parquet", "arrow"]
+
+EDGE_COLUMNS = ["row_id", "ticker", "head_id", "head", "relation", "tail_id", "tail", "publish_time", "news_id", "evidence"]
+NODE_COLUMNS = ["node_id", "name", "type"]
+
+STATE_FILE = "export_state.json"
+
+def default_export_dir():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output", "exports"))
+
+def default_output_root():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output"))
+
+def _digest(*parts):
+    return hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+
+# 節點以小寫名稱為鍵，讓 "Apple" 與 "apple" 在不同 ticker 間合併成同一節點
+def node_id(name):
+    return _digest(name.strip().lower())
+
+def load_json(filepath):
+    if not os.path.exists(filepath):
+        print(f"File not found: {filepath}")
+        return []
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# 讀取 watchlist 的驗證結果，回傳 (節點 dict, 邊列表)
+# 每個 (ticker, news_id, head, relation, tail) 一列，row_id 固定，可用來判斷新增 / 變更 / 刪除
+def collect_rows(tickers, output_root=None):
+    output_root = output_root or default_output_root()
+    node_names = {}     # node_id -> set(原始名稱)
+    node_types = {}     # node_id -> {ticker: 推斷類型}
+    edges = {}
+
+    for ticker in tickers:
+        ticker = ticker.upper()
+        path = os.path.join(output_root, f"{ticker.lower()}_data", f"{ticker.lower()}_triples_verified.json")
+        for news in load_json(path) or []:
+            for triple in news.get("triples", []):
+                head = str(triple.get("head", "")).strip()
+                tail = str(triple.get("tail", "")).strip()
+                relation = str(triple.get("relation", "")).strip().upper()
+                if not head or not tail or not relation:
+                    continue
+
+                for name in (head, tail):
+                    nid = node_id(name)
+                    node_names.setdefault(nid, set()).add(name)
+                    node_types.setdefault(nid, {}).setdefault(ticker, infer_entity_type(name, ticker))
+
+                row_id = _digest(ticker, news.get("news_id"), head.lower(), relation, tail.lower())
+                evidence = triple.get("evidence") or {}
+                edges[row_id] = {
+                    "row_id": row_id,
+                    "ticker": ticker,
+                    "head_id": node_id(head),
+                    "head": head,
+                    "relation": relation,
+                    "tail_id": node_id(tail),
+                    "tail": tail,
+                    "publish_time": news.get("publish_time") or "",
+                    "news_id": news.get("news_id") or "",
+                    "evidence": evidence.get("text", "")
+                }
+
+    # 名稱與類型都不受 ticker 順序影響，row_hash 才不會因為換順序而誤判為變更
+    nodes = {
+        nid: {"node_id": nid, "name": min(names), "type": merged_entity_type(node_types[nid])}
+        for nid, names in node_names.items()
+    }
+    return nodes, list(edges.values())
+
+def row_hash(row, columns):
+    return _digest(*(row.get(c, "") for c in columns))
+
+def _write_csv(path, header, rows):
+    tmp_path = f"{path}.partial"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    return path
+
+# neo4j-admin import 格式：節點 label 用實體類型，關係 type 用 relation
+def write_neo4j_csv(nodes, edges, output_dir, prefix=""):
+    nodes_path = _write_csv(
+        os.path.join(output_dir, f"{prefix}nodes.csv"),
+        ["node_id:ID(Entity)", "name", "type", ":LABEL"],
+        ([n["node_id"], n["name"], n["type"], f"Entity;{n['type']}"] for n in nodes)
+    )
+    rels_path = _write_csv(
+        os.path.join(output_dir, f"{prefix}relationships.csv"),
+        [":START_ID(Entity)", ":END_ID(Entity)", ":TYPE", "row_id", "ticker", "publish_time", "news_id", "evidence"],
+        ([e["head_id"], e["tail_id"], e["relation"], e["row_id"], e["ticker"], e["publish_time"], e["news_id"], e["evidence"]] for e in edges)
+    )
+    return [nodes_path, rels_path]
+
+def write_graphml(nodes, edges, output_dir, prefix=""):
+    G = nx.MultiDiGraph()
+    for n in nodes:
+        G.add_node(n["node_id"], name=n["name"], type=n["type"])
+    for e in edges:
+        G.add_edge(e["head_id"], e["tail_id"], key=e["row_id"], relation=e["relation"], ticker=e["ticker"],
+                   publish_time=e["publish_time"], news_id=e["news_id"], evidence=e["evidence"])
+    path = os.path.join(output_dir, f"{prefix}graph.graphml")
+    tmp_path = f"{path}.partial"
+    nx.write_graphml(G, tmp_path)
+    os.replace(tmp_path, path)
+    return [path]
+
+def _edge_table(edges, extra=None):
+    if pa is None:
+        raise ImportError("Parquet/Arrow export requires pyarrow (pip install pyarrow).")
+    columns = {c: [e.get(c, "") for e in edges] for c in EDGE_COLUMNS}
+    columns.update(extra or {})
+    return pa.table({c: pa.array(v, type=pa.string()) for c, v in columns.items()})
+
+def write_parquet(edges, output_dir, prefix="", extra=None):
+    path = os.path.join(output_dir, f"{prefix}edges.parquet")
+    pq.write_table(_edge_table(edges, extra), f"{path}.partial", compression="zstd")
+    os.replace(f"{path}.partial", path)
+    return [path]
+
+def write_arrow(edges, output_dir, prefix="", extra=None):
+    table = _edge_table(edges, extra)
+    path = os.path.join(output_dir, f"{prefix}edges.arrow")
+    with pa.OSFile(f"{path}.partial", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(f"{path}.partial", path)
+    return [path]
+
+# full_export 記錄全量檔案的列數，給 validate 比對 (之後的 incremental 不會改寫全量檔)
+def _state(nodes, edges, tickers):
+    return {
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "tickers": sorted(t.upper() for t in tickers),
+        "nodes": {n["node_id"]: row_hash(n, NODE_COLUMNS) for n in nodes},
+        "rows": {e["row_id"]: row_hash(e, EDGE_COLUMNS) for e in edges},
+        "row_tickers": {e["row_id"]: e["ticker"] for e in edges},
+        "row_endpoints": {e["row_id"]: [e["head_id"], e["tail_id"]] for e in edges},
+        "full_export": {"nodes": len(nodes), "rows": len(edges)}
+    }
+
+def load_state(output_dir):
+    path = os.path.join(output_dir, STATE_FILE)
+    return load_json(path) if os.path.exists(path) else {"nodes": {}, "rows": {}, "row_tickers": {}, "row_endpoints": {}}
+
+# 全量匯出：覆寫各格式的完整檔案，並記錄目前狀態作為之後 incremental 的基準
+def export_full(tickers, output_dir=None, formats=None, output_root=None):
+    output_dir = output_dir or default_export_dir()
+    formats = formats or FORMATS
+    os.makedirs(output_dir, exist_ok=True)
+
+    nodes, edges = collect_rows(tickers, output_root)
+    node_list = list(nodes.values())
+    written = []
+    if "neo4j" in formats:
+        written += write_neo4j_csv(node_list, edges, output_dir)
+    if "graphml" in formats:
+        written += write_graphml(node_list, edges, output_dir)
+    if "parquet" in formats:
+        written += write_parquet(edges, output_dir)
+    if "arrow" in formats:
+        written += write_arrow(edges, output_dir)
+
+    atomic_write_json(os.path.join(output_dir, STATE_FILE), _state(node_list, edges, tickers))
+    print(f"Exported {len(node_list)} nodes and {len(edges)} relationships to {output_dir}")
+    return written
+
+# 以 row_id 批次 MERGE，每 10000 列一個 transaction，而不是逐筆 CREATE
+def write_upsert_cypher(output_dir, prefix):
+    cypher = f"""// Load the delta produced by graph_export.py incremental.
+// Copy the CSV files into Neo4j's import directory first.
+CREATE CONSTRAINT entity_id IF NOT EXISTS FOR (n:Entity) REQUIRE n.node_id IS UNIQUE;
+
+LOAD CSV WITH HEADERS FROM 'file:///{prefix}nodes.csv' AS row
+CALL {{
+  WITH row
+  MERGE (n:Entity {{node_id: row.node_id}})
+  SET n.name = row.name, n.type = row.type
+}} IN TRANSACTIONS OF 10000 ROWS;
+
+// Relationship types come from the data, so APOC's merge procedure is used.
+LOAD CSV WITH HEADERS FROM 'file:///{prefix}relationships.csv' AS row
+CALL {{
+  WITH row
+  MATCH (h:Entity {{node_id: row.head_id}}), (t:Entity {{node_id: row.tail_id}})
+  CALL apoc.merge.relationship(h, row.relation, {{row_id: row.row_id}},
+    {{ticker: row.ticker, publish_time: row.publish_time, news_id: row.news_id, evidence: row.evidence}}, t,
+    {{ticker: row.ticker, publish_time: row.publish_time, news_id: row.news_id, evidence: row.evidence}}) YIELD rel
+  RETURN count(rel) AS merged
+}} IN TRANSACTIONS OF 10000 ROWS;
+
+// Relationship types vary, so there is no single relationship index on row_id.
+// Match from the endpoint nodes (unique node_id index) and filter their relationships instead.
+LOAD CSV WITH HEADERS FROM 'file:///{prefix}deleted.csv' AS row
+CALL {{
+  WITH row
+  MATCH (h:Entity {{node_id: row.head_id}})-[r]->(t:Entity {{node_id: row.tail_id}})
+  WHERE r.row_id = row.row_id
+  DELETE r
+}} IN TRANSACTIONS OF 10000 ROWS;
+
+// Entities no longer referenced by any exported row; only deleted when nothing else links to them.
+LOAD CSV WITH HEADERS FROM 'file:///{prefix}deleted_nodes.csv' AS row
+CALL {{
+  WITH row
+  MATCH (n:Entity {{node_id: row.node_id}})
+  WHERE NOT (n)--()
+  DELETE n
+}} IN TRANSACTIONS OF 10000 ROWS;
+"""
+    path = os.path.join(output_dir, f"{prefix}upsert.cypher")
+    atomic_write_text(path, cypher)
+    return path
+
+# 增量匯出：只輸出與上次狀態相比新增或內容改變的節點與邊，以及被刪除的 row_id
+# 刪除只在本次匯出包含該列原本所屬的 ticker 時才成立，避免只匯出部分 ticker 時誤刪其他 ticker 的資料
+def export_incremental(tickers, output_dir=None, formats=None, output_root=None):
+    output_dir = output_dir or default_export_dir()
+    formats = formats or FORMATS
+    delta_dir = os.path.join(output_dir, "deltas")
+    os.makedirs(delta_dir, exist_ok=True)
+
+    state = load_state(output_dir)
+    nodes, edges = collect_rows(tickers, output_root)
+    node_list = list(nodes.values())
+
+    changed_nodes = [n for n in node_list if state["nodes"].get(n["node_id"]) != row_hash(n, NODE_COLUMNS)]
+    changed_edges = [e for e in edges if state["rows"].get(e["row_id"]) != row_hash(e, EDGE_COLUMNS)]
+
+    exported_tickers = {t.upper() for t in tickers}
+    previous_tickers = state.get("row_tickers", {})
+    previous_endpoints = state.get("row_endpoints", {})
+    current_ids = {e["row_id"] for e in edges}
+    deleted = [
+        row_id for row_id in state["rows"]
+        if row_id not in current_ids and previous_tickers.get(row_id) in exported_tickers
+    ]
+    deleted_ids = set(deleted)
+
+    # 新狀態：保留未匯出 ticker 的舊列，覆寫本次匯出的列
+    new_state = {
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "nodes": {**state["nodes"], **{n["node_id"]: row_hash(n, NODE_COLUMNS) for n in node_list}},
+        "rows": {k: v for k, v in state["rows"].items() if k not in deleted_ids},
+        "row_tickers": {k: v for k, v in previous_tickers.items() if k not in deleted_ids},
+        "row_endpoints": {k: v for k, v in previous_endpoints.items() if k not in deleted_ids},
+        "tickers": sorted(set(state.get("tickers", [])) | exported_tickers),
+        "full_export": state.get("full_export")
+    }
+    for e in edges:
+        new_state["rows"][e["row_id"]] = row_hash(e, EDGE_COLUMNS)
+        new_state["row_tickers"][e["row_id"]] = e["ticker"]
+        new_state["row_endpoints"][e["row_id"]] = [e["head_id"], e["tail_id"]]
+
+    # 舊版狀態檔沒有記錄端點時無法定位要刪的關係與節點，需重新做一次全量匯出
+    missing_endpoints = [row_id for row_id in deleted if row_id not in previous_endpoints]
+    if missing_endpoints:
+        print(f"Warning: {len(missing_endpoints)} deleted rows have no recorded endpoints; run a full export to remove them.")
+    deleted_rows = [(row_id, *previous_endpoints[row_id]) for row_id in deleted if row_id in previous_endpoints]
+
+    # 不再被任何列引用的節點 (所有列都有端點紀錄時才判斷，否則可能誤刪)
+    deleted_nodes = []
+    if len(new_state["row_endpoints"]) == len(new_state["rows"]):
+        referenced = {node for pair in new_state["row_endpoints"].values() for node in pair}
+        deleted_nodes = sorted(n for n in new_state["nodes"] if n not in referenced)
+        for node in deleted_nodes:
+            del new_state["nodes"][node]
+
+    if not changed_nodes and not changed_edges and not deleted and not deleted_nodes:
+        atomic_write_json(os.path.join(output_dir, STATE_FILE), new_state)
+        print("No changes since the last export.")
+        return []
+
+    prefix = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ") + "_"
+    written = []
+    if "neo4j" in formats:
+        written += _write_upsert_csv(changed_nodes, changed_edges, deleted_rows, deleted_nodes, delta_dir, prefix)
+        written.append(write_upsert_cypher(delta_dir, prefix))
+    if "graphml" in formats:
+        written += write_graphml(changed_nodes, changed_edges, delta_dir, prefix)
+    if "parquet" in formats or "arrow" in formats:
+        # 表格格式用 op 欄位標示 upsert / delete，刪除列只有 row_id
+        table_rows = changed_edges + [{"row_id": row_id} for row_id in deleted]
+        ops = {"op": ["upsert"] * len(changed_edges) + ["delete"] * len(deleted)}
+        if "parquet" in formats:
+            written += write_parquet(table_rows, delta_dir, prefix, ops)
+        if "arrow" in formats:
+            written += write_arrow(table_rows, delta_dir, prefix, ops)
+
+    atomic_write_json(os.path.join(output_dir, STATE_FILE), new_state)
+    print(f"Incremental export: {len(changed_nodes)} nodes, {len(changed_edges)} relationships upserted, "
+          f"{len(deleted)} relationships and {len(deleted_nodes)} nodes deleted -> {delta_dir}")
+    return written
+
+# 增量 CSV 使用一般表頭 (給 LOAD CSV)，不是 neo4j-admin import 的表頭
+def _write_upsert_csv(nodes, edges, deleted_rows, deleted_nodes, output_dir, prefix):
+    return [
+        _write_csv(os.path.join(output_dir, f"{prefix}nodes.csv"), NODE_COLUMNS,
+                   ([n[c] for c in NODE_COLUMNS] for n in nodes)),
+        _write_csv(os.path.join(output_dir, f"{prefix}relationships.csv"), EDGE_COLUMNS,
+                   ([e[c] for c in EDGE_COLUMNS] for e in edges)),
+        _write_csv(os.path.join(output_dir, f"{prefix}deleted.csv"), ["row_id", "head_id", "tail_id"], deleted_rows),
+        _write_csv(os.path.join(output_dir, f"{prefix}deleted_nodes.csv"), ["node_id"], ([n] for n in deleted_nodes))
+    ]
+
+# 檔案層級的一致性檢查：ID 唯一、關係端點都存在、各格式列數與狀態檔一致
+def validate_export(output_dir=None):
+    output_dir = output_dir or default_export_dir()
+    errors = []
+    counts = {}
+
+    nodes_path = os.path.join(output_dir, "nodes.csv")
+    rels_path = os.path.join(output_dir, "relationships.csv")
+    if os.path.exists(nodes_path) and os.path.exists(rels_path):
+        with open(nodes_path, "r", encoding="utf-8", newline="") as f:
+            node_ids = [row[0] for row in list(csv.reader(f))[1:]]
+        if len(node_ids) != len(set(node_ids)):
+            errors.append("nodes.csv contains duplicate node ids")
+        node_ids = set(node_ids)
+
+        with open(rels_path, "r", encoding="utf-8", newline="") as f:
+            rel_rows = list(csv.reader(f))[1:]
+        missing = sum(1 for row in rel_rows if row[0] not in node_ids or row[1] not in node_ids)
+        if missing:
+            errors.append(f"{missing} relationships reference unknown nodes")
+        row_ids = [row[3] for row in rel_rows]
+        if len(row_ids) != len(set(row_ids)):
+            errors.append("relationships.csv contains duplicate row_id values")
+        counts["neo4j_nodes"] = len(node_ids)
+        counts["neo4j_relationships"] = len(rel_rows)
+
+    graphml_path = os.path.join(output_dir, "graph.graphml")
+    if os.path.exists(graphml_path):
+        G = nx.read_graphml(graphml_path, force_multigraph=True)
+        counts["graphml_nodes"] = G.number_of_nodes()
+        counts["graphml_edges"] = G.number_of_edges()
+
+    if pq is not None:
+        parquet_path = os.path.join(output_dir, "edges.parquet")
+        if os.path.exists(parquet_path):
+            counts["parquet_rows"] = pq.read_metadata(parquet_path).num_rows
+        arrow_path = os.path.join(output_dir, "edges.arrow")
+        if os.path.exists(arrow_path):
+            with pa.memory_map(arrow_path, "r") as source:
+                counts["arrow_rows"] = pa.ipc.open_file(source).read_all().num_rows
+
+    full_export = load_state(output_dir).get("full_export")
+    if full_export:
+        for key in ("neo4j_relationships", "graphml_edges", "parquet_rows", "arrow_rows"):
+            if key in counts and counts[key] != full_export["rows"]:
+                errors.append(f"{key}={counts[key]} does not match {full_export['rows']} rows of the last full export")
+        for key in ("neo4j_nodes", "graphml_nodes"):
+            if key in counts and counts[key] != full_export["nodes"]:
+                errors.append(f"{key}={counts[key]} does not match {full_export['nodes']} nodes of the last full export")
+
+    return {"ok": not errors, "errors": errors, "counts": counts}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export verified triples to Neo4j CSV, GraphML, Parquet and Arrow.")
+    parser.add_argument("--output-dir", help="export directory (default: output/exports)")
+    parser.add_argument("--output-root", help="directory holding {ticker}_data folders (default: output)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("full", "write complete export files"), ("incremental", "write only rows changed since the last export")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("tickers", nargs="+")
+        p.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    sub.add_parser("validate", help="check the full export files for consistency")
+    args = parser.parse_args()
+
+    if args.command == "full":
+        export_full(args.tickers, args.output_dir, args.formats, args.output_root)
+    elif args.command == "incremental":
+        export_incremental(args.tickers, args.output_dir, args.formats, args.output_root)
+    else:
+        report = validate_export(args.output_dir)
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import json
+
+# 逐字讀取串流中的 JSON 文字，每當一個「不含巢狀物件」的 {...} 結束就立即解析
+# 回應中途被截斷或某個物件格式壞掉時，已完成的物件仍會保留
+class IncrementalObjectParser:
+    def __init__(self):
+        self.buffer = []
+        self.stack = []          # 每個未關閉的 '{'：[起始位置, 是否含有子物件]
+        self.in_string = False
+        self.escaped = False
+
+    # 餵入一段新的 delta 文字，回傳這次新完成的 dict 列表
+    def feed(self, text):
+        completed = []
+        for ch in text:
+            self.buffer.append(ch)
+            pos = len(self.buffer) - 1
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.stack:
+                    self.stack[-1][1] = True
+                self.stack.append([pos, False])
+            elif ch == "}" and self.stack:
+                start, has_child = self.stack.pop()
+                if has_child:
+                    continue
+                try:
+                    obj = json.loads("".join(self.buffer[start:pos + 1]))
+                except ValueError:
+                    continue
+                if isinstance(obj, dict):
+                    completed.append(obj)
+
+        return completed
+
+    def text(self):
+        return "".join(self.buffer)
+
+# 只保留 head / relation / tail 都有值的三元組
+def is_complete_triple(obj):
+    return all(isinstance(obj.get(k), str) and obj.get(k).strip() for k in ("head", "relation", "tail"))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# 02 抽取、03 驗證共用的 Schema 定義，修改關係白名單只需要改這裡
+ENTITY_TYPES = ["Company", "Product", "Event", "Risk", "Person", "Organization"]
+
+VALID_RELATIONS = [
+    "AFFECTS", "CAUSES", "DELAYS", "CANCELS", "INCREASES", "DECREASES",
+    "LAUNCHES", "PARTNERS_WITH", "COMPETES_WITH", "REGULATES",
+    "ANNOUNCES", "BENEFITS_FROM", "WARNS", "MISSES", "LOWERS",
+    "WITHDRAWS", "SCALE_BACK", "INCURS", "REDUCES", "COMMENTS_ON",
+    "REPORTS", "EXPANDS", "INVESTS_IN", "OWNS", "MANAGES",
+    "DEVELOPS", "TESTIFIES_BEFORE", "HAMPERS"
+]
+
+VERIFY_ACTIONS = ["KEEP", "MODIFY", "DELETE"]
+
+# 推斷實體類型
+def infer_entity_type(entity_name, ticker):
+    name_lower = entity_name.lower()
+    ticker_lower = ticker.lower()
+    
+    # 核心目標
+    if ticker_lower in name_lower:
+        return "Company"
+    
+    # 風險關鍵字
+    if any(x in name_lower for x in ["risk", "concern", "short", "warning", "decline", "loss", "debt"]):
+        return "Risk"
+    
+    # 財務數據/事件
+    if any(x in name_lower for x in ["revenue", "eps", "margin", "guidance", "$", "%"]):
+        return "Event"
+        
+    return "Entity"
+
+# 同一實體在多個 ticker 下推斷的類型 ({ticker: type})：一致時沿用，
+# 不一致 (例如某 ticker 視為公司本身) 時歸為中性的 "Entity"，與 ticker 的處理順序無關
+def merged_entity_type(entity_types):
+    types = set(entity_types.values())
+    return types.pop() if len(types) == 1 else "Entity"
+
+# 給 Prompt 使用的 Schema 文字
+def get_schema_instruction():
+    entity_types = ", ".join(f'"{t}"' for t in ENTITY_TYPES)
+    relation_types = ", ".join(f'"{r}"' for r in VALID_RELATIONS)
+    return f"""
+    Please strictly follow the Schema definition below:
+    1. Entity Types: [{entity_types}]
+    2. Relation Types: [{relation_types}]
+    """
+
+# 單次抽取 + 自我驗證的系統提示詞
+# 內容完全不含 ticker 或文章，所有請求共用同一段前綴，才能吃到 provider 的 prompt caching
+SINGLE_PASS_SYSTEM_PROMPT = f"""
+    You are a professional supply chain risk analyst and knowledge graph quality control expert.
+    Your task is to extract "entity-relation-entity" triples from financial news and then verify every triple you extracted.
+    {get_schema_instruction()}
+
+    **EXTRACTION RULES:**
+    1. **RELATION CONSTRAINT**: You MUST ONLY use the relation types listed above. Do NOT use verbs like "SURGED", "TUMBLED", "ROSE", etc.
+    2. **TARGET ANCHORING**: Focus ONLY on entities and events that have a direct or indirect relationship with the target ticker given by the user. Ignore completely unrelated background news.
+    3. **NO PLACEHOLDERS (ANTI-HALLUCINATION)**: Extract the ACTUAL NAMES of entities from the text. NEVER output literal category labels such as "Event", "Company", "Product", "Risk", "Person", or "Entity1" as the head or tail.
+
+    **VERIFICATION RULES (apply to each extracted triple):**
+    1. **KEEP**: The triple is supported by the article AND the relation is in the Relation Types list.
+    2. **MODIFY**: Your first-draft relation is off-schema or factually wrong. Put the first-draft verb in "draft_relation" and the corrected schema relation in "relation".
+    3. **DELETE**: The triple is not supported by the article. Keep it in the output with action "DELETE" so it can be audited.
+
+    ### Output Format (JSON only, no explanation):
+    {{
+        "triples": [
+            {{"head": "Apple", "draft_relation": "LAUNCHES", "relation": "LAUNCHES", "tail": "Vision Pro", "action": "KEEP", "reason": "Supported by text"}},
+            {{"head": "Moody's", "draft_relation": "RATES", "relation": "REPORTS", "tail": "Apple credit rating", "action": "MODIFY", "reason": "Changed RATES to REPORTS to match schema"}}
+        ]
+    }}
+    """
+
+# 單次模式的 user 訊息：變動內容 (ticker、文章) 一律放在共用前綴之後
+def get_single_pass_prompt(news_text, ticker):
+    return f"Target ticker: {ticker}\n\nPlease extract and verify triples relevant to {ticker} from the following news content:\n\n{news_text}"
+
+# 單次模式的 Structured Outputs JSON Schema
+SINGLE_PASS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "verified_triples",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "triples": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "head": {"type": "string"},
+                            "draft_relation": {"type": "string"},
+                            "relation": {"type": "string", "enum": VALID_RELATIONS},
+                            "tail": {"type": "string"},
+                            "action": {"type": "string", "enum": VERIFY_ACTIONS},
+                            "reason": {"type": "string"}
+                        },
+                        "required": ["head", "draft_relation", "relation", "tail", "action", "reason"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["triples"],
+            "additionalProperties": False
+        }
+    }
+}
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import Future
+from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError
+from dotenv import load_dotenv
+from chunking import estimate_tokens
+import tracing
+
+load_dotenv()
+
+# 所有 LLM 呼叫共用的設定，可由 .env 覆寫
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+# 預估回應長度 (未指定 max_tokens 時用來預扣 TPM)
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# 優先順序：數字越小越先取得執行名額
+INTERACTIVE = 0
+BATCH = 1
+
+_priority = contextvars.ContextVar("llm_priority", default=BATCH)
+
+# Streamlit 等互動式流程用 with priority_scope(INTERACTIVE): 包起來
+@contextmanager
+def priority_scope(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+# ThreadPoolExecutor 的工作執行緒不會繼承 contextvars，提交前用這個包一層以保留優先順序
+def bind_context(fn):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+# 每分鐘補滿 capacity 的 token bucket；per_minute <= 0 表示不限制
+# cond 可與 AdaptiveLimiter 共用，讓退還預算時也能喚醒排隊中的呼叫
+class TokenBucket:
+    def __init__(self, per_minute, cond=None):
+        self.unlimited = per_minute <= 0
+        self.capacity = float(max(per_minute, 0))
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self.cond = cond or threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # 以下兩個方法需在持有 self.cond 時呼叫
+    # 回傳還要等幾秒才夠扣 amount，0 表示現在就夠
+    def shortfall(self, amount):
+        if self.unlimited:
+            return 0
+        amount = min(float(amount), self.capacity)
+        self._refill()
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        if not self.unlimited:
+            self.tokens -= min(float(amount), self.capacity)
+
+    def acquire(self, amount):
+        with self.cond:
+            while True:
+                wait = self.shortfall(amount)
+                if wait == 0:
+                    self.take(amount)
+                    return
+                self.cond.wait(wait)
+
+    # 實際用量與預扣量的差額：正數退還，負數補扣 (允許暫時為負)
+    def adjust(self, amount):
+        if self.unlimited:
+            return
+        with self.cond:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+            self.cond.notify_all()
+
+# AIMD 併發控制：成功時加法增長，遇到 429 或延遲超標時乘法遞減；等待者依優先順序取得名額
+# budgets 是 [(TokenBucket, 數量)]，只有排在最前面的等待者會扣預算，
+# 所以 RPM / TPM / 併發三種資源都依同一個優先順序分配，互動式呼叫不會排在批次呼叫後面
+class AdaptiveLimiter:
+    def __init__(self, maximum, minimum=1, latency_target=LLM_LATENCY_TARGET, cond=None):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(maximum)
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.waiters = []
+        self.counter = itertools.count()
+        self.cond = cond or threading.Condition()
+
+    def acquire(self, priority, budgets=()):
+        with self.cond:
+            ticket = (priority, next(self.counter))
+            heapq.heappush(self.waiters, ticket)
+            while True:
+                if self.waiters[0] != ticket or self.in_flight >= int(self.limit):
+                    self.cond.wait()
+                    continue
+                wait = max([bucket.shortfall(amount) for bucket, amount in budgets] or [0])
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                for bucket, amount in budgets:
+                    bucket.take(amount)
+                heapq.heappop(self.waiters)
+                self.in_flight += 1
+                self.cond.notify_all()
+                return
+
+    def release(self, latency=None, rate_limited=False):
+        with self.cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(self.minimum, self.limit * 0.5)
+            elif latency is not None and latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit * 0.8)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+            self.cond.notify_all()
+
+class LLMGateway:
+    def __init__(self, rpm=LLM_RPM_LIMIT, tpm=LLM_TPM_LIMIT, max_concurrency=LLM_MAX_CONCURRENCY):
+        # 三種資源共用一個 condition，任何一種被退還都會喚醒排在最前面的等待者
+        cond = threading.Condition()
+        self.requests = TokenBucket(rpm, cond)
+        self.tokens = TokenBucket(tpm, cond)
+        self.limiter = AdaptiveLimiter(max_concurrency, cond=cond)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.client = None
+        self.stats = {"calls": 0, "coalesced": 0, "rate_limited": 0, "retries": 0}
+        self.stats_lock = threading.Lock()
+
+    def get_client(self):
+        with self.lock:
+            if self.client is None:
+                # 重試由 gateway 自己處理，才能把 429 回饋給 AIMD
+                self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT, max_retries=0)
+            return self.client
+
+    def _estimate(self, messages, kwargs):
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        return prompt_tokens + completion_tokens
+
+    # RPM / TPM 預算與執行名額在同一個優先佇列中一次取得，等待預算時不會佔住名額
+    def _admit(self, estimated_tokens, priority):
+        self.limiter.acquire(priority, [(self.requests, 1), (self.tokens, estimated_tokens)])
+
+    # stats 會被多個工作執行緒同時更新
+    def _count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def _call(self, messages, model, priority, kwargs):
+        estimated = self._estimate(messages, kwargs)
+        backoff = 1.0
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            with tracing.span("llm.admit", cat="llm", priority=priority, estimated_tokens=estimated):
+                self._admit(estimated, priority)
+            start = time.monotonic()
+            try:
+                with tracing.span("llm.call", cat="llm", model=model, attempt=attempt, estimated_tokens=estimated):
+                    response = self.get_client().chat.completions.create(model=model, messages=messages, **kwargs)
+            # 失敗的嘗試沒有消耗 token，預扣的 TPM 全數退還，重試時再重新預扣
+            except RateLimitError as e:
+                self.limiter.release(rate_limited=True)
+                self.tokens.adjust(estimated)
+                self._count("rate_limited")
+                tracing.instant("llm.rate_limited", cat="llm", concurrency_limit=self.limiter.limit)
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+                delay = float(retry_after) if retry_after else backoff
+                print(f"LLM rate limited (429), concurrency limit now {self.limiter.limit:.1f}; retrying in {delay:.1f}s")
+                self._count("retries")
+                time.sleep(delay)
+                backoff = min(backoff * 2, 30)
+                continue
+            except (APITimeoutError, APIConnectionError):
+                self.limiter.release(latency=time.monotonic() - start)
+                self.tokens.adjust(estimated)
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                self._count("retries")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            except Exception:
+                self.limiter.release()
+                self.tokens.adjust(estimated)
+                raise
+
+            self.limiter.release(latency=time.monotonic() - start)
+            self._count("calls")
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                self.tokens.adjust(estimated - usage.total_tokens)
+            return response
+
+    # 同樣的 (model, messages, 參數) 正在執行時，後到的呼叫直接等待並共用同一個結果
+    def chat_completion(self, messages, model="gpt-5.2", priority=None, **kwargs):
+        if priority is None:
+            priority = _priority.get()
+
+        if kwargs.get("stream"):
+            return self._stream(messages, model, priority, kwargs)
+
+        key = hashlib.sha256(
+            json.dumps({"model": model, "messages": messages, "kwargs": kwargs}, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[key] = future
+
+        if not owner:
+            self._count("coalesced")
+            return future.result()
+
+        try:
+            response = self._call(messages, model, priority, kwargs)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    # 串流呼叫不做合併，名額在串流讀完 (或中斷) 時才釋放
+    # 要求最後一個 chunk 附上 usage，串流結束後用實際用量修正 TPM 預扣
+    def _stream(self, messages, model, priority, kwargs):
+        kwargs = {**kwargs, "stream_options": {"include_usage": True, **(kwargs.get("stream_options") or {})}}
+        estimated = self._estimate(messages, kwargs)
+        self._admit(estimated, priority)
+        start = time.monotonic()
+        try:
+            stream = self.get_client().chat.completions.create(model=model, messages=messages, **kwargs)
+        except RateLimitError:
+            self.limiter.release(rate_limited=True)
+            self.tokens.adjust(estimated)
+            self._count("rate_limited")
+            raise
+        except Exception:
+            self.limiter.release()
+            self.tokens.adjust(estimated)
+            raise
+
+        def generate():
+            usage = None
+            try:
+                with tracing.span("llm.stream", cat="llm", model=model, estimated_tokens=estimated):
+                    for chunk in stream:
+                        usage = getattr(chunk, "usage", None) or usage
+                        yield chunk
+            finally:
+                self.limiter.release(latency=time.monotonic() - start)
+                self._count("calls")
+                # 串流中斷時沒有 usage，保留預扣量
+                if usage is not None and getattr(usage, "total_tokens", None):
+                    self.tokens.adjust(estimated - usage.total_tokens)
+
+        return generate()
+
+    def snapshot(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "tokens_available": round(self.tokens.tokens),
+            "requests_available": round(self.requests.tokens)
+        }
+
+# 整個行程共用一個 gateway
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+def chat_completion(messages, model="gpt-5.2", priority=None, **kwargs):
+    return get_gateway().chat_completion(messages, model=model, priority=priority, **kwargs)
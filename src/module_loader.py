@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import importlib.util
+
+# 以檔名匯入 src/ 底下的編號模組 (01_data_collection.py 等無法直接 import)
+def import_module_from_file(module_name, file_name):
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import heapq
+import hashlib
+import argparse
+import itertools
+import threading
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from checkpoint import atomic_write_json
+import tracing
+
+# 常駐的新聞監看程式：依各 ticker 的新聞頻率調整輪詢間隔，只把沒看過的文章送進 pipeline
+# 用法：python src/news_watcher.py PLTR NVDA TSM --workers 2
+#       python src/news_watcher.py PLTR --fake-source output/fake_news --once
+
+# 輪詢間隔 (秒)：有新文章時減半，沒有時拉長 1.5 倍
+DEFAULT_INTERVAL = 300
+MIN_INTERVAL = 60
+MAX_INTERVAL = 3600
+
+def default_state_path():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output", "watcher_state.json"))
+
+# yfinance 新聞項目的穩定 ID：優先使用 yfinance 的 id，沒有時用正式網址的雜湊
+def stable_article_id(item):
+    content = item.get("content", {}) or {}
+    article_id = item.get("id") or content.get("id")
+    if article_id:
+        return str(article_id)
+    url = (content.get("canonicalUrl") or {}).get("url") or item.get("link") or ""
+    return "url_" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] if url else None
+
+def publish_time(item):
+    return (item.get("content", {}) or {}).get("pubDate") or ""
+
+def _epoch(value):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return 0.0
+
+# 新聞來源介面：fetch(ticker) 回傳與 yf.Ticker(ticker).news 相同格式的列表
+class YFinanceNewsSource:
+    def fetch(self, ticker):
+        import yfinance as yf
+        with tracing.span("yfinance.news", cat="http", ticker=ticker):
+            return yf.Ticker(ticker).news or []
+
+# 本地假來源：每次 fetch 都重新讀取 {directory}/{ticker}.json，可在執行中加入新檔案模擬新文章
+# 也可以直接傳入 dict {ticker: [items]}，並用 add() 追加
+class FakeNewsSource:
+    def __init__(self, directory=None, items=None):
+        self.directory = directory
+        self.items = {t.upper(): list(v) for t, v in (items or {}).items()}
+        self.lock = threading.Lock()
+
+    def add(self, ticker, item):
+        with self.lock:
+            self.items.setdefault(ticker.upper(), []).insert(0, item)
+
+    def fetch(self, ticker):
+        ticker = ticker.upper()
+        with self.lock:
+            items = list(self.items.get(ticker, []))
+        if self.directory:
+            path = os.path.join(self.directory, f"{ticker.lower()}.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    items += json.load(f)
+        return items
+
+# 預設的處理函數：以增量模式跑完整 pipeline，只抓取與分析這批新文章
+def make_pipeline_processor(single_pass=False):
+    import pipeline
+    modules = pipeline.load_modules()
+
+    # pipeline 沒有產生圖譜時視為失敗，這批文章維持未看過，下次輪詢重試
+    def process(ticker, items):
+        html_path = pipeline.run_pipeline(ticker, modules, single_pass=single_pass, rolling_sentiment=True,
+                                          news_items=items, incremental=True)
+        if not html_path:
+            raise RuntimeError(f"pipeline produced no output for {ticker}")
+        return html_path
+    return process
+
+class NewsWatcher:
+    def __init__(self, tickers, source=None, process=None, state_path=None, workers=1, clock=time.time):
+        self.source = source or YFinanceNewsSource()
+        self.process = process
+        self.state_path = state_path or default_state_path()
+        self.workers = workers
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.stop_event = threading.Event()
+        self.jobs = []
+        self.counter = itertools.count()
+        self.running = {}
+        self.stats = {"polls": 0, "new_articles": 0, "jobs_done": 0, "jobs_failed": 0}
+
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        for ticker in tickers:
+            self.add_ticker(ticker)
+
+    def add_ticker(self, ticker):
+        ticker = ticker.strip().upper()
+        with self.lock:
+            self.state.setdefault(ticker, {"seen": {}, "interval": DEFAULT_INTERVAL, "next_poll": 0, "last_new": None})
+
+    def save_state(self):
+        with self.lock:
+            data = json.loads(json.dumps(self.state))
+        atomic_write_json(self.state_path, data)
+
+    # 調整輪詢間隔：有新文章就縮短，沒有就拉長
+    def _adapt_interval(self, entry, new_count):
+        if new_count:
+            entry["interval"] = max(MIN_INTERVAL, entry["interval"] * 0.5)
+            entry["last_new"] = datetime.now(timezone.utc).isoformat()
+        else:
+            entry["interval"] = min(MAX_INTERVAL, entry["interval"] * 1.5)
+        entry["next_poll"] = self.clock() + entry["interval"]
+
+    # 輪詢單一 ticker，回傳這次新發現的文章
+    def poll(self, ticker):
+        try:
+            items = self.source.fetch(ticker)
+        except Exception as e:
+            print(f"[watcher] Failed to fetch news for {ticker}: {e}")
+            items = None
+
+        with self.lock:
+            entry = self.state[ticker]
+            self.stats["polls"] += 1
+            if items is None:
+                # 來源失敗時不改變間隔判斷依據，稍後再試
+                entry["next_poll"] = self.clock() + entry["interval"]
+                return []
+
+            # 同一批次內也去重；已排入或正在處理的文章 (尚未標記為已看過) 不重複排入
+            queued_ids = {stable_article_id(i) for job in self.jobs if job[3] == ticker for i in job[4]}
+            queued_ids |= self.running.get(ticker, set())
+            unseen = []
+            unseen_ids = set()
+            for item in items:
+                article_id = stable_article_id(item)
+                if not article_id or article_id in entry["seen"] or article_id in unseen_ids or article_id in queued_ids:
+                    continue
+                unseen_ids.add(article_id)
+                unseen.append(item)
+
+            self._adapt_interval(entry, len(unseen))
+
+        if unseen:
+            print(f"[watcher] {ticker}: {len(unseen)} new article(s), next poll in {entry['interval']:.0f}s")
+            self.enqueue(ticker, unseen)
+        return unseen
+
+    # 優先順序：新文章越多、最新文章越新的 ticker 越先處理 (heap 取最小值，所以取負號)
+    def _priority(self, items):
+        newest = max((_epoch(publish_time(i)) for i in items), default=0.0)
+        return (-len(items), -newest)
+
+    def enqueue(self, ticker, items):
+        with self.cond:
+            # 同一個 ticker 已在佇列中時合併成一個工作，避免同時跑兩次同一 ticker 的 pipeline
+            for index, job in enumerate(self.jobs):
+                if job[3] == ticker:
+                    merged = job[4] + items
+                    self.jobs[index] = (*self._priority(merged), job[2], ticker, merged)
+                    heapq.heapify(self.jobs)
+                    break
+            else:
+                heapq.heappush(self.jobs, (*self._priority(items), next(self.counter), ticker, items))
+            self.stats["new_articles"] += len(items)
+            self.cond.notify_all()
+
+    # 取出最高優先、且該 ticker 沒有正在處理的工作
+    def _next_job(self, timeout):
+        with self.cond:
+            deadline = time.monotonic() + timeout
+            while not self.stop_event.is_set():
+                for job in sorted(self.jobs):
+                    if job[3] not in self.running:
+                        self.jobs.remove(job)
+                        heapq.heapify(self.jobs)
+                        self.running[job[3]] = {stable_article_id(i) for i in job[4]}
+                        return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            return None
+
+    def _run_job(self, job):
+        ticker, items = job[3], job[4]
+        try:
+            with tracing.span("watcher.job", cat="watcher", ticker=ticker, articles=len(items)):
+                if self.process:
+                    self.process(ticker, items)
+            # 處理成功才標記為已看過，失敗的文章下次輪詢會再排入
+            with self.lock:
+                seen = self.state[ticker]["seen"]
+                for item in items:
+                    seen[stable_article_id(item)] = publish_time(item)
+                self.stats["jobs_done"] += 1
+            self.save_state()
+        except Exception as e:
+            print(f"[watcher] Pipeline failed for {ticker}: {e}")
+            with self.lock:
+                self.stats["jobs_failed"] += 1
+        finally:
+            with self.cond:
+                self.running.pop(ticker, None)
+                self.cond.notify_all()
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            job = self._next_job(timeout=1.0)
+            if job:
+                self._run_job(job)
+
+    def due_tickers(self):
+        now = self.clock()
+        with self.lock:
+            return sorted((t for t, e in self.state.items() if e["next_poll"] <= now), key=lambda t: self.state[t]["next_poll"])
+
+    def seconds_until_next_poll(self):
+        with self.lock:
+            if not self.state:
+                return MAX_INTERVAL
+            return max(0.0, min(e["next_poll"] for e in self.state.values()) - self.clock())
+
+    # 每個 ticker 輪詢一次並等待所有工作處理完成 (給 --once 與測試使用)
+    def run_once(self):
+        for ticker in list(self.state):
+            self.poll(ticker)
+        while True:
+            with self.lock:
+                job = None
+                if self.jobs:
+                    job = heapq.heappop(self.jobs)
+                    self.running[job[3]] = {stable_article_id(i) for i in job[4]}
+            if job is None:
+                break
+            self._run_job(job)
+        self.save_state()
+        return dict(self.stats)
+
+    # 主迴圈：主執行緒負責輪詢，工作執行緒依優先順序跑 pipeline
+    def run(self):
+        threads = [threading.Thread(target=self._worker, name=f"watcher-worker-{i}", daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        print(f"[watcher] Watching {', '.join(self.state)} with {self.workers} worker(s). Press Ctrl+C to stop.")
+        try:
+            while not self.stop_event.is_set():
+                for ticker in self.due_tickers():
+                    self.poll(ticker)
+                self.save_state()
+                self.stop_event.wait(min(self.seconds_until_next_poll(), 30))
+        except KeyboardInterrupt:
+            print("\n[watcher] Stopping...")
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            self.save_state()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll ticker news continuously and run the pipeline on new articles only.")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--workers", type=int, default=1, help="pipelines running in parallel threads (different tickers, one watcher process per output dir)")
+    parser.add_argument("--single-pass", action="store_true", help="use single-pass extraction + verification")
+    parser.add_argument("--fake-source", help="directory of {ticker}.json news lists to use instead of yfinance")
+    parser.add_argument("--dry-run", action="store_true", help="only detect new articles, do not run the pipeline")
+    parser.add_argument("--once", action="store_true", help="poll every ticker once, process new articles and exit")
+    parser.add_argument("--state", help="watcher state file (default: output/watcher_state.json)")
+    args = parser.parse_args()
+
+    source = FakeNewsSource(args.fake_source) if args.fake_source else YFinanceNewsSource()
+    process = None if args.dry_run else make_pipeline_processor(args.single_pass)
+    watcher = NewsWatcher(args.tickers, source, process, args.state, args.workers)
+
+    if args.once:
+        print(json.dumps(watcher.run_once(), indent=2))
+    else:
+        watcher.run()
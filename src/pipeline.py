@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import tracing
+from exposure_index import update_index_for_ticker
+from module_loader import import_module_from_file
+
+# 不經過 Streamlit 直接跑完整 pipeline (01 -> 05)，可選擇輸出 Chrome trace 與各階段 profile
+# 用法：python src/pipeline.py PLTR NVDA --trace output/traces/run.json --profile output/profiles
+
+def load_modules():
+    return (
+        import_module_from_file("mod_01", "01_data_collection.py"),
+        import_module_from_file("mod_02", "02_llm_extraction.py"),
+        import_module_from_file("mod_03", "03_auto_verifier.py"),
+        import_module_from_file("mod_04", "04_market_sentiment.py"),
+        import_module_from_file("mod_05", "05_interactive_visualization.py")
+    )
+
+# incremental=True 時只處理新文章，先前的抽取 / 驗證結果直接沿用 (news_watcher 使用)
+# 任一步驟沒有產生輸出檔時提前結束並回傳 None，不再執行後面的步驟
+# stream=True 時 02 以串流抽取，每個去重後的三元組一完成就印出 (single_pass 不支援串流)
+def run_pipeline(ticker, modules, single_pass=False, rolling_sentiment=False, resume=False, news_items=None, incremental=False, stream=False):
+    mod_01, mod_02, mod_03, mod_04, mod_05 = modules
+
+    with tracing.stage(f"{ticker}.01_data_collection", ticker=ticker):
+        news_file = mod_01.run_data_collection(ticker, resume=resume, news_items=news_items, incremental=incremental)
+    if not news_file:
+        print(f"{ticker}: data collection produced no news file, stopping.")
+        return None
+
+    if single_pass:
+        with tracing.stage(f"{ticker}.02_single_pass", ticker=ticker):
+            verified_file = mod_02.run_single_pass_extraction(news_file, ticker, resume=resume, incremental=incremental)
+    else:
+        with tracing.stage(f"{ticker}.02_llm_extraction", ticker=ticker):
+            draft_file = mod_02.run_llm_extraction(news_file, ticker, stream=stream, on_triple=print_triple if stream else None,
+                                                   resume=resume, incremental=incremental)
+        if not draft_file:
+            print(f"{ticker}: extraction produced no draft file, stopping.")
+            return None
+        with tracing.stage(f"{ticker}.03_auto_verifier", ticker=ticker):
+            verified_file = mod_03.run_auto_verifier(draft_file, news_file, ticker, resume=resume, incremental=incremental)
+
+    if not verified_file:
+        print(f"{ticker}: extraction / verification produced no verified file, skipping steps 04 and 05.")
+        return None
+
+    with tracing.stage(f"{ticker}.exposure_index", ticker=ticker):
+        update_index_for_ticker(ticker, verified_file)
+
+    with tracing.stage(f"{ticker}.04_market_sentiment", ticker=ticker):
+        if rolling_sentiment:
+            mod_04.run_rolling_sentiment(verified_file, ticker)
+        else:
+            mod_04.run_market_sentiment(verified_file, ticker)
+
+    with tracing.stage(f"{ticker}.05_visualization", ticker=ticker):
+        return mod_05.run_visualization(ticker)
+
+def print_triple(triple):
+    print(f"   + [{triple.get('news_id')}] {triple['head']} -[{triple['relation']}]-> {triple['tail']}", flush=True)
+
+def default_trace_path():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.normpath(os.path.join(current_dir, "..", "output", "traces", f"pipeline_{stamp}.json"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the full news -> knowledge graph pipeline for one or more tickers.")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--single-pass", action="store_true", help="merge extraction and verification into one LLM call")
+    parser.add_argument("--rolling-sentiment", action="store_true", help="score only new articles with time decay")
+    parser.add_argument("--resume", action="store_true", help="skip articles completed by an interrupted run")
+    parser.add_argument("--incremental", action="store_true", help="reuse results of the previous run and process only new articles")
+    parser.add_argument("--stream", action="store_true", help="stream extraction and print each triple as soon as it is parsed")
+    parser.add_argument("--trace", nargs="?", const="", help="write a Chrome trace-event JSON (default: output/traces/pipeline_<utc>.json)")
+    parser.add_argument("--profile", help="directory for per-stage cProfile (.prof) and tracemalloc summaries (.txt)")
+    args = parser.parse_args()
+
+    if args.trace is not None or args.profile:
+        tracing.enable_tracing(args.profile)
+
+    modules = load_modules()
+    failed = []
+    try:
+        # 單一 ticker 失敗時繼續處理其他 ticker
+        for ticker in args.tickers:
+            ticker = ticker.strip().upper()
+            try:
+                html_path = run_pipeline(ticker, modules, args.single_pass, args.rolling_sentiment, args.resume,
+                                         incremental=args.incremental, stream=args.stream)
+            except Exception as e:
+                print(f"{ticker} failed: {e}")
+                html_path = None
+            if html_path:
+                print(f"{ticker} completed: {html_path}")
+            else:
+                failed.append(ticker)
+        if failed:
+            print(f"Failed tickers: {', '.join(failed)}")
+    finally:
+        if tracing.is_enabled():
+            tracing.save_trace(args.trace or default_trace_path())
+            tracing.disable_tracing()
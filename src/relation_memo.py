@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import argparse
+import threading
+from datetime import datetime, timezone
+from checkpoint import atomic_write_json
+from kg_schema import VALID_RELATIONS
+
+# 本地套用修正所需的最低次數與信心度 (最常見修正 / 該關係所有修正次數)
+MIN_SUPPORT = 3
+MIN_CONFIDENCE = 0.8
+
+# 同一行程內多個 pipeline 同時存檔時 (news_watcher --workers > 1) 依序合併寫入
+_SAVE_LOCK = threading.Lock()
+
+def default_memo_path():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output", "relation_corrections.json"))
+
+# 記錄驗證器對不合規關係的 MODIFY 決策，累積足夠信心後就直接在本地修正，不再送給 LLM
+class RelationMemo:
+    def __init__(self, path=None):
+        self.path = path or default_memo_path()
+        self.pending = {}       # 載入後新記錄、尚未存檔的次數 {key: {corrected: count}}
+        self.lock = threading.Lock()
+        self.entries = self._read()
+
+    def _read(self):
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for entry in json.load(f).get("corrections", []):
+                    entries[self._key(entry["original"], entry["head_type"], entry["tail_type"])] = entry
+        return entries
+
+    def _key(self, original, head_type, tail_type):
+        return f"{original}|{head_type}|{tail_type}"
+
+    # 只記錄原本不在白名單內的關係，白名單內的關係改動與上下文有關，不適合本地套用
+    def record(self, original, corrected, head_type, tail_type):
+        original = str(original).strip().upper()
+        if original in VALID_RELATIONS or corrected not in VALID_RELATIONS:
+            return
+        with self.lock:
+            key = self._key(original, head_type, tail_type)
+            entry = self.entries.setdefault(key, {
+                "original": original, "head_type": head_type, "tail_type": tail_type, "counts": {}
+            })
+            entry["counts"][corrected] = entry["counts"].get(corrected, 0) + 1
+            entry["last_seen"] = datetime.now(timezone.utc).isoformat()
+            pending = self.pending.setdefault(key, {})
+            pending[corrected] = pending.get(corrected, 0) + 1
+
+    def _best(self, counts):
+        total = sum(counts.values())
+        if not total:
+            return None
+        corrected, support = max(counts.items(), key=lambda item: item[1])
+        return {"relation": corrected, "support": support, "confidence": support / total}
+
+    # 先找完全相同的 (關係, head 類型, tail 類型)，次數不足時退回只看關係本身
+    def lookup(self, original, head_type, tail_type):
+        original = str(original).strip().upper()
+        with self.lock:
+            entry = self.entries.get(self._key(original, head_type, tail_type))
+            candidates = [entry["counts"]] if entry else []
+            merged = {}
+            for e in self.entries.values():
+                if e["original"] == original:
+                    for relation, count in e["counts"].items():
+                        merged[relation] = merged.get(relation, 0) + count
+            candidates.append(merged)
+
+        for counts in candidates:
+            best = self._best(counts)
+            if best and best["support"] >= MIN_SUPPORT and best["confidence"] >= MIN_CONFIDENCE:
+                return best
+        return None
+
+    def rows(self):
+        with self.lock:
+            rows = []
+            for entry in self.entries.values():
+                best = self._best(entry["counts"])
+                rows.append({
+                    "original": entry["original"],
+                    "head_type": entry["head_type"],
+                    "tail_type": entry["tail_type"],
+                    "corrected": best["relation"],
+                    "support": best["support"],
+                    "total": sum(entry["counts"].values()),
+                    "confidence": round(best["confidence"], 3),
+                    "counts": dict(entry["counts"]),
+                    "last_seen": entry.get("last_seen")
+                })
+        return sorted(rows, key=lambda r: (-r["total"], r["original"]))
+
+    # 存檔前重新讀取檔案，只把這個實例新增的次數加上去，避免覆蓋其他 pipeline 同時寫入的修正
+    def save(self):
+        with _SAVE_LOCK:
+            with self.lock:
+                entries = self._read()
+                for key, counts in self.pending.items():
+                    local = self.entries[key]
+                    entry = entries.setdefault(key, {
+                        "original": local["original"], "head_type": local["head_type"], "tail_type": local["tail_type"], "counts": {}
+                    })
+                    for corrected, count in counts.items():
+                        entry["counts"][corrected] = entry["counts"].get(corrected, 0) + count
+                    entry["last_seen"] = local.get("last_seen")
+                self.entries = entries
+                self.pending = {}
+                data = {"corrections": list(entries.values())}
+            atomic_write_json(self.path, data)
+        return self.path
+
+    def export_csv(self, path):
+        fields = ["original", "head_type", "tail_type", "corrected", "support", "total", "confidence", "last_seen"]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.rows())
+        return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or export learned relation corrections.")
+    parser.add_argument("--memo", help="memo file path (default: output/relation_corrections.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="print the correction table")
+    p_export = sub.add_parser("export", help="export the table as CSV or JSON")
+    p_export.add_argument("path", help="output path ending with .csv or .json")
+    args = parser.parse_args()
+
+    memo = RelationMemo(args.memo)
+    if args.command == "show":
+        rows = memo.rows()
+        if not rows:
+            print("No corrections recorded yet.")
+        for row in rows:
+            applied = "auto" if memo.lookup(row["original"], row["head_type"], row["tail_type"]) else "llm"
+            print(f"{row['original']:<18} ({row['head_type']} -> {row['tail_type']}) => {row['corrected']:<16} "
+                  f"{row['support']}/{row['total']} conf={row['confidence']:.2f} [{applied}]")
+    elif args.path.endswith(".csv"):
+        print(f"Exported to: {memo.export_csv(args.path)}")
+    else:
+        with open(args.path, "w", encoding="utf-8") as f:
+            json.dump(memo.rows(), f, ensure_ascii=False, indent=2)
+        print(f"Exported to: {args.path}")
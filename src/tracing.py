@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+from checkpoint import atomic_write_json
+
+# 每次 enable_tracing 建立一份獨立的 trace，存在 contextvar 中
+# Streamlit 每個 session 在自己的執行緒執行，彼此的 trace 不會互相清除或混在一起
+# chunk 平行處理的工作執行緒經由 llm_gateway.bind_context 複製 context，會寫入同一份 trace
+class Trace:
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.events = []
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def now_us(self):
+        return (time.perf_counter() - self.origin) * 1_000_000
+
+    def record(self, event):
+        thread = threading.current_thread()
+        event["pid"] = os.getpid()
+        event["tid"] = thread.ident
+        with self.lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+# 預設關閉：未啟用時 span() 幾乎沒有額外成本
+_current = contextvars.ContextVar("trace", default=None)
+
+# 開始記錄 trace；profile_dir 有值時每個 stage 另外輸出 cProfile 與 tracemalloc 結果
+def enable_tracing(profile_dir=None):
+    trace = Trace(profile_dir)
+    _current.set(trace)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    return trace
+
+def disable_tracing():
+    _current.set(None)
+
+def is_enabled():
+    return _current.get() is not None
+
+# 記錄一段耗時 (Chrome trace-event 的 "X" complete event)
+@contextmanager
+def span(name, cat="pipeline", **args):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = trace.now_us()
+    try:
+        yield
+    finally:
+        trace.record({"name": name, "cat": cat, "ph": "X", "ts": start, "dur": trace.now_us() - start, "args": args})
+
+# 單點事件 (例如 429、checkpoint 寫入)
+def instant(name, cat="pipeline", **args):
+    trace = _current.get()
+    if trace is not None:
+        trace.record({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": trace.now_us(), "args": args})
+
+# tracemalloc 是整個 process 共用的，多個 session 同時 profile 時用引用計數決定何時 start / stop
+# 避免先結束的 stage 把其他 session 仍在使用的 tracing 關掉
+# 呼叫前就已在 tracing (例如 benchmark 自己啟動) 時不由這裡停止
+_TRACEMALLOC_LOCK = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _TRACEMALLOC_LOCK:
+        if _tracemalloc_users == 0:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+        _tracemalloc_users += 1
+        # 只有一個使用者時才重設峰值；同時 profile 的 stage 峰值會包含彼此的配置
+        if _tracemalloc_users == 1:
+            tracemalloc.reset_peak()
+
+def _release_tracemalloc():
+    global _tracemalloc_users
+    with _TRACEMALLOC_LOCK:
+        _, peak = tracemalloc.get_traced_memory()
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+        return peak
+
+# 一個 pipeline 階段：span + (選用) cProfile / tracemalloc
+# cProfile 只涵蓋呼叫此函數的執行緒，chunk 平行處理的工作執行緒請看 trace 上的 span
+@contextmanager
+def stage(name, **args):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+
+    profiler = None
+    if trace.profile_dir:
+        _acquire_tracemalloc()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ 同時只允許一個 profiler，其他 session 正在 profile 時只記錄記憶體峰值
+            profiler = None
+
+    try:
+        with span(name, cat="stage", **args):
+            yield
+    finally:
+        if trace.profile_dir:
+            if profiler:
+                profiler.disable()
+            peak = _release_tracemalloc()
+            _write_profile(trace.profile_dir, name, profiler, peak)
+
+def _write_profile(profile_dir, name, profiler, peak_bytes):
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+    prof_path = os.path.join(profile_dir, f"{safe_name}.prof")
+    txt_path = os.path.join(profile_dir, f"{safe_name}.txt")
+    if profiler:
+        profiler.dump_stats(prof_path)
+    with open(txt_path, "w", encoding="utf-8") as f:
+        f.write(f"Stage: {name}\nPeak traced memory: {peak_bytes / 1024 / 1024:.2f} MB\n\n")
+        if profiler:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        else:
+            f.write("cProfile skipped: another profiler was active.\n")
+    instant("profile_saved", cat="profile", stage=name, path=prof_path, peak_mb=round(peak_bytes / 1024 / 1024, 2))
+
+# 輸出成 Perfetto / chrome://tracing 可開啟的 JSON
+def save_trace(path):
+    trace = _current.get()
+    if trace is None:
+        return None
+    with trace.lock:
+        events = list(trace.events)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in trace.thread_names.items()
+        ]
+    atomic_write_json(path, {"traceEvents": metadata + events, "displayTimeUnit": "ms"}, indent=None)
+    print(f"Trace saved to: {path} ({len(events)} events, open in https://ui.perfetto.dev)")
+    return path
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+import networkx as nx
+from pyvis.network import Network
+from checkpoint import atomic_write_json
+from module_loader import import_module_from_file
+from kg_schema import infer_entity_type, merged_entity_type
+
+# 產業 / watchlist 視圖：把多個 ticker 的圖譜合併成一張，出現在兩個以上 ticker 的實體成為橋接節點
+# 各 ticker 的單獨圖譜以 process pool 平行產生，輸入沒變時直接沿用上次的 HTML
+# 用法：python src/watchlist_graph.py NVDA AMD TSM --name semis --max-nodes 300
+
+# 合併圖的細節層級上限，超過時依重要性 (橋接 ticker 數、degree) 保留節點與邊，讓 Streamlit 能快速載入
+DEFAULT_MAX_NODES = 400
+DEFAULT_MAX_EDGES = 1500
+
+# 節點與圖譜繪製方式改變時遞增，讓舊的快取失效
+RENDER_VERSION = 3
+
+BRIDGE_COLOR = "#ff00ff"
+
+# tooltip 每行字數，vis-network 的 tooltip 不會自動換行
+TOOLTIP_WIDTH = 60
+
+# 每個 ticker 一個顏色 (非橋接節點依所屬 ticker 上色)
+TICKER_PALETTE = ["#00d4ff", "#ffea00", "#ff4d4d", "#bd8cbf", "#ffa500", "#7CFC00", "#40e0d0", "#ff69b4", "#d2b48c", "#97c2fc"]
+
+def default_output_root():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(current_dir, "..", "output"))
+
+def ticker_dir(ticker, output_root):
+    return os.path.join(output_root, f"{ticker.lower()}_data")
+
+def load_json(filepath):
+    if not os.path.exists(filepath):
+        print(f"File not found: {filepath}")
+        return None
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# 已載入過 (例如 app.py) 就直接沿用，避免重複執行模組
+def _load_viz():
+    return sys.modules.get("mod_05") or import_module_from_file("mod_05", "05_interactive_visualization.py")
+
+# process pool 的工作函數 (必須在模組層級才能被 pickle)
+# 05 每次執行都會寫入輸入雜湊；只有輸入在上次 05 之後又改變時才重畫，避免覆寫該 ticker 的差異快照與新增邊標示
+def _render_ticker(ticker, output_root):
+    start = time.perf_counter()
+    viz = _load_viz()
+    base = ticker_dir(ticker, output_root)
+    html_path = os.path.join(base, f"{ticker.lower()}_knowledge_graph.html")
+    cache_path = viz.render_cache_path(base, ticker)
+    cache = load_json(cache_path) if os.path.exists(cache_path) else None
+    if cache and cache.get("fingerprint") == viz.input_fingerprint(base, ticker) and os.path.exists(html_path):
+        return {"ticker": ticker, "html": html_path, "cached": True, "seconds": round(time.perf_counter() - start, 3)}
+
+    html_path = viz.run_visualization(ticker, output_root=output_root)
+    return {"ticker": ticker, "html": html_path, "cached": False, "seconds": round(time.perf_counter() - start, 3)}
+
+# 平行產生各 ticker 的圖譜；workers=1 時在目前行程執行 (方便除錯)
+def render_tickers(tickers, output_root=None, workers=None):
+    output_root = output_root or default_output_root()
+    workers = workers or min(len(tickers), os.cpu_count() or 1)
+    if workers <= 1:
+        return [_render_ticker(t, output_root) for t in tickers]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_render_ticker, t, output_root) for t in tickers]
+        return [f.result() for f in futures]
+
+# 合併多個 ticker 的三元組：節點以小寫名稱合併，記錄出現在哪些 ticker；同一條邊被多次提到時累計權重
+def build_merged_graph(tickers, output_root=None):
+    output_root = output_root or default_output_root()
+    G = nx.DiGraph()
+
+    for ticker in tickers:
+        path = os.path.join(ticker_dir(ticker, output_root), f"{ticker.lower()}_triples_verified.json")
+        for news in load_json(path) or []:
+            for triple in news.get("triples", []):
+                head = str(triple.get("head", "")).strip()
+                tail = str(triple.get("tail", "")).strip()
+                relation = triple.get("relation")
+                if not head or not tail:
+                    continue
+
+                head_key, tail_key = head.lower(), tail.lower()
+                for key, name in ((head_key, head), (tail_key, tail)):
+                    if key not in G:
+                        G.add_node(key, label=name, entity_types={}, tickers=set())
+                    # 類型依各 ticker 分別推斷，不受 ticker 順序影響
+                    G.nodes[key]["entity_types"].setdefault(ticker, infer_entity_type(name, ticker))
+                    G.nodes[key]["tickers"].add(ticker)
+
+                if G.has_edge(head_key, tail_key):
+                    edge = G.edges[head_key, tail_key]
+                    edge["weight"] += 1
+                    edge["relations"].add(relation)
+                    edge["tickers"].add(ticker)
+                else:
+                    G.add_edge(head_key, tail_key, weight=1, relations={relation}, tickers={ticker})
+
+    return G
+
+def bridge_nodes(G):
+    return [n for n, attrs in G.nodes(data=True) if len(attrs["tickers"]) > 1]
+
+# 細節層級：保留最重要的節點 (橋接 ticker 數優先，其次 degree)，再從中挑權重最高的邊
+def apply_level_of_detail(G, max_nodes=DEFAULT_MAX_NODES, max_edges=DEFAULT_MAX_EDGES):
+    if G.number_of_nodes() <= max_nodes and G.number_of_edges() <= max_edges:
+        return G, {"nodes_dropped": 0, "edges_dropped": 0}
+
+    degrees = dict(G.degree(weight="weight"))
+    ranked = sorted(G.nodes, key=lambda n: (len(G.nodes[n]["tickers"]), degrees.get(n, 0)), reverse=True)
+    kept = set(ranked[:max_nodes])
+    edges = sorted(
+        ((u, v, d) for u, v, d in G.edges(data=True) if u in kept and v in kept),
+        key=lambda e: e[2]["weight"], reverse=True
+    )[:max_edges]
+
+    H = nx.DiGraph()
+    for node in kept:
+        H.add_node(node, **G.nodes[node])
+    H.add_edges_from(edges)
+    # 邊被裁掉後變成孤立的非橋接節點就不畫
+    H.remove_nodes_from([n for n in list(H.nodes) if H.degree(n) == 0 and len(H.nodes[n]["tickers"]) < 2])
+
+    return H, {
+        "nodes_dropped": G.number_of_nodes() - H.number_of_nodes(),
+        "edges_dropped": G.number_of_edges() - H.number_of_edges()
+    }
+
+def create_merged_network(G, tickers):
+    colors = {t: TICKER_PALETTE[i % len(TICKER_PALETTE)] for i, t in enumerate(tickers)}
+    degrees = dict(G.degree())
+    net = Network(height="900px", width="100%", bgcolor="#111111", font_color="white", directed=True)
+
+    for node, attrs in G.nodes(data=True):
+        node_tickers = sorted(attrs["tickers"])
+        bridge = len(node_tickers) > 1
+        title = "\n".join([textwrap.fill(attrs["label"], TOOLTIP_WIDTH), merged_entity_type(attrs["entity_types"]),
+                           textwrap.fill(f"Tickers: {', '.join(node_tickers)}", TOOLTIP_WIDTH)])
+        net.add_node(
+            node, label=attrs["label"], title=title,
+            color=BRIDGE_COLOR if bridge else colors.get(node_tickers[0], "#97c2fc"),
+            shape="diamond" if bridge else "dot",
+            size=min(10 + degrees.get(node, 1) * 3, 50) + (10 if bridge else 0),
+            group="Bridge" if bridge else node_tickers[0]
+        )
+
+    for head, tail, attrs in G.edges(data=True):
+        relations = "/".join(sorted(r for r in attrs["relations"] if r))
+        net.add_edge(head, tail, label=relations, title=textwrap.fill(f"{relations} (x{attrs['weight']}, {', '.join(sorted(attrs['tickers']))})", TOOLTIP_WIDTH),
+                     value=attrs["weight"], arrows="to")
+
+    # 大圖關掉逐步穩定化的動畫，先算好佈局再顯示，載入較快
+    net.force_atlas_2based(gravity=-50, central_gravity=0.01, spring_length=120, spring_strength=0.08, damping=0.4, overlap=0)
+    net.options.physics.stabilization = {"enabled": True, "iterations": 200 if G.number_of_nodes() > 200 else 1000}
+    return net
+
+def _legend_html(tickers, stats):
+    colors = {t: TICKER_PALETTE[i % len(TICKER_PALETTE)] for i, t in enumerate(tickers)}
+    items = "".join(f'<span style="color:{c};margin-right:12px;">&#9679; {t}</span>' for t, c in colors.items())
+    return f"""
+    <div style="position: fixed; top: 20px; left: 20px; background-color: rgba(10, 10, 10, 0.9); border: 1px solid #444;
+                border-radius: 8px; padding: 12px; z-index: 1000; font-family: Arial, sans-serif; color: #ddd; font-size: 13px;">
+        {items}<span style="color:{BRIDGE_COLOR};">&#9670; Bridge ({stats['bridges']})</span><br/>
+        Showing {stats['nodes']} nodes / {stats['edges']} edges
+        ({stats['nodes_dropped']} nodes, {stats['edges_dropped']} edges hidden by detail limit)
+    </div>
+    """
+
+# 產生合併視圖；所有 ticker 的輸入與細節上限都沒變時直接沿用上次的 HTML
+def run_watchlist_view(tickers, name=None, output_root=None, max_nodes=DEFAULT_MAX_NODES, max_edges=DEFAULT_MAX_EDGES,
+                       render_individual=True, workers=None):
+    tickers = [t.strip().upper() for t in tickers if t.strip()]
+    output_root = output_root or default_output_root()
+    name = name or "_".join(t.lower() for t in tickers)
+    view_dir = os.path.join(output_root, "watchlist")
+    os.makedirs(view_dir, exist_ok=True)
+    html_path = os.path.join(view_dir, f"{name}_merged_graph.html")
+    cache_path = os.path.join(view_dir, f"{name}_merged_cache.json")
+
+    renders = render_tickers(tickers, output_root, workers) if render_individual else []
+    for r in renders:
+        print(f"  {r['ticker']:<8} {'cached' if r['cached'] else 'rendered'} in {r['seconds']:.2f}s")
+
+    viz = _load_viz()
+    fingerprint = hashlib.sha256(json.dumps({
+        "version": RENDER_VERSION, "max_nodes": max_nodes, "max_edges": max_edges,
+        "inputs": {t: viz.input_fingerprint(ticker_dir(t, output_root), t) for t in tickers}
+    }, sort_keys=True).encode("utf-8")).hexdigest()
+
+    cache = load_json(cache_path) if os.path.exists(cache_path) else None
+    if cache and cache.get("fingerprint") == fingerprint and os.path.exists(html_path):
+        print(f"Merged view unchanged, reusing: {html_path}")
+        return {"html": html_path, "cached": True, "renders": renders, "stats": cache.get("stats", {})}
+
+    G = build_merged_graph(tickers, output_root)
+    bridges = len(bridge_nodes(G))
+    H, dropped = apply_level_of_detail(G, max_nodes, max_edges)
+    stats = {"nodes": H.number_of_nodes(), "edges": H.number_of_edges(), "bridges": bridges, **dropped}
+
+    net = create_merged_network(H, tickers)
+    tmp_html_path = f"{html_path}.partial.html"
+    net.write_html(tmp_html_path)
+    with open(tmp_html_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    with open(tmp_html_path, "w", encoding="utf-8") as f:
+        f.write(content.replace("</body>", f"{_legend_html(tickers, stats)}\n</body>", 1))
+    os.replace(tmp_html_path, html_path)
+
+    atomic_write_json(cache_path, {"fingerprint": fingerprint, "stats": stats})
+    print(f"Merged graph for {', '.join(tickers)}: {stats}")
+    print(f"Saved to: {html_path}")
+    return {"html": html_path, "cached": False, "renders": renders, "stats": stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge several tickers' knowledge graphs into one watchlist view.")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--name", help="view name used for the output file (default: tickers joined by _)")
+    parser.add_argument("--max-nodes", type=int, default=DEFAULT_MAX_NODES)
+    parser.add_argument("--max-edges", type=int, default=DEFAULT_MAX_EDGES)
+    parser.add_argument("--workers", type=int, help="processes for per-ticker renders (default: CPU count)")
+    parser.add_argument("--skip-individual", action="store_true", help="only build the merged view")
+    args = parser.parse_args()
+
+    run_watchlist_view(args.tickers, args.name, max_nodes=args.max_nodes, max_edges=args.max_edges,
+                       render_individual=not args.skip_individual, workers=args.workers)
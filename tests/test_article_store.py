@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from article_store import ArticleStore, dehydrate, hydrate, load_news
+
+PARAGRAPHS = ["TSMC delays N2 ramp.", "Nvidia shipments may slip."]
+
+def age_objects(store, seconds):
+    past = time.time() - seconds
+    for path in store.object_paths():
+        os.utime(path, (past, past))
+
+def write_news_file(output_root, ticker, entries):
+    data_dir = output_root / f"{ticker}_data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(data_dir / f"{ticker}_news.json", "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+
+def test_put_is_content_addressed(tmp_path):
+    store = ArticleStore(str(tmp_path / "store"))
+
+    first = store.put(PARAGRAPHS, "news_1")
+    second = store.put(list(PARAGRAPHS), "news_2")
+
+    assert first == second
+    assert store.stats()["articles"] == 1
+    assert store.get(first) == PARAGRAPHS
+    assert store.get_by_news_id("news_2") == PARAGRAPHS
+
+    store.save_index()
+    assert ArticleStore(str(tmp_path / "store")).get_by_news_id("news_1") == PARAGRAPHS
+
+def test_dehydrate_and_hydrate_round_trip(tmp_path):
+    store = ArticleStore(str(tmp_path / "store"))
+    news = {"news_id": "news_1", "title": "T", "content": PARAGRAPHS}
+
+    entry = dehydrate(news, store)
+
+    assert "content" not in entry
+    assert dehydrate(entry, store) is entry
+    assert hydrate(entry, store) == {**entry, "content": PARAGRAPHS}
+    # 舊格式內嵌全文時直接沿用
+    assert hydrate(news, store) is news
+
+def test_load_news_reads_legacy_and_referenced_entries(tmp_path):
+    store = ArticleStore(str(tmp_path / "store"))
+    entry = dehydrate({"news_id": "a", "content": PARAGRAPHS}, store)
+    write_news_file(tmp_path / "output", "pltr", [entry, {"news_id": "b", "content": ["inline"]}])
+
+    news = load_news(str(tmp_path / "output" / "pltr_data" / "pltr_news.json"), store)
+
+    assert [n["content"] for n in news] == [PARAGRAPHS, ["inline"]]
+
+# gc 只刪除沒被引用、且超過 min_age 沒寫入的文章；WAL 中的引用也算
+def test_gc_respects_references_and_min_age(tmp_path):
+    store = ArticleStore(str(tmp_path / "store"))
+    output_root = tmp_path / "output"
+    kept = store.put(["kept"], "kept")
+    in_wal = store.put(["in wal"], "in_wal")
+    orphan = store.put(["orphan"], "orphan")
+    write_news_file(output_root, "pltr", [{"news_id": "kept", "content_hash": kept}])
+    with open(output_root / "pltr_data" / "pltr_news.json.wal.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"key": "url", "value": {"content_hash": in_wal}}) + "\n")
+        f.write('{"key": "broken')
+
+    # 剛寫入的文章即使沒被引用也不刪 (可能是正在執行的 pipeline 寫入的)
+    assert store.gc(str(output_root)) == []
+
+    age_objects(store, 3600)
+    assert store.gc(str(output_root), dry_run=True, min_age=60) == [orphan]
+    assert store.has(orphan)
+
+    assert store.gc(str(output_root), min_age=60) == [orphan]
+    assert not store.has(orphan)
+    assert store.has(kept) and store.has(in_wal)
+    assert store.get_by_news_id("orphan") is None
+
+# 再次 put 既有文章會更新修改時間，gc 視為最近使用
+def test_put_refreshes_age_of_existing_object(tmp_path):
+    store = ArticleStore(str(tmp_path / "store"))
+    digest = store.put(["reused"])
+    age_objects(store, 3600)
+
+    store.put(["reused"])
+
+    assert store.gc(str(tmp_path / "output"), min_age=60) == []
+    assert store.has(digest)
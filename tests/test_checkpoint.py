@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from checkpoint import Checkpoint
+
+def read_output(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def test_resume_skips_completed_items(tmp_path):
+    output = str(tmp_path / "out.json")
+    checkpoint = Checkpoint(output)
+    checkpoint.record("a", {"value": 1})
+    checkpoint.record("b", {"value": 2})
+
+    # 模擬中斷：沒有呼叫 finalize
+    resumed = Checkpoint(output, resume=True)
+
+    assert resumed.is_done("a") and resumed.is_done("b")
+    assert resumed.get("b") == {"value": 2}
+    assert not resumed.is_done("c")
+
+def test_truncated_last_record_is_ignored_and_rewritten(tmp_path):
+    output = str(tmp_path / "out.json")
+    checkpoint = Checkpoint(output)
+    checkpoint.record("a", {"value": 1})
+    with open(checkpoint.wal_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "b", "val')
+
+    resumed = Checkpoint(output, resume=True)
+    resumed.record("c", {"value": 3})
+
+    again = Checkpoint(output, resume=True)
+    assert sorted(again.completed) == ["a", "c"]
+
+def test_without_resume_stale_wal_is_discarded(tmp_path):
+    output = str(tmp_path / "out.json")
+    Checkpoint(output).record("a", {"value": 1})
+
+    fresh = Checkpoint(output)
+
+    assert not fresh.is_done("a")
+    assert not os.path.exists(fresh.wal_path)
+
+def test_finalize_writes_output_and_removes_wal(tmp_path):
+    output = str(tmp_path / "out.json")
+    checkpoint = Checkpoint(output)
+    checkpoint.record("a", {"value": 1})
+
+    checkpoint.finalize([{"value": 1}])
+
+    assert read_output(output) == [{"value": 1}]
+    assert not os.path.exists(checkpoint.wal_path)
+
+# 有失敗項目時保留 WAL，resume 只重跑失敗的項目
+def test_failed_items_keep_wal_and_are_retried(tmp_path):
+    output = str(tmp_path / "out.json")
+    checkpoint = Checkpoint(output)
+    checkpoint.record("a", {"value": 1})
+    checkpoint.mark_failed("b")
+    checkpoint.finalize([{"value": 1}])
+
+    assert os.path.exists(checkpoint.wal_path)
+    resumed = Checkpoint(output, resume=True)
+    assert resumed.is_done("a")
+    assert not resumed.is_done("b")
+
+    resumed.record("b", {"value": 2})
+    resumed.finalize([{"value": 1}, {"value": 2}])
+    assert not os.path.exists(resumed.wal_path)
+
+def test_all_items_failed_still_leaves_checkpoint(tmp_path):
+    output = str(tmp_path / "out.json")
+    checkpoint = Checkpoint(output)
+    checkpoint.mark_failed("a")
+
+    checkpoint.finalize([])
+
+    assert os.path.exists(checkpoint.wal_path)
+    assert Checkpoint(output, resume=True).completed == {}
+
+# prefill 的項目視為完成但不寫入 WAL，也不會覆蓋 WAL 中較新的結果
+def test_prefill_marks_done_without_writing_wal(tmp_path):
+    output = str(tmp_path / "out.json")
+    checkpoint = Checkpoint(output)
+    checkpoint.record("a", {"value": "new"})
+
+    checkpoint.prefill({"a": {"value": "old"}, "b": {"value": "previous run"}})
+
+    assert checkpoint.get("a") == {"value": "new"}
+    assert checkpoint.is_done("b")
+    assert sorted(Checkpoint(output, resume=True).completed) == ["a"]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import chunking
+from chunking import split_into_chunks, split_long_paragraph, merge_chunk_triples, estimate_tokens
+
+# 模擬 tiktoken 的介面：ASCII 字元各 1 個 token，非 ASCII 字元拆成 2 個 token (同一個起始位置)
+class FakeEncoder:
+    def encode(self, text):
+        tokens = []
+        for i, ch in enumerate(text):
+            tokens.extend([(i, ch)] * (1 if ord(ch) < 128 else 2))
+        return tokens
+
+    def decode_with_offsets(self, tokens):
+        text = []
+        offsets = []
+        last = None
+        for index, ch in tokens:
+            offsets.append(len(text) if index != last else len(text) - 1)
+            if index != last:
+                text.append(ch)
+            last = index
+        return "".join(text), offsets
+
+def test_chunks_respect_budget_and_paragraph_boundaries():
+    paragraphs = ["a" * 400, "b" * 400, "c" * 400]
+    chunks = split_into_chunks(paragraphs, max_tokens=200)
+
+    assert chunks == ["a" * 400 + "\n" + "b" * 400, "c" * 400]
+    assert all(estimate_tokens(c) <= 200 for c in chunks)
+
+def test_empty_input_has_no_chunks():
+    assert split_into_chunks(["", "  "]) == []
+
+def test_long_paragraph_is_split_on_sentences_first():
+    paragraph = ("x" * 300 + ". ") * 3
+    pieces = split_long_paragraph(paragraph.strip(), max_tokens=100)
+
+    assert pieces == ["x" * 300 + "."] * 3
+
+def test_overlong_sentence_is_hard_split_by_characters_without_tokenizer(monkeypatch):
+    monkeypatch.setattr(chunking, "_ENCODER", None)
+    sentence = "y" * 1000
+
+    pieces = split_long_paragraph(sentence, max_tokens=100)
+
+    assert [len(p) for p in pieces] == [400, 400, 200]
+
+# 有 tokenizer 時依 token 切，多位元組字元不會被切開
+def test_overlong_sentence_is_hard_split_by_tokens(monkeypatch):
+    monkeypatch.setattr(chunking, "_ENCODER", FakeEncoder())
+    sentence = "供應鏈" * 50 + "z" * 100
+
+    pieces = split_long_paragraph(sentence, max_tokens=64)
+
+    assert "".join(pieces) == sentence
+    assert all(estimate_tokens(p) <= 64 + 1 for p in pieces)
+    assert len(pieces) == 7
+
+def test_merge_dedups_across_chunks_and_keeps_first_chunk_index():
+    chunk_results = [
+        [{"head": "Apple", "relation": "SUPPLIES", "tail": "TSMC"}],
+        None,
+        [{"head": "apple ", "relation": "supplies", "tail": "tsmc"}, {"head": "TSMC", "relation": "DELAYS", "tail": "N2"}],
+    ]
+
+    merged = merge_chunk_triples(chunk_results)
+
+    assert [(t["head"], t["chunk_index"]) for t in merged] == [("Apple", 0), ("TSMC", 2)]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from evidence_index import (
+    EvidenceIndex, build_article_index, find_evidence, annotate_triples, evidence_context, normalize_tokens
+)
+
+PARAGRAPHS = [
+    "Palantir reported strong quarterly revenue. The company signed a new deal with Microsoft Azure.",
+    "Analysts warned about supply risks. TSMC delays could hurt Nvidia shipments.",
+    "Unrelated text about the weather in Denver.",
+]
+
+def test_normalize_tokens_drops_stopwords_and_plurals():
+    assert normalize_tokens("The Suppliers of Apple Inc.") == ["supplier", "apple"]
+
+def test_evidence_in_single_sentence():
+    index = build_article_index(PARAGRAPHS)
+
+    evidence = find_evidence(index, PARAGRAPHS, "TSMC", "Nvidia")
+
+    assert evidence["paragraph"] == 1
+    assert evidence["text"] == "TSMC delays could hurt Nvidia shipments."
+
+def test_evidence_across_adjacent_sentences():
+    index = build_article_index(PARAGRAPHS)
+
+    evidence = find_evidence(index, PARAGRAPHS, "Palantir", "Microsoft")
+
+    assert evidence["text"] == PARAGRAPHS[0]
+
+def test_no_evidence_when_only_one_side_matches():
+    index = build_article_index(PARAGRAPHS)
+
+    assert find_evidence(index, PARAGRAPHS, "Palantir", "Denver") is None
+    assert annotate_triples([{"head": "Palantir", "tail": "Denver"}], index, PARAGRAPHS) == [{"head": "Palantir", "tail": "Denver"}]
+
+# 驗證用文字只含相關句子；任一三元組找不到證據時回傳 None 讓呼叫端用完整 chunk
+def test_evidence_context_selects_relevant_sentences():
+    index = build_article_index(PARAGRAPHS)
+
+    context = evidence_context([{"head": "TSMC", "tail": "Nvidia"}], index, PARAGRAPHS, window=0)
+
+    assert context == "TSMC delays could hurt Nvidia shipments."
+    assert "weather" not in evidence_context([{"head": "TSMC", "tail": "Nvidia"}], index, PARAGRAPHS)
+    assert evidence_context([{"head": "TSMC", "tail": "Denver"}], index, PARAGRAPHS) is None
+
+def test_index_rebuilds_only_when_content_changes(tmp_path):
+    path = str(tmp_path / "pltr_evidence_index.json")
+    index = EvidenceIndex(path)
+    first = index.add_article("n1", PARAGRAPHS, "hash1")
+
+    assert index.add_article("n1", ["changed"], "hash1") is first
+    assert index.add_article("n1", ["TSMC delays Nvidia."], "hash2")["content_hash"] == "hash2"
+
+    index.add_article("n2", PARAGRAPHS, "hash3")
+    index.retain(["n2"])
+    index.save()
+
+    reloaded = EvidenceIndex(path)
+    assert list(reloaded.articles) == ["n2"]
+    # 內容已變時即時建立，不沿用舊索引
+    rebuilt = reloaded.get_or_build("n2", ["Only one sentence."], "other")
+    assert rebuilt["sentences"] == [[0, 0, 18]]
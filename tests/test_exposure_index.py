@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from exposure_index import ExposureIndex
+
+def triple(head, relation, tail):
+    return {"head": head, "relation": relation, "tail": tail}
+
+def news(news_id, *triples):
+    return {"news_id": news_id, "triples": list(triples)}
+
+def build():
+    index = ExposureIndex(max_hops=3)
+    index.replace_ticker_triples([news("n1", triple("Chip shortage", "HAMPERS", "TSMC"), triple("TSMC", "DELAYS", "NVDA Corp"))], "NVDA")
+    index.replace_ticker_triples([news("p1", triple("NVDA Corp", "PARTNERS_WITH", "PLTR Inc."))], "PLTR")
+    return index
+
+def reach_tables(index):
+    return index.reach_out, index.reach_in
+
+def test_exposed_tickers_within_hops():
+    index = build()
+
+    assert index.exposed_tickers("chip shortage", max_hops=2) == [{"ticker": "NVDA", "hops": 2, "via": "NVDA Corp"}]
+    assert index.exposed_tickers("Chip shortage", max_hops=3) == [
+        {"ticker": "NVDA", "hops": 2, "via": "NVDA Corp"},
+        {"ticker": "PLTR", "hops": 3, "via": "PLTR Inc."},
+    ]
+    assert index.exposed_tickers("Unknown entity") == []
+
+def test_ticker_exposures_and_path():
+    index = build()
+
+    assert index.ticker_exposures("PLTR", max_hops=2) == [{"entity": "NVDA Corp", "hops": 1}, {"entity": "TSMC", "hops": 2}]
+    path = index.find_path("TSMC", "PLTR Inc.")
+    assert [(p["head"], p["relations"], p["tail"]) for p in path] == [
+        ("TSMC", ["DELAYS"], "NVDA Corp"),
+        ("NVDA Corp", ["PARTNERS_WITH"], "PLTR Inc."),
+    ]
+    assert path[0]["tickers"] == ["NVDA"] and path[0]["news_ids"] == ["n1"]
+    assert index.find_path("PLTR Inc.", "TSMC") is None
+
+# 以新的驗證結果取代某 ticker 的邊：被拿掉的關係移除，其他 ticker 貢獻的邊保留
+def test_replace_removes_stale_edges_and_keeps_other_tickers():
+    index = build()
+    index.add_triples([triple("NVDA Corp", "PARTNERS_WITH", "PLTR Inc.")], "NVDA", "n1")
+
+    added, removed = index.replace_ticker_triples([news("n2", triple("TSMC", "DELAYS", "NVDA Corp"))], "NVDA")
+
+    assert (added, removed) == (0, 1)
+    assert "Chip shortage" not in index.out_adj
+    # PLTR 仍貢獻這條邊，只移除 NVDA 的來源
+    assert index.out_adj["NVDA Corp"]["PLTR Inc."]["PARTNERS_WITH"]["sources"] == {"PLTR": {"p1"}}
+    assert index.out_adj["TSMC"]["NVDA Corp"]["DELAYS"]["sources"] == {"NVDA": {"n2"}}
+
+# 增量維護的可達表與從頭重建的結果一致，存檔後重新載入也一樣
+def test_incremental_reachability_matches_rebuild(tmp_path):
+    index = build()
+    index.replace_ticker_triples([news("n3", triple("TSMC", "DELAYS", "NVDA Corp"), triple("NVDA Corp", "LAUNCHES", "Rubin"))], "NVDA")
+    index.add_triples([triple("Rubin", "AFFECTS", "PLTR Inc.")], "PLTR", "p2")
+    index.remove_edge("NVDA Corp", "PLTR Inc.")
+
+    incremental = reach_tables(index)
+    index.rebuild_reachability()
+    assert reach_tables(index) == incremental
+
+    path = index.save(str(tmp_path / "exposure_index.json"))
+    loaded = ExposureIndex.load(path)
+    assert reach_tables(loaded) == incremental
+    assert loaded.tickers == index.tickers
+    assert loaded.exposed_tickers("TSMC", max_hops=3) == index.exposed_tickers("TSMC", max_hops=3)
+
+def test_load_missing_file_returns_empty_index(tmp_path):
+    index = ExposureIndex.load(str(tmp_path / "missing.json"))
+
+    assert index.out_adj == {} and index.exposed_tickers("TSMC") == []
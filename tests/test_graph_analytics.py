@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import numpy as np
+import networkx as nx
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from graph_analytics import (
+    RiskEngine, NodeIndex, triples_to_sparse, graph_to_sparse, row_normalize, seed_vector,
+    personalized_pagerank, risk_propagation, ticker_seeds, relation_weight
+)
+
+TRIPLES = [
+    ("TSMC", "DELAYS", "Nvidia"),
+    ("Nvidia", "PARTNERS_WITH", "PLTR Inc."),
+    ("Chip shortage", "HAMPERS", "TSMC"),
+    ("PLTR Inc.", "REPORTS", "Revenue"),
+    ("Microsoft", "INVESTS_IN", "PLTR Inc."),
+]
+
+def test_duplicate_edges_are_summed():
+    matrix, index = triples_to_sparse([("A", "DELAYS", "B"), ("A", "DELAYS", "B")])
+
+    assert matrix[index.index["A"], index.index["B"]] == 2 * relation_weight("DELAYS")
+
+def test_graph_to_sparse_extends_given_index():
+    G = nx.DiGraph()
+    G.add_edge("A", "B", label="WARNS")
+    index = NodeIndex(["Z"])
+
+    matrix, returned = graph_to_sparse(G, index)
+
+    assert returned is index
+    assert index.nodes == ["Z", "A", "B"]
+    assert matrix.shape == (3, 3)
+
+# 與 NetworkX 的 personalized PageRank 結果一致 (dangling 節點回到種子分佈)
+def test_pagerank_matches_networkx():
+    matrix, index = triples_to_sparse(TRIPLES)
+    seeds = {"TSMC": 1.0, "Microsoft": 1.0}
+
+    scores, _ = personalized_pagerank(matrix, seed_vector(index, seeds), alpha=0.85, tol=1e-12, max_iter=500)
+
+    G = nx.DiGraph()
+    G.add_nodes_from(index.nodes)
+    for head, relation, tail in TRIPLES:
+        G.add_edge(head, tail, weight=abs(relation_weight(relation)))
+    expected = nx.pagerank(G, alpha=0.85, personalization=seeds, weight="weight", tol=1e-12, max_iter=500)
+    assert np.allclose(scores, [expected[n] for n in index.nodes], atol=1e-8)
+    assert abs(scores.sum() - 1.0) < 1e-8
+
+# 迭代結果等於閉式解 r = (I - beta W^T)^-1 s
+def test_risk_propagation_matches_closed_form():
+    matrix, index = triples_to_sparse(TRIPLES)
+    seeds = seed_vector(index, {"Chip shortage": 1.0})
+
+    risk, _ = risk_propagation(matrix, seeds, beta=0.5, tol=1e-12, max_iter=500)
+
+    transition, _ = row_normalize(matrix)
+    expected = np.linalg.solve(np.eye(len(index)) - 0.5 * transition.T.toarray(), seeds)
+    assert np.allclose(risk, expected)
+    # 負面關係 (HAMPERS) 的下游節點得到負分
+    assert risk[index.index["TSMC"]] < 0
+
+# 增量加入 / 刪除邊後的結果與重新建立一致
+def test_incremental_engine_matches_rebuild():
+    engine = RiskEngine(TRIPLES[:3])
+    engine.compute()
+    engine.add_edges(TRIPLES[3:])
+    engine.remove_edges([("Chip shortage", "HAMPERS", "TSMC"), ("Unknown", "DELAYS", "TSMC")])
+    seeds = ticker_seeds(engine.node_index, ["PLTR"])
+    engine.compute(seeds)
+
+    remaining = [t for t in TRIPLES if t != ("Chip shortage", "HAMPERS", "TSMC")]
+    rebuilt = RiskEngine(remaining)
+    rebuilt.compute(ticker_seeds(rebuilt.node_index, ["PLTR"]))
+
+    order = [engine.node_index.index[n] for n in rebuilt.node_index.nodes]
+    assert len(engine.rows) == len(remaining)
+    assert np.allclose(engine.pagerank[order], rebuilt.pagerank, atol=1e-6)
+    assert np.allclose(engine.risk[order], rebuilt.risk, atol=1e-6)
+
+def test_top_exposures_sorted_most_negative_first():
+    engine = RiskEngine(TRIPLES)
+    engine.compute({"Chip shortage": 1.0})
+
+    ranking = engine.top_exposures(3)
+
+    scores = [item["risk_score"] for item in ranking]
+    assert scores == sorted(scores)
+    assert ranking[0]["risk_score"] < 0
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import networkx as nx
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import graph_diff
+from graph_diff import edge_id, graph_snapshot, diff_snapshots, vis_patch, highlighted_edges, apply_patch_to_html
+
+def build(edges):
+    G = nx.DiGraph()
+    for head, relation, tail in edges:
+        G.add_node(head, label=head, group="Entity")
+        G.add_node(tail, label=tail, group="Entity")
+        G.add_edge(head, tail, id=edge_id(head, tail), label=relation, title=relation)
+    return G
+
+BASE = [("PLTR", "PARTNERS_WITH", "Microsoft"), ("PLTR", "WARNS", "Supply risk"), ("Microsoft", "INVESTS_IN", "Data center")]
+
+def test_edge_id_is_stable_and_collision_free():
+    assert edge_id("A", "B") == edge_id("A", "B")
+    assert edge_id("A", "B") != edge_id("B", "A")
+    # 以 "->" 串接時兩者會撞在一起
+    assert edge_id("A->B", "C") != edge_id("A", "B->C")
+
+def test_first_run_counts_everything_as_added():
+    diff = diff_snapshots(None, graph_snapshot(build(BASE)))
+
+    assert graph_diff.summarize(diff)["edges"] == {"added": 3, "removed": 0, "changed": 0}
+    assert graph_diff.summarize(diff)["nodes"]["added"] == 4
+
+def test_diff_reports_added_removed_and_changed():
+    old = graph_snapshot(build(BASE))
+    new = graph_snapshot(build([
+        ("PLTR", "PARTNERS_WITH", "Microsoft"),
+        ("PLTR", "INCURS", "Supply risk"),
+        ("Microsoft", "LAUNCHES", "Azure AI"),
+    ]))
+
+    diff = diff_snapshots(old, new)
+
+    assert list(diff["edges"]["added"]) == [edge_id("Microsoft", "Azure AI")]
+    assert list(diff["edges"]["removed"]) == [edge_id("Microsoft", "Data center")]
+    assert list(diff["edges"]["changed"]) == [edge_id("PLTR", "Supply risk")]
+    assert list(diff["nodes"]["added"]) == ["Azure AI"]
+    assert list(diff["nodes"]["removed"]) == ["Data center"]
+    # 刪除的邊保留舊內容，仍能顯示端點
+    assert diff["edges"]["removed"][edge_id("Microsoft", "Data center")]["from"] == "Microsoft"
+    assert highlighted_edges(diff) == sorted([edge_id("Microsoft", "Azure AI"), edge_id("PLTR", "Supply risk")])
+    assert graph_diff.is_empty(diff_snapshots(new, new))
+
+def test_vis_patch_updates_only_the_delta():
+    base = graph_snapshot(build(BASE))
+    current = graph_snapshot(build(BASE[:2] + [("Microsoft", "LAUNCHES", "Azure AI")]))
+    highlight = highlighted_edges(diff_snapshots(base, current))
+
+    patch = vis_patch(base, current, highlight)
+
+    assert [n["id"] for n in patch["nodes_update"]] == ["Azure AI"]
+    assert patch["nodes_remove"] == ["Data center"]
+    assert [e["id"] for e in patch["edges_update"]] == [edge_id("Microsoft", "Azure AI")]
+    assert patch["edges_update"][0]["color"] == graph_diff.HIGHLIGHT_EDGE_COLOR
+    assert patch["edges_remove"] == [edge_id("Microsoft", "Data center")]
+    assert patch["edges_reset"] == []
+
+# base 重畫時標示過的邊，這次已不是新的：依 base 內容重設，去掉標示樣式
+def test_vis_patch_resets_previous_highlights():
+    base = graph_snapshot(build(BASE))
+    base["highlighted"] = [edge_id("PLTR", "Microsoft")]
+    current = graph_snapshot(build(BASE + [("Microsoft", "LAUNCHES", "Azure AI")]))
+
+    patch = vis_patch(base, current, [edge_id("Microsoft", "Azure AI")])
+
+    assert len(patch["edges_reset"]) == 1
+    reset = patch["edges_reset"][0]
+    assert reset["id"] == edge_id("PLTR", "Microsoft")
+    assert reset["label"] == "PARTNERS_WITH"
+    assert "color" not in reset
+
+def test_apply_patch_replaces_previous_patch(tmp_path):
+    html_path = str(tmp_path / "graph.html")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write("<html><body><script>drawGraph();</script></body></html>")
+
+    first = {"nodes_update": [], "nodes_remove": ["old</script>"], "edges_update": [], "edges_remove": [], "edges_reset": []}
+    second = {"nodes_update": [], "nodes_remove": ["X"], "edges_update": [], "edges_remove": [], "edges_reset": []}
+    assert apply_patch_to_html(html_path, first)
+    assert apply_patch_to_html(html_path, second)
+
+    with open(html_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    assert content.count(graph_diff.DELTA_START) == 1
+    assert json.dumps(["X"]) in content
+    assert "old" not in content
+    assert content.endswith("</body></html>")
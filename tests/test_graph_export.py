@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import sys
+import json
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import graph_export
+from graph_export import export_full, export_incremental, validate_export, node_id
+
+NEWS = [
+    {
+        "news_id": "n1", "title": "Article 1", "publish_time": "2026-01-01T00:00:00Z",
+        "triples": [
+            {"head": "PLTR Inc.", "relation": "PARTNERS_WITH", "tail": "Microsoft", "evidence": {"text": "PLTR teams up with Microsoft."}},
+            {"head": "PLTR Inc.", "relation": "WARNS", "tail": "Supply risk"}
+        ]
+    },
+    {
+        "news_id": "n2", "title": "Article 2", "publish_time": "2026-01-02T00:00:00Z",
+        "triples": [
+            {"head": "Microsoft", "relation": "INVESTS_IN", "tail": "Data center"}
+        ]
+    }
+]
+
+def write_verified(output_root, ticker, news_list):
+    data_dir = output_root / f"{ticker.lower()}_data"
+    data_dir.mkdir(exist_ok=True)
+    with open(data_dir / f"{ticker.lower()}_triples_verified.json", "w", encoding="utf-8") as f:
+        json.dump(news_list, f)
+
+def read_csv(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+# 增量檔名為 <時間戳>_<name>，時間戳中不含底線
+def delta_files(export_dir, name):
+    delta_dir = export_dir / "deltas"
+    return sorted(str(delta_dir / f) for f in os.listdir(delta_dir) if f.split("_", 1)[1] == name)
+
+def test_full_export_validates(tmp_path):
+    output_root, export_dir = tmp_path / "output", tmp_path / "exports"
+    output_root.mkdir()
+    write_verified(output_root, "PLTR", NEWS)
+
+    written = export_full(["PLTR"], str(export_dir), ["neo4j", "graphml"], str(output_root))
+
+    assert len(written) == 3
+    report = validate_export(str(export_dir))
+    assert report["ok"], report["errors"]
+    assert report["counts"]["neo4j_nodes"] == 4
+    assert report["counts"]["neo4j_relationships"] == 3
+    assert report["counts"]["graphml_edges"] == 3
+
+# 修改、新增、刪除各一個三元組後，增量檔只包含這些列
+def test_incremental_export_contains_only_changes(tmp_path):
+    output_root, export_dir = tmp_path / "output", tmp_path / "exports"
+    output_root.mkdir()
+    write_verified(output_root, "PLTR", NEWS)
+    export_full(["PLTR"], str(export_dir), ["neo4j"], str(output_root))
+
+    edited = json.loads(json.dumps(NEWS))
+    edited[0]["triples"][0]["evidence"] = {"text": "PLTR expands its Microsoft partnership."}
+    edited[0]["triples"][1]["tail"] = "Demand concern"
+    edited[1]["triples"].append({"head": "Microsoft", "relation": "LAUNCHES", "tail": "Azure AI"})
+    write_verified(output_root, "PLTR", edited)
+
+    export_incremental(["PLTR"], str(export_dir), ["neo4j"], str(output_root))
+
+    relationships = read_csv(delta_files(export_dir, "relationships.csv")[0])
+    assert sorted((r["head"], r["relation"], r["tail"]) for r in relationships) == [
+        ("Microsoft", "LAUNCHES", "Azure AI"),
+        ("PLTR Inc.", "PARTNERS_WITH", "Microsoft"),
+        ("PLTR Inc.", "WARNS", "Demand concern"),
+    ]
+
+    nodes = read_csv(delta_files(export_dir, "nodes.csv")[0])
+    assert sorted(n["name"] for n in nodes) == ["Azure AI", "Demand concern"]
+
+    deleted = read_csv(delta_files(export_dir, "deleted.csv")[0])
+    assert len(deleted) == 1
+    assert (deleted[0]["head_id"], deleted[0]["tail_id"]) == (node_id("PLTR Inc."), node_id("Supply risk"))
+
+    deleted_nodes = read_csv(delta_files(export_dir, "deleted_nodes.csv")[0])
+    assert [n["node_id"] for n in deleted_nodes] == [node_id("Supply risk")]
+
+    cypher_path = delta_files(export_dir, "upsert.cypher")[0]
+    with open(cypher_path, "r", encoding="utf-8") as f:
+        cypher = f.read()
+    prefix = os.path.basename(cypher_path)[:-len("upsert.cypher")]
+    for name in ("nodes.csv", "relationships.csv", "deleted.csv", "deleted_nodes.csv"):
+        assert f"file:///{prefix}{name}" in cypher
+
+    # 沒有變動時不產生新的增量檔
+    assert export_incremental(["PLTR"], str(export_dir), ["neo4j"], str(output_root)) == []
+
+# 共同實體的名稱與類型不受 ticker 順序影響
+def test_node_type_is_independent_of_ticker_order(tmp_path):
+    output_root = tmp_path / "output"
+    output_root.mkdir()
+    write_verified(output_root, "PLTR", [{"news_id": "a", "triples": [{"head": "NVDA chips", "relation": "AFFECTS", "tail": "PLTR Inc."}]}])
+    write_verified(output_root, "NVDA", [{"news_id": "b", "triples": [{"head": "nvda chips", "relation": "LAUNCHES", "tail": "Rubin"}]}])
+
+    forward, _ = graph_export.collect_rows(["PLTR", "NVDA"], str(output_root))
+    backward, _ = graph_export.collect_rows(["NVDA", "PLTR"], str(output_root))
+
+    assert forward == backward
+    assert forward[node_id("NVDA chips")]["type"] == "Entity"
+    assert forward[node_id("Rubin")]["type"] == "Entity"
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import importlib.util
+from types import SimpleNamespace
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from json_stream import IncrementalObjectParser, is_complete_triple
+
+# 02 載入時會檢查 API key，測試中不會真的呼叫 API
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+def load_extraction():
+    spec = importlib.util.spec_from_file_location("mod_02", os.path.join(SRC_DIR, "02_llm_extraction.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+extraction = load_extraction()
+
+TRIPLES = [
+    {"head": "TSMC", "relation": "DELAYS", "tail": "N2 {ramp}"},
+    {"head": "Apple \"Inc\"", "relation": "INVESTS_IN", "tail": "Arizona fab"},
+]
+
+def feed_in_pieces(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed += parser.feed(text[start:start + size])
+    return completed
+
+# 每完成一個物件就立即回傳，字串中的大括號與跳脫引號不影響判斷
+def test_objects_are_emitted_as_soon_as_they_close():
+    text = json.dumps({"triples": TRIPLES})
+    parser = IncrementalObjectParser()
+
+    first_end = text.index("\"}") + 2
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [TRIPLES[0]]
+    assert feed_in_pieces(parser, text[first_end:], 3) == [TRIPLES[1]]
+    assert parser.text() == text
+
+# 回應在物件中間被截斷時，已完成的物件仍保留
+def test_truncated_tail_keeps_completed_objects():
+    text = json.dumps({"triples": TRIPLES})
+    cut = text.index("Arizona")
+
+    completed = feed_in_pieces(IncrementalObjectParser(), text[:cut], 5)
+
+    assert completed == [TRIPLES[0]]
+
+# 格式壞掉的物件被略過，後面的物件照常解析
+def test_malformed_object_is_skipped():
+    text = '{"triples": [{"head": "A", "relation": "AFFECTS", "tail": }, {"head": "B", "relation": "WARNS", "tail": "C"}]}'
+
+    completed = feed_in_pieces(IncrementalObjectParser(), text, 4)
+
+    assert completed == [{"head": "B", "relation": "WARNS", "tail": "C"}]
+
+def test_incomplete_triples_are_rejected():
+    assert is_complete_triple({"head": "A", "relation": "AFFECTS", "tail": "B"})
+    assert not is_complete_triple({"head": "A", "relation": " ", "tail": "B"})
+    assert not is_complete_triple({"head": "A", "relation": "AFFECTS"})
+
+def fake_stream(text, size=6, fail_after=None):
+    for index, start in enumerate(range(0, len(text), size)):
+        if fail_after is not None and index == fail_after:
+            raise ConnectionError("stream dropped")
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[start:start + size]))])
+    yield SimpleNamespace(choices=[], usage=None)
+
+# 串流中斷時回傳已解析的三元組，on_triple 只收到完整的三元組
+def test_extract_info_stream_keeps_triples_before_disconnect(monkeypatch):
+    text = json.dumps({"triples": TRIPLES + [{"head": "X", "relation": "", "tail": "Y"}]})
+    cut_piece = text.index("Arizona") // 6
+    monkeypatch.setattr(extraction.llm_gateway, "chat_completion", lambda **kwargs: fake_stream(text, fail_after=cut_piece))
+    received = []
+
+    triples, raw_text = extraction.extract_info_stream("article", "TSMC", received.append)
+
+    assert triples == [TRIPLES[0]]
+    assert received == [TRIPLES[0]]
+    assert raw_text == text[:cut_piece * 6]
+
+def test_extract_info_stream_full_response(monkeypatch):
+    text = json.dumps({"triples": TRIPLES + [{"head": "X", "relation": "", "tail": "Y"}]})
+    monkeypatch.setattr(extraction.llm_gateway, "chat_completion", lambda **kwargs: fake_stream(text))
+
+    triples, raw_text = extraction.extract_info_stream("article", "TSMC")
+
+    assert triples == TRIPLES
+    assert raw_text == text
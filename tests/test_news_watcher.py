@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from news_watcher import NewsWatcher, FakeNewsSource, DEFAULT_INTERVAL, MIN_INTERVAL, MAX_INTERVAL
+
+def article(article_id, pub_date="2026-01-01T00:00:00Z"):
+    return {"id": article_id, "content": {"pubDate": pub_date, "title": f"Article {article_id}"}}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class RecordingProcess:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, ticker, items):
+        self.calls.append((ticker, [i["id"] for i in items]))
+        if self.fail:
+            raise RuntimeError("pipeline failed")
+
+def make_watcher(tmp_path, source, process, tickers=("PLTR",)):
+    return NewsWatcher(list(tickers), source, process, str(tmp_path / "state.json"), clock=FakeClock())
+
+def test_seen_articles_are_not_processed_again(tmp_path):
+    source = FakeNewsSource(items={"PLTR": [article("a"), article("b"), article("a")]})
+    process = RecordingProcess()
+    watcher = make_watcher(tmp_path, source, process)
+
+    watcher.run_once()
+    assert process.calls == [("PLTR", ["a", "b"])]
+
+    source.add("PLTR", article("c"))
+    watcher.run_once()
+    assert process.calls[1] == ("PLTR", ["c"])
+
+    # 狀態檔保存已看過的 ID，重新啟動後也不會重複處理
+    restarted = make_watcher(tmp_path, source, process)
+    restarted.run_once()
+    assert len(process.calls) == 2
+    with open(tmp_path / "state.json", "r", encoding="utf-8") as f:
+        assert sorted(json.load(f)["PLTR"]["seen"]) == ["a", "b", "c"]
+
+def test_interval_shrinks_on_news_and_grows_when_quiet(tmp_path):
+    source = FakeNewsSource(items={"PLTR": [article("a")]})
+    watcher = make_watcher(tmp_path, source, None)
+    entry = watcher.state["PLTR"]
+
+    watcher.poll("PLTR")
+    assert entry["interval"] == DEFAULT_INTERVAL * 0.5
+    assert entry["next_poll"] == watcher.clock() + entry["interval"]
+
+    # 文章還在佇列中尚未處理，不會被當成新文章
+    watcher.poll("PLTR")
+    assert entry["interval"] == DEFAULT_INTERVAL * 0.5 * 1.5
+
+def test_interval_is_clamped(tmp_path):
+    source = FakeNewsSource(items={"PLTR": []})
+    watcher = make_watcher(tmp_path, source, None)
+    entry = watcher.state["PLTR"]
+
+    for _ in range(20):
+        watcher.poll("PLTR")
+    assert entry["interval"] == MAX_INTERVAL
+
+    for i in range(20):
+        source.add("PLTR", article(f"n{i}"))
+        watcher.poll("PLTR")
+    assert entry["interval"] == MIN_INTERVAL
+
+# 同一 ticker 的工作在佇列中合併，只跑一次 pipeline
+def test_queued_jobs_for_same_ticker_are_merged(tmp_path):
+    source = FakeNewsSource(items={"PLTR": [article("a")], "NVDA": [article("x")]})
+    process = RecordingProcess()
+    watcher = make_watcher(tmp_path, source, process, tickers=("PLTR", "NVDA"))
+
+    watcher.poll("PLTR")
+    source.add("PLTR", article("b"))
+    watcher.poll("PLTR")
+    watcher.poll("NVDA")
+
+    assert sorted(job[3] for job in watcher.jobs) == ["NVDA", "PLTR"]
+    watcher.run_once()
+    assert sorted(process.calls) == [("NVDA", ["x"]), ("PLTR", ["a", "b"])]
+
+# pipeline 失敗時文章維持未看過，下次輪詢會重新排入
+def test_failed_process_leaves_articles_unseen(tmp_path):
+    source = FakeNewsSource(items={"PLTR": [article("a")]})
+    process = RecordingProcess(fail=True)
+    watcher = make_watcher(tmp_path, source, process)
+
+    stats = watcher.run_once()
+    assert stats["jobs_failed"] == 1
+    assert watcher.state["PLTR"]["seen"] == {}
+
+    process.fail = False
+    stats = watcher.run_once()
+    assert stats["jobs_done"] == 1
+    assert process.calls == [("PLTR", ["a"]), ("PLTR", ["a"])]
+    assert "a" in watcher.state["PLTR"]["seen"]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import importlib.util
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from relation_memo import RelationMemo
+
+def load_verifier():
+    spec = importlib.util.spec_from_file_location("mod_03", os.path.join(SRC_DIR, "03_auto_verifier.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+verifier = load_verifier()
+
+TRIPLE = {"head": "Palantir", "relation": "TEAMS_UP", "tail": "Microsoft"}
+
+# LLM 回傳不合規關係時退回 REPORTS，但不能把這個退回值記進修正表
+def test_off_schema_answer_leaves_memo_unchanged(tmp_path):
+    memo = RelationMemo(str(tmp_path / "memo.json"))
+    answer = [{"head": "Palantir", "relation": "JOINS_FORCES", "tail": "Microsoft", "action": "MODIFY"}]
+
+    for _ in range(5):
+        triples, _ = verifier.apply_verification([TRIPLE], answer, memo, "PLTR")
+        assert triples[0]["relation"] == "REPORTS"
+
+    assert memo.rows() == []
+    assert memo.lookup("TEAMS_UP", "Company", "Company") is None
+
+def test_valid_modify_is_recorded(tmp_path):
+    memo = RelationMemo(str(tmp_path / "memo.json"))
+    answer = [{"head": "Palantir", "relation": "PARTNERS_WITH", "tail": "Microsoft", "action": "MODIFY"}]
+
+    verifier.apply_verification([TRIPLE], answer, memo, "PLTR")
+
+    rows = memo.rows()
+    assert len(rows) == 1
+    assert rows[0]["corrected"] == "PARTNERS_WITH"
+
+# KEEP 決策即使關係被換成合規值也不記錄
+def test_keep_is_not_recorded(tmp_path):
+    memo = RelationMemo(str(tmp_path / "memo.json"))
+    answer = [{"head": "Palantir", "relation": "PARTNERS_WITH", "tail": "Microsoft", "action": "KEEP"}]
+
+    verifier.apply_verification([TRIPLE], answer, memo, "PLTR")
+
+    assert memo.rows() == []
+
+def confident_memo(tmp_path):
+    memo = RelationMemo(str(tmp_path / "memo.json"))
+    for _ in range(3):
+        memo.record("TEAMS_UP", "PARTNERS_WITH", "Company", "Company")
+    return memo
+
+# 修正表預先改過的三元組仍交給 LLM，判定為幻覺時照樣刪除
+def test_memo_corrected_triple_can_be_deleted(tmp_path):
+    memo = confident_memo(tmp_path)
+    group = verifier.apply_learned_corrections([TRIPLE], memo, "PLTR")
+    assert group[0]["relation"] == "PARTNERS_WITH" and group[0]["corrected_by"] == "memo"
+
+    answer = [{"head": "Palantir", "relation": "PARTNERS_WITH", "tail": "Microsoft", "action": "DELETE"}]
+    triples, stats = verifier.apply_verification(group, answer, memo, "PLTR")
+
+    assert triples == []
+    assert stats["deleted"] == 1
+
+def test_memo_corrected_triple_kept_counts_as_modified(tmp_path):
+    memo = confident_memo(tmp_path)
+    group = verifier.apply_learned_corrections([TRIPLE], memo, "PLTR")
+    answer = [{"head": "Palantir", "relation": "PARTNERS_WITH", "tail": "Microsoft", "action": "KEEP"}]
+
+    triples, stats = verifier.apply_verification(group, answer, memo, "PLTR")
+
+    assert triples[0]["relation"] == "PARTNERS_WITH" and triples[0]["corrected_by"] == "memo"
+    assert stats["modified"] == 1
+    # 修正表自己的結果不回寫
+    assert memo.rows()[0]["support"] == 3